@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark the background color estimation on large (synthetic) scans:
+full-resolution median vs. subsampled histogram median, and page/segment
+extraction (border crop, deskew and 100 regions) which estimates it once.
+
+Usage: benchmark_image_background.py [MEGAPIXELS...]   (default: 12 50)
+"""
+from sys import argv
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+from PIL import Image, ImageStat
+
+from ocrd_models.ocrd_page import PageType, BorderType, TextRegionType, CoordsType
+from ocrd_utils import estimate_background
+from ocrd.constants import BACKGROUND_SAMPLE_SIZE
+from ocrd.resolver import Resolver
+from ocrd.workspace import Workspace
+
+NREGIONS = 100
+
+def timed(label, fn):
+    t0 = perf_counter()
+    ret = fn()
+    print("  %-36s %10.1f ms" % (label, (perf_counter() - t0) * 1000))
+    return ret
+
+def scan(megapixels):
+    """
+    Paper-colored noise with dark "text" blocks.
+    """
+    height = int((megapixels * 1e6 * 1.4) ** 0.5)
+    width = int(megapixels * 1e6 / height)
+    rng = np.random.RandomState(42)
+    array = rng.normal((230, 220, 200), 12, (height, width, 3))
+    for y in range(height // 10, height * 9 // 10, height // 40):
+        array[y:y + height // 80, width // 10:width * 9 // 10] *= 0.2
+    return Image.fromarray(np.clip(array, 0, 255).astype(np.uint8))
+
+def benchmark(megapixels, tempdir):
+    image = scan(megapixels)
+    print("%dx%d (%.0f MP)" % (image.width, image.height, image.width * image.height / 1e6))
+    median = timed('ImageStat.Stat(image).median', lambda: tuple(ImageStat.Stat(image).median))
+    subsample = max(1, int((image.width * image.height / BACKGROUND_SAMPLE_SIZE) ** 0.5))
+    estimate = timed('estimate_background(subsample=%d)' % subsample,
+                     lambda: estimate_background(image, subsample=subsample))
+    print("  median %s, estimate %s" % (median, estimate))
+    image.save(join(tempdir, 'scan.tif'))
+    Resolver().workspace_from_nothing(directory=tempdir)
+    workspace = Workspace(Resolver(), tempdir)
+    w, h = image.size
+    page = PageType(imageFilename='scan.tif', imageWidth=w, imageHeight=h, orientation=1.5,
+                    Border=BorderType(Coords=CoordsType(points='%d,%d %d,%d %d,%d %d,%d' % (
+                        w // 20, h // 20, w * 19 // 20, h // 20, w * 19 // 20, h * 19 // 20, w // 20, h * 19 // 20))))
+    for i in range(NREGIONS):
+        x0, y0 = w // 10 + i % 10 * w // 13, h // 10 + i // 10 * h // 13
+        page.add_TextRegion(TextRegionType(id='r%d' % i, Coords=CoordsType(points='%d,%d %d,%d %d,%d' % (
+            x0, y0, x0 + w // 15, y0 + h // 50, x0, y0 + h // 15))))
+    workspace.image_from_page(page, 'PHYS_0001') # decode once (image cache)
+    page_image, page_coords, _ = timed('image_from_page (crop, deskew)',
+                                       lambda: workspace.image_from_page(page, 'PHYS_0001'))
+    timed('%d x image_from_segment' % NREGIONS, lambda: [
+        workspace.image_from_segment(region, page_image, page_coords) for region in page.get_TextRegion()])
+    timed('image_from_segments (%d regions)' % NREGIONS, lambda: list(
+        workspace.image_from_segments(page.get_TextRegion(), page_image, page_coords)))
+
+def main():
+    sizes = [float(n) for n in argv[1:]] or [12, 50]
+    for megapixels in sizes:
+        with TemporaryDirectory() as tempdir:
+            benchmark(megapixels, tempdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Benchmark the METS backends (OcrdMets on lxml vs. OcrdMetsSqlite) for
+inserts, lookups, saving and loading.
+
+Usage: benchmark_mets_backends.py [NFILES...]   (default: 10000 100000)
+"""
+from sys import argv
+from os.path import join
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from ocrd_models import OcrdMets, OcrdMetsSqlite
+
+NFILEGRPS = 10
+NLOOKUPS = 1000
+
+def files(nfiles):
+    npages = nfiles // NFILEGRPS
+    for grp in range(NFILEGRPS):
+        for page in range(npages):
+            yield {
+                'fileGrp': 'FILEGRP_%02d' % grp,
+                'ID': 'FILE_%02d_%07d' % (grp, page),
+                'mimetype': 'image/tiff' if grp == 0 else 'application/vnd.prima.page+xml',
+                'url': 'FILEGRP_%02d/FILE_%07d' % (grp, page),
+                'pageId': 'PHYS_%07d' % page
+            }
+
+def timed(label, fn):
+    t0 = perf_counter()
+    ret = fn()
+    print("  %-28s %10.1f ms" % (label, (perf_counter() - t0) * 1000))
+    return ret
+
+def benchmark(cls, nfiles, tempdir):
+    print("%s, %d mets:file" % (cls.__name__, nfiles))
+    rng = Random(42)
+    npages = nfiles // NFILEGRPS
+    ids = ['FILE_%02d_%07d' % (rng.randrange(NFILEGRPS), rng.randrange(npages)) for _ in range(NLOOKUPS)]
+    pages = ['PHYS_%07d' % rng.randrange(npages) for _ in range(NLOOKUPS)]
+    mets = cls.empty_mets()
+    timed('add_files', lambda: mets.add_files(files(nfiles)))
+    timed('%d x add_file' % NLOOKUPS, lambda: [
+        mets.add_file('FILEGRP_NEW', ID='NEW_%04d' % i, mimetype='image/png', url='new/%d' % i, pageId=pageId)
+        for i, pageId in enumerate(pages)])
+    timed('%d x find_files(ID)' % NLOOKUPS, lambda: [mets.find_files(ID=ID) for ID in ids])
+    timed('%d x find_files(pageId)' % NLOOKUPS, lambda: [mets.find_files(pageId=pageId) for pageId in pages])
+    timed('%d x exists(fileGrp, pageId)' % NLOOKUPS, lambda: [mets.exists(fileGrp='FILEGRP_01', pageId=pageId) for pageId in pages])
+    timed('find_files(mimetype regex)', lambda: mets.find_files(mimetype='//image/.*'))
+    path = join(tempdir, '%s.xml' % cls.__name__)
+    with open(path, 'wb') as f:
+        timed('write_xml', lambda: mets.write_xml(f))
+    timed('load', lambda: cls(filename=path))
+
+def main():
+    sizes = [int(n) for n in argv[1:]] or [10000, 100000]
+    with TemporaryDirectory() as tempdir:
+        for nfiles in sizes:
+            for cls in [OcrdMets, OcrdMetsSqlite]:
+                benchmark(cls, nfiles, tempdir)
+
+if __name__ == '__main__':
+    main()
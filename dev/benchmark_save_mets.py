@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Benchmark saving a large METS: serialization + xmllint re-parse + decode
+(as ``Workspace.save_mets`` used to do) vs. ``OcrdMets.write_xml``.
+
+Usage: benchmark_save_mets.py [NPAGES [NFILEGRPS]]
+"""
+from sys import argv
+from os.path import join
+from tempfile import TemporaryDirectory
+from timeit import repeat
+
+from atomicwrites import atomic_write
+from lxml import etree as ET
+
+from ocrd_models import OcrdMets
+from ocrd_models.utils import xmllint_format
+
+npages = int(argv[1]) if len(argv) > 1 else 1000
+nfilegrps = int(argv[2]) if len(argv) > 2 else 15
+
+mets = OcrdMets.empty_mets()
+mets.add_files({
+    'fileGrp': 'FILEGRP_%02d' % grp,
+    'ID': 'FILE_%02d_%04d' % (grp, page),
+    'mimetype': 'image/tiff',
+    'url': 'FILEGRP_%02d/FILE_%04d.tif' % (grp, page),
+    'pageId': 'PHYS_%04d' % page
+} for grp in range(nfilegrps) for page in range(npages))
+
+def save_xmllint(path):
+    xml = ET.tostring(ET.ElementTree(mets._tree.getroot()), pretty_print=True, encoding='UTF-8') # pylint: disable=protected-access
+    with atomic_write(path, overwrite=True) as f:
+        f.write(xmllint_format(xml).decode('utf-8'))
+
+def save_single_pass(path):
+    with atomic_write(path, mode='wb', overwrite=True) as f:
+        mets.write_xml(f)
+
+with TemporaryDirectory() as tempdir:
+    print("%d pages x %d fileGrps = %d mets:file" % (npages, nfilegrps, npages * nfilegrps))
+    for fn in [save_xmllint, save_single_pass]:
+        path = join(tempdir, '%s.xml' % fn.__name__)
+        best = min(repeat(lambda: fn(path), number=1, repeat=5))
+        print("%-20s %8.1f ms" % (fn.__name__, best * 1000))
+    with open(join(tempdir, 'save_xmllint.xml'), 'rb') as f1, open(join(tempdir, 'save_single_pass.xml'), 'rb') as f2:
+        print("identical output: %s" % (f1.read() == f2.read()))
@@ -17,6 +17,7 @@ Related (and dependent) packages:
 from ocrd.processor.base import run_processor, run_cli, Processor
 from ocrd_models import OcrdMets, OcrdExif, OcrdFile, OcrdAgent
 from ocrd.resolver import Resolver
+from ocrd.resolver_cache import ResolverCache
 from ocrd_validators import *
 from ocrd.workspace import Workspace
 from ocrd.workspace_backup import WorkspaceBackupManager
@@ -17,12 +17,13 @@ from ..decorators import ocrd_loglevel
 @click.option('-m', '--mets', help="METS to process", default="mets.xml")
 @click.option('-g', '--page-id', help="ID(s) of the pages to process")
 @click.option('--overwrite', is_flag=True, default=False, help="Remove output pages/images if they already exist")
+@click.option('--mets-cache', envvar='OCRD_METS_CACHE', is_flag=True, default=False, help="Load the METS indexes from a cache file next to the METS while it is valid, and update it on save (in all tasks)")
 @click.argument('tasks', nargs=-1, required=True)
-def process_cli(log_level, mets, page_id, tasks, overwrite):
+def process_cli(log_level, mets, page_id, tasks, overwrite, mets_cache):
     """
     Process a series of tasks
     """
     log = getLogger('ocrd.cli.process')
 
-    run_tasks(mets, log_level, page_id, tasks, overwrite)
+    run_tasks(mets, log_level, page_id, tasks, overwrite, mets_cache)
     log.info("Finished")
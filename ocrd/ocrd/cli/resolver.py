@@ -0,0 +1,54 @@
+"""
+CLI for the resolver (and its download cache)
+"""
+import re
+
+import click
+
+from ocrd.resolver_cache import ResolverCache
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+def parse_size(ctx, param, value): # pylint: disable=unused-argument
+    """
+    Parse a size in bytes with an optional unit (``K``, ``M``, ``G`` or ``T``), e.g. ``10G``
+    """
+    if value is None:
+        return None
+    match = re.fullmatch(r'([0-9]+)([KMGT]?)B?', value.strip().upper())
+    if not match:
+        raise click.BadParameter("Not a size: %s" % value)
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+@click.group("resolver")
+def resolver_cli():
+    """
+    Downloading files
+    """
+
+@resolver_cli.group("cache")
+@click.option('-d', '--directory', envvar='OCRD_DOWNLOAD_CACHE', required=True, type=click.Path(file_okay=False), metavar='CACHE_DIR', help='Directory of the download cache.')
+@click.pass_context
+def cache_cli(ctx, directory):
+    """
+    Manage the download cache shared between workspaces
+    """
+    ctx.obj = ResolverCache(directory)
+
+@cache_cli.command('stats')
+@click.pass_obj
+def cache_stats(cache):
+    """
+    Show the number of cached files, URLs and their size
+    """
+    for key, value in cache.stats().items():
+        print('%s\t%s' % (key, value))
+
+@cache_cli.command('prune')
+@click.option('-s', '--max-size', default='0', callback=parse_size, help='Size to shrink the cache to, e.g. 10G (default: remove everything)')
+@click.pass_obj
+def cache_prune(cache, max_size):
+    """
+    Remove the least recently used files from the cache
+    """
+    print('freed\t%s' % cache.prune(max_size))
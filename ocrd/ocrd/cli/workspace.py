@@ -7,9 +7,10 @@ import re
 
 import click
 
-from ocrd import Resolver, Workspace, WorkspaceValidator, WorkspaceBackupManager
+from ocrd import Resolver, ResolverCache, Workspace, WorkspaceValidator, WorkspaceBackupManager
+from ocrd.cli.resolver import parse_size
 from ocrd_models import OcrdFile
-from ocrd_utils import getLogger, pushd_popd, EXT_TO_MIME
+from ocrd_utils import getLogger, import_file, pushd_popd, EXT_TO_MIME, IMPORT_STRATEGIES
 
 log = getLogger('ocrd.cli.workspace')
 
@@ -21,11 +22,13 @@ def clean_id(dirty):
 
 class WorkspaceCtx():
 
-    def __init__(self, directory, mets_basename, automatic_backup):
+    def __init__(self, directory, mets_basename, automatic_backup, mets_cache=False, download_cache=None, download_cache_size=None, import_strategy='copy'):
         self.directory = directory
-        self.resolver = Resolver()
+        self.resolver = Resolver(cache=ResolverCache(download_cache, max_size=download_cache_size) if download_cache else None,
+                                 import_strategy=import_strategy)
         self.mets_basename = mets_basename
         self.automatic_backup = automatic_backup
+        self.mets_cache = mets_cache
 
 pass_workspace = click.make_pass_decorator(WorkspaceCtx)
 
@@ -37,12 +40,18 @@ pass_workspace = click.make_pass_decorator(WorkspaceCtx)
 @click.option('-d', '--directory', envvar='WORKSPACE_DIR', default='.', type=click.Path(file_okay=False), metavar='WORKSPACE_DIR', help='Changes the workspace folder location.', show_default=True)
 @click.option('-M', '--mets-basename', default="mets.xml", help='The basename of the METS file.', show_default=True)
 @click.option('--backup', default=False, help="Backup mets.xml whenever it is saved.", is_flag=True)
+@click.option('--mets-cache', envvar='OCRD_METS_CACHE', default=False, help="Load the METS indexes from a cache file next to mets.xml while it is valid, and update it on save.", is_flag=True)
+@click.option('--download-cache', envvar='OCRD_DOWNLOAD_CACHE', type=click.Path(file_okay=False), metavar='CACHE_DIR', help="Download remote files through a cache in CACHE_DIR (shared between workspaces, cf. 'ocrd resolver cache').")
+@click.option('--download-cache-size', envvar='OCRD_DOWNLOAD_CACHE_SIZE', callback=parse_size, help="Size limit of the download cache, e.g. 10G (default: unlimited).")
+@click.option('--import-strategy', envvar='OCRD_IMPORT_STRATEGY', type=click.Choice(IMPORT_STRATEGIES), default='copy', show_default=True,
+              help="How to import local files into the workspace (hardlinks and symlinks share changes with the original).")
 @click.pass_context
-def workspace_cli(ctx, directory, mets_basename, backup):
+def workspace_cli(ctx, directory, mets_basename, backup, mets_cache, download_cache, download_cache_size, import_strategy):
     """
     Working with workspace
     """
-    ctx.obj = WorkspaceCtx(os.path.abspath(directory), mets_basename, automatic_backup=backup)
+    ctx.obj = WorkspaceCtx(os.path.abspath(directory), mets_basename, automatic_backup=backup, mets_cache=mets_cache,
+                           download_cache=download_cache, download_cache_size=download_cache_size, import_strategy=import_strategy)
 
 # ----------------------------------------------------------------------
 # ocrd workspace validate
@@ -87,11 +96,12 @@ def validate_workspace(ctx, mets_url, download, skip, page_textequiv_consistency
 @workspace_cli.command('clone')
 @click.option('-f', '--clobber-mets', help="Overwrite existing METS file", default=False, is_flag=True)
 @click.option('-a', '--download', is_flag=True, help="Download all files and change location in METS file after cloning")
+@click.option('-r', '--revalidate-files', is_flag=True, help="With --download, transfer files downloaded before again if they changed remotely")
 @click.argument('mets_url')
 # should be deprecated:
 @click.argument('workspace_dir', default=None, required=False)
 @pass_workspace
-def workspace_clone(ctx, clobber_mets, download, mets_url, workspace_dir):
+def workspace_clone(ctx, clobber_mets, download, revalidate_files, mets_url, workspace_dir):
     """
     Create a workspace from METS_URL and return the directory
 
@@ -105,9 +115,10 @@ def workspace_clone(ctx, clobber_mets, download, mets_url, workspace_dir):
     workspace = ctx.resolver.workspace_from_url(
         mets_url,
         dst_dir=os.path.abspath(workspace_dir),
-        mets_basename=ctx.mets_basename,
+        mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache,
         clobber_mets=clobber_mets,
         download=download,
+        revalidate_files=revalidate_files,
     )
     workspace.save_mets()
     print(workspace.directory)
@@ -132,7 +143,7 @@ def workspace_create(ctx, clobber_mets, directory):
         directory = ctx.directory
     workspace = ctx.resolver.workspace_from_nothing(
         directory=os.path.abspath(directory),
-        mets_basename=ctx.mets_basename,
+        mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache,
         clobber_mets=clobber_mets
     )
     workspace.save_mets()
@@ -157,7 +168,7 @@ def workspace_add_file(ctx, file_grp, file_id, mimetype, page_id, ignore, check_
     Add a file or http(s) URL FNAME to METS in a workspace.
     If FNAME is not an http(s) URL and is not a workspace-local existing file, try to copy to workspace.
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache, automatic_backup=ctx.automatic_backup)
 
     kwargs = {'fileGrp': file_grp, 'ID': file_id, 'mimetype': mimetype, 'pageId': page_id, 'force': force, 'ignore': ignore}
     log = getLogger('ocrd.cli.workspace.add')
@@ -195,7 +206,7 @@ def workspace_add_file(ctx, file_grp, file_id, mimetype, page_id, ignore, check_
 @click.option('-m', '--mimetype', help="Media type of the file. If not provided, guess from filename", required=False)
 @click.option('-g', '--page-id', help="physical page ID of the file", required=False)
 @click.option('-i', '--file-id', help="ID of the file", required=True)
-@click.option('-u', '--url', help="local filesystem path in the workspace directory (copied from source file if different)", required=True)
+@click.option('-u', '--url', help="local filesystem path in the workspace directory (imported from source file if different, cf. --import-strategy)", required=True)
 @click.option('-G', '--file-grp', help="File group USE of the file", required=True)
 @click.option('-n', '--dry-run', help="Don't actually do anything to the METS or filesystem, just preview", default=False, is_flag=True)
 @click.option('-I', '--ignore', help="Disable checking for existing file entries (faster)", default=False, is_flag=True)
@@ -225,7 +236,7 @@ def workspace_cli_bulk_add(ctx, regex, mimetype, page_id, file_id, url, file_grp
 
     """
     log = getLogger('ocrd.cli.workspace.bulk-add') # pylint: disable=redefined-outer-name
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache, automatic_backup=ctx.automatic_backup)
 
     try:
         pat = re.compile(regex)
@@ -237,6 +248,7 @@ def workspace_cli_bulk_add(ctx, regex, mimetype, page_id, file_id, url, file_grp
     for fglob in file_glob:
         file_paths += [Path(x).resolve() for x in glob(fglob)]
 
+    file_dicts = []
     for i, file_path in enumerate(file_paths):
         log.info("[%4d/%d] %s" % (i, len(file_paths), file_path))
 
@@ -268,20 +280,21 @@ def workspace_cli_bulk_add(ctx, regex, mimetype, page_id, file_id, url, file_grp
         if file_dict['url']:
             urlpath = Path(workspace.directory, file_dict['url'])
             if not urlpath.exists():
-                log.info("cp '%s' '%s'", file_path, urlpath)
+                log.info("import (%s) '%s' '%s'", ctx.resolver.import_strategy, file_path, urlpath)
                 if not dry_run:
                     if not urlpath.parent.is_dir():
                         urlpath.parent.mkdir()
-                    urlpath.write_bytes(file_path.read_bytes())
+                    import_file(file_path, urlpath, ctx.resolver.import_strategy)
 
         # Add to workspace (or not)
-        fileGrp = file_dict.pop('fileGrp')
         if dry_run:
             log.info('workspace.add_file(%s)' % file_dict)
         else:
-            workspace.add_file(fileGrp, ignore=ignore, force=force, **file_dict)
+            file_dicts.append(file_dict)
 
-    # save changes to disk
+    # add all files to METS at once and save changes to disk
+    if file_dicts:
+        workspace.add_files(file_dicts, ignore=ignore, force=force)
     workspace.save_mets()
 
 
@@ -290,10 +303,10 @@ def workspace_cli_bulk_add(ctx, regex, mimetype, page_id, file_id, url, file_grp
 # ----------------------------------------------------------------------
 
 @workspace_cli.command('find')
-@click.option('-G', '--file-grp', help="fileGrp USE", metavar='FILTER')
-@click.option('-m', '--mimetype', help="Media type to look for", metavar='FILTER')
-@click.option('-g', '--page-id', help="Page ID", metavar='FILTER')
-@click.option('-i', '--file-id', help="ID", metavar='FILTER')
+@click.option('-G', '--file-grp', help="fileGrp USE", metavar='FILTER', multiple=True)
+@click.option('-m', '--mimetype', help="Media type to look for", metavar='FILTER', multiple=True)
+@click.option('-g', '--page-id', help="Page ID", metavar='FILTER', multiple=True)
+@click.option('-i', '--file-id', help="ID", metavar='FILTER', multiple=True)
 # pylint: disable=bad-continuation
 @click.option('-k', '--output-field', help="Output field. Repeat for multiple fields, will be joined with tab",
         default=['url'],
@@ -315,24 +328,25 @@ def workspace_find(ctx, file_grp, mimetype, page_id, file_id, output_field, down
     Find files.
 
     (If any ``FILTER`` starts with ``//``, then its remainder
-     will be interpreted as a regular expression.)
+     will be interpreted as a regular expression. Repeat a
+     ``FILTER`` option to find files matching any of the values.)
     """
-    modified_mets = False
     ret = list()
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename)
-    for f in workspace.mets.find_files(
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache)
+    files = workspace.mets.find_files(
             ID=file_id,
             fileGrp=file_grp,
             mimetype=mimetype,
             pageId=page_id,
-        ):
-        if download and not f.local_filename:
-            workspace.download_file(f)
-            modified_mets = True
+        )
+    if download:
+        to_download = [f for f in files if not f.local_filename]
+        if to_download:
+            workspace.download_files(to_download)
+            workspace.save_mets()
+    for f in files:
         ret.append([f.ID if field == 'pageId' else getattr(f, field) or ''
                     for field in output_field])
-    if modified_mets:
-        workspace.save_mets()
     if 'pageId' in output_field:
         idx = output_field.index('pageId')
         fileIds = list(map(lambda fields: fields[idx], ret))
@@ -358,7 +372,7 @@ def workspace_remove_file(ctx, id, force, keep_file):  # pylint: disable=redefin
     (If any ``ID`` starts with ``//``, then its remainder
      will be interpreted as a regular expression.)
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache, automatic_backup=ctx.automatic_backup)
     for i in id:
         workspace.remove_file(i, force=force, keep_file=keep_file)
     workspace.save_mets()
@@ -381,7 +395,7 @@ def remove_group(ctx, group, recursive, force, keep_files):
     (If any ``GROUP`` starts with ``//``, then its remainder
      will be interpreted as a regular expression.)
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache)
     for g in group:
         workspace.remove_file_group(g, recursive=recursive, force=force, keep_files=keep_files)
     workspace.save_mets()
@@ -391,19 +405,20 @@ def remove_group(ctx, group, recursive, force, keep_files):
 # ----------------------------------------------------------------------
 
 @workspace_cli.command('prune-files')
-@click.option('-G', '--file-grp', help="fileGrp USE", metavar='FILTER')
-@click.option('-m', '--mimetype', help="Media type to look for", metavar='FILTER')
-@click.option('-g', '--page-id', help="Page ID", metavar='FILTER')
-@click.option('-i', '--file-id', help="ID", metavar='FILTER')
+@click.option('-G', '--file-grp', help="fileGrp USE", metavar='FILTER', multiple=True)
+@click.option('-m', '--mimetype', help="Media type to look for", metavar='FILTER', multiple=True)
+@click.option('-g', '--page-id', help="Page ID", metavar='FILTER', multiple=True)
+@click.option('-i', '--file-id', help="ID", metavar='FILTER', multiple=True)
 @pass_workspace
 def prune_files(ctx, file_grp, mimetype, page_id, file_id):
     """
     Removes mets:files that point to non-existing local files
 
     (If any ``FILTER`` starts with ``//``, then its remainder
-     will be interpreted as a regular expression.)
+     will be interpreted as a regular expression. Repeat a
+     ``FILTER`` option to find files matching any of the values.)
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache)
     with pushd_popd(workspace.directory):
         for f in workspace.mets.find_files(
             ID=file_id,
@@ -429,7 +444,7 @@ def list_groups(ctx):
     """
     List fileGrp USE attributes
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache)
     print("\n".join(workspace.mets.file_groups))
 
 # ----------------------------------------------------------------------
@@ -442,7 +457,7 @@ def list_pages(ctx):
     """
     List physical page IDs
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache)
     print("\n".join(workspace.mets.physical_pages))
 
 # ----------------------------------------------------------------------
@@ -455,7 +470,7 @@ def get_id(ctx):
     """
     Get METS id if any
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache)
     ID = workspace.mets.unique_identifier
     if ID:
         print(ID)
@@ -475,7 +490,7 @@ def set_id(ctx, id):   # pylint: disable=redefined-builtin
 
     Otherwise will create a new <mods:identifier type="purl">{{ ID }}</mods:identifier>.
     """
-    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename)
+    workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache)
     workspace.mets.unique_identifier = id
     workspace.save_mets()
 
@@ -496,7 +511,7 @@ def workspace_backup_add(ctx):
     """
     Create a new backup
     """
-    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup))
+    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache, automatic_backup=ctx.automatic_backup))
     backup_manager.add()
 
 @workspace_backup_cli.command('list')
@@ -505,7 +520,7 @@ def workspace_backup_list(ctx):
     """
     List backups
     """
-    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup))
+    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache, automatic_backup=ctx.automatic_backup))
     for b in backup_manager.list():
         print(b)
 
@@ -517,7 +532,7 @@ def workspace_backup_restore(ctx, choose_first, bak):
     """
     Restore backup BAK
     """
-    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup))
+    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache, automatic_backup=ctx.automatic_backup))
     backup_manager.restore(bak, choose_first)
 
 @workspace_backup_cli.command('undo')
@@ -526,5 +541,5 @@ def workspace_backup_undo(ctx):
     """
     Restore the last backup
     """
-    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup))
+    backup_manager = WorkspaceBackupManager(Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, mets_cache=ctx.mets_cache, automatic_backup=ctx.automatic_backup))
     backup_manager.undo()
@@ -2,6 +2,7 @@ import sys
 
 import click
 
+from ocrd_utils import IMPORT_STRATEGIES
 from ocrd_validators import OcrdZipValidator
 
 from ..resolver import Resolver
@@ -37,11 +38,13 @@ def zip_cli():
 @click.option('-t', '--tag-file', help="Add a non-payload file to bag", type=click.Path(file_okay=True, dir_okay=False, readable=True, resolve_path=True), multiple=True)
 @click.option('-Z', '--skip-zip', help="Create a directory but do not ZIP it", is_flag=True, default=False)
 @click.option('-j', '--processes', help="Number of parallel processes", type=int, default=1)
-def bag(directory, mets_basename, dest, identifier, in_place, manifestation_depth, mets, base_version_checksum, tag_file, skip_zip, processes):
+@click.option('-S', '--import-strategy', envvar='OCRD_IMPORT_STRATEGY', type=click.Choice(IMPORT_STRATEGIES), default='copy', show_default=True,
+              help="How to import files (hardlinks and symlinks share changes with the original).")
+def bag(directory, mets_basename, dest, identifier, in_place, manifestation_depth, mets, base_version_checksum, tag_file, skip_zip, processes, import_strategy):
     """
     Bag workspace as OCRD-ZIP at DEST
     """
-    resolver = Resolver()
+    resolver = Resolver(import_strategy=import_strategy)
     workspace = Workspace(resolver, directory=directory, mets_basename=mets_basename)
     workspace_bagger = WorkspaceBagger(resolver)
     workspace_bagger.bag(
@@ -68,14 +71,16 @@ def bag(directory, mets_basename, dest, identifier, in_place, manifestation_dept
               help='Workspace folder location.',
               show_default=True)
 @click.argument('src', type=click.Path(dir_okay=False, readable=True, resolve_path=True), required=True)
-def spill(dest, src):
+@click.option('-S', '--import-strategy', envvar='OCRD_IMPORT_STRATEGY', type=click.Choice(IMPORT_STRATEGIES), default='copy', show_default=True,
+              help="How to import files (hardlinks and symlinks share changes with the original).")
+def spill(dest, src, import_strategy):
     """
     Spill/unpack OCRD-ZIP bag at SRC to DEST
 
     SRC must exist an be an OCRD-ZIP
     DEST must not exist and be a directory
     """
-    resolver = Resolver()
+    resolver = Resolver(import_strategy=import_strategy)
     workspace_bagger = WorkspaceBagger(resolver)
     workspace = workspace_bagger.spill(src, dest)
     print(workspace)
@@ -10,6 +10,12 @@ __all__ = [
     'DEFAULT_REPOSITORY_URL',
     'BASHLIB_FILENAME',
     'BACKUP_DIR',
+    'METS_JOURNAL_SUFFIX',
+    'DOWNLOAD_CHUNK_SIZE',
+    'DOWNLOAD_VALIDATORS_DIR',
+    'IMAGE_CACHE_SIZE',
+    'BACKGROUND_SAMPLE_SIZE',
+    'IMAGE_ENGINES',
 ]
 
 TMP_PREFIX = 'ocrd-core-'
@@ -18,3 +24,11 @@ DOWNLOAD_DIR = '/tmp/ocrd-core-downloads'
 DEFAULT_REPOSITORY_URL = 'http://localhost:5000/'
 BASHLIB_FILENAME = resource_filename(__name__, 'lib.bash')
 BACKUP_DIR = '.backup'
+METS_JOURNAL_SUFFIX = '.journal'
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_VALIDATORS_DIR = '.validators'
+IMAGE_CACHE_SIZE = 512 * 1024 * 1024
+# number of pixels to estimate the background color of an image from (at least)
+BACKGROUND_SAMPLE_SIZE = 1024 * 1024
+# how to transpose and deskew images: in separate passes, or in a single resampling pass
+IMAGE_ENGINES = ['pil', 'cv2']
@@ -49,6 +49,7 @@ def ocrd_cli_wrap_processor(
     help=False, # pylint: disable=redefined-builtin
     version=False,
     overwrite=False,
+    mets_cache=False,
     **kwargs
 ):
     if dump_json or help or version:
@@ -75,7 +76,7 @@ def ocrd_cli_wrap_processor(
             LOG.error(msg)
             raise Exception(msg)
         resolver = Resolver()
-        workspace = resolver.workspace_from_url(mets, working_dir)
+        workspace = resolver.workspace_from_url(mets, working_dir, mets_cache=mets_cache)
         page_id = kwargs.get('page_id')
         # XXX not possible while processors do not adhere to # https://github.com/OCR-D/core/issues/505
         # if overwrite
@@ -131,6 +132,7 @@ def ocrd_cli_options(f):
         click.option('-O', '--output-file-grp', help='File group(s) used as output.', default='OUTPUT'),
         click.option('-g', '--page-id', help="ID(s) of the pages to process"),
         click.option('--overwrite', help="Overwrite the output file group or a page range (--page-id)", is_flag=True, default=False),
+        click.option('--mets-cache', envvar='OCRD_METS_CACHE', help="Load the METS indexes from a cache file next to the METS while it is valid, and update it on save", is_flag=True, default=False),
         parameter_option,
         parameter_override_option,
         click.option('-J', '--dump-json', help="Dump tool description as JSON and exit", is_flag=True, default=False),
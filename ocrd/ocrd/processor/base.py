@@ -8,13 +8,13 @@ from ocrd_validators import ParameterValidator
 
 log = getLogger('ocrd.processor')
 
-def _get_workspace(workspace=None, resolver=None, mets_url=None, working_dir=None):
+def _get_workspace(workspace=None, resolver=None, mets_url=None, working_dir=None, mets_cache=False):
     if workspace is None:
         if resolver is None:
             raise Exception("Need to pass a resolver to create a workspace")
         if mets_url is None:
             raise Exception("Need to pass mets_url to create a workspace")
-        workspace = resolver.workspace_from_url(mets_url, dst_dir=working_dir)
+        workspace = resolver.workspace_from_url(mets_url, dst_dir=working_dir, mets_cache=mets_cache)
     return workspace
 
 def run_processor(
@@ -30,18 +30,22 @@ def run_processor(
         parameter=None,
         parameter_override=None,
         working_dir=None,
+        mets_cache=False,
 ): # pylint: disable=too-many-locals
     """
     Create a workspace for mets_url and run processor through it
 
     Args:
         parameter (string): URL to the parameter
+        mets_cache (boolean): Whether to use the cache of the METS indexes when creating the workspace,
+            cf. :py:class:`ocrd.workspace.Workspace`
     """
     workspace = _get_workspace(
         workspace,
         resolver,
         mets_url,
-        working_dir
+        working_dir,
+        mets_cache
     )
     log.debug("Running processor %s", processorClass)
     processor = processorClass(
@@ -89,11 +93,15 @@ def run_cli(
         output_file_grp=None,
         parameter=None,
         working_dir=None,
+        mets_cache=False,
 ):
     """
     Create a workspace for mets_url and run MP CLI through it
+
+    With ``mets_cache``, ``OCRD_METS_CACHE`` is set for the MP CLI (rather than passing ``--mets-cache``,
+    which processors of older versions or in bash would reject).
     """
-    workspace = _get_workspace(workspace, resolver, mets_url, working_dir)
+    workspace = _get_workspace(workspace, resolver, mets_url, working_dir, mets_cache)
     args = [executable, '--working-dir', workspace.directory]
     args += ['--mets', mets_url]
     if log_level:
@@ -108,8 +116,11 @@ def run_cli(
         args += ['--parameter', parameter]
     if overwrite:
         args += ['--overwrite']
+    env = None
+    if mets_cache:
+        env = dict(os.environ, OCRD_METS_CACHE='1')
     log.debug("Running subprocess '%s'", ' '.join(args))
-    return subprocess.call(args)
+    return subprocess.call(args, env=env)
 
 def generate_processor_help(ocrd_tool):
     parameter_help = ''
@@ -1,18 +1,22 @@
+from os import replace
+import json
+import re
 import tempfile
 from pathlib import Path
 
 import requests
 
-from ocrd.constants import TMP_PREFIX
+from ocrd.constants import TMP_PREFIX, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_VALIDATORS_DIR
 from ocrd_utils import (
     getLogger,
+    import_file,
     is_local_filename,
     get_local_filename,
     remove_non_path_from_url,
-    nth_url_segment
+    nth_url_segment,
+    IMPORT_STRATEGIES
 )
-from ocrd.workspace import Workspace
-from ocrd_models import OcrdMets
+from ocrd.workspace import Workspace, METS_BACKENDS
 
 log = getLogger('ocrd.resolver')
 
@@ -21,6 +25,20 @@ class Resolver():
     Handle Uploads, Downloads, Repository access and manage temporary directories
     """
 
+    def __init__(self, cache=None, import_strategy='copy'):
+        """
+        Args:
+            cache (:py:class:`ocrd.resolver_cache.ResolverCache`): Cache to download remote files through
+            import_strategy (string): How to import local files, one of ``IMPORT_STRATEGIES``
+                (cf. :py:func:`ocrd_utils.import_file`)
+        """
+        if import_strategy not in IMPORT_STRATEGIES:
+            raise Exception("Invalid import strategy '%s', must be one of %s" % (import_strategy, IMPORT_STRATEGIES))
+        self.import_strategy = import_strategy
+        # shared by all downloads (also from parallel threads), so connections are kept alive and reused
+        self.session = requests.Session()
+        self.cache = cache
+
     def download_to_directory(self, directory, url, basename=None, if_exists='skip', subdir=None):
         """
         Download a file to a directory.
@@ -34,7 +52,9 @@ class Resolver():
             directory (string): Directory to download files to
             basename (string, None): basename part of the filename on disk.
             url (string): URL to download from
-            if_exists (string, "skip"): What to do if target file already exists. One of ``skip`` (default), ``overwrite`` or ``raise``
+            if_exists (string, "skip"): What to do if target file already exists. One of ``skip`` (default), ``overwrite`` or ``raise``.
+                When overwriting a file downloaded from the same URL before, it is only transferred
+                again if it changed since (cf. ``If-None-Match``/``If-Modified-Since``).
             subdir (string, None): Subdirectory to create within the directory. Think fileGrp.
 
         Returns:
@@ -91,18 +111,126 @@ class Resolver():
 
         # Copy files or download remote assets
         if src_path:
-            log.debug("Copying file '%s' to '%s'", src_path, dst_path)
-            dst_path.write_bytes(src_path.read_bytes())
+            log.debug("Importing file '%s' to '%s' (%s)", src_path, dst_path, self.import_strategy)
+            import_file(src_path, dst_path, self.import_strategy)
         else:
             log.debug("Downloading URL '%s' to '%s'", url, dst_path)
-            response = requests.get(url)
-            if response.status_code != 200:
-                raise Exception("HTTP request failed: %s (HTTP %d)" % (url, response.status_code))
-            dst_path.write_bytes(response.content)
+            if self.cache:
+                self.cache.download(self.session, url, dst_path)
+            else:
+                self._download(url, directory, ret)
 
         return ret
 
-    def workspace_from_url(self, mets_url, dst_dir=None, clobber_mets=False, mets_basename=None, download=False, src_baseurl=None):
+    def _validators_path(self, directory, filename):
+        """
+        Where the ``ETag``/``Last-Modified`` of the download of ``filename`` (relative
+        to ``directory``) are kept: in ``DOWNLOAD_VALIDATORS_DIR`` within ``directory``
+        (i.e. hidden, not next to the file).
+        """
+        return Path(directory, DOWNLOAD_VALIDATORS_DIR, '%s.json' % filename)
+
+    def _conditional_headers(self, url, directory, filename):
+        """
+        Headers to request ``url`` only if it changed since it was downloaded
+        to ``filename`` (relative to ``directory``), according to the
+        ``ETag``/``Last-Modified`` kept for it (cf. ``_validators_path``).
+        """
+        dst_path = Path(directory, filename)
+        validators_path = self._validators_path(directory, filename)
+        if not dst_path.exists() or not validators_path.exists():
+            return {}
+        try:
+            validators = json.loads(validators_path.read_text())
+        except ValueError:
+            return {}
+        if validators.get('url') != url:
+            return {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def _download(self, url, directory, filename, resume=True):
+        """
+        Download ``url`` to ``dst_path`` (``filename`` relative to ``directory``)
+        in chunks (via ``<dst_path>.part``, which is renamed when complete), unless
+        ``dst_path`` was downloaded from ``url`` before and did not change since
+        (cf. ``_conditional_headers``).
+
+        If a previous download of ``url`` was interrupted, only request the rest
+        of it, provided the server supports range requests and ``url`` did not
+        change in the meantime (cf. ``If-Range``). The ``ETag`` (or ``Last-Modified``)
+        this relies upon is kept in ``<dst_path>.part.validator``. If the server
+        does not respond with the rest requested, start over with a plain request
+        (as with ``resume=False``).
+        """
+        log = getLogger('ocrd.resolver.download_to_directory') # pylint: disable=redefined-outer-name
+        dst_path = Path(directory, filename)
+        part_path = Path('%s.part' % dst_path)
+        validator_path = Path('%s.part.validator' % dst_path)
+        validators_path = self._validators_path(directory, filename)
+        if not resume:
+            headers = {}
+        elif part_path.exists() and validator_path.exists():
+            headers = {
+                'Range': 'bytes=%d-' % part_path.stat().st_size,
+                'If-Range': validator_path.read_text()
+            }
+        else:
+            headers = self._conditional_headers(url, directory, filename)
+        with self.session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304 and headers:
+                log.debug("Not modified since downloaded to '%s': %s", dst_path, url)
+                return
+            if response.status_code == 416:
+                # the partial download is complete (or invalid): start over
+                log.debug("Range request for '%s' not satisfiable, downloading it again", url)
+                part_path.unlink()
+                validator_path.unlink()
+                return self._download(url, directory, filename)
+            if response.status_code not in [200, 206]:
+                raise Exception("HTTP request failed: %s (HTTP %d)" % (url, response.status_code))
+            if response.status_code == 206:
+                start = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+                if not start or int(start.group(1)) != part_path.stat().st_size:
+                    # not the rest of the partial download: start over
+                    log.warning("Range request for '%s' answered with Content-Range '%s', downloading it again",
+                                url, response.headers.get('Content-Range'))
+                    part_path.unlink()
+                    validator_path.unlink()
+                    return self._download(url, directory, filename, resume=False)
+                log.info("Resuming download of '%s' at byte %d", url, part_path.stat().st_size)
+                mode = 'ab'
+            else:
+                mode = 'wb'
+                # If-Range needs a strong ETag
+                etag = response.headers.get('ETag')
+                validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+                if validator:
+                    validator_path.write_text(validator)
+                elif validator_path.exists():
+                    validator_path.unlink()
+            with open(str(part_path), mode) as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+            validators = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+        replace(str(part_path), str(dst_path))
+        if validator_path.exists():
+            validator_path.unlink()
+        if validators['etag'] or validators['last_modified']:
+            validators_path.parent.mkdir(parents=True, exist_ok=True)
+            validators_path.write_text(json.dumps(validators))
+        elif validators_path.exists():
+            validators_path.unlink()
+
+    def workspace_from_url(self, mets_url, dst_dir=None, clobber_mets=False, mets_basename=None, download=False, src_baseurl=None, mets_backend='lxml', mets_cache=False, file_grps=None, revalidate_files=False):
         """
         Create a workspace from a METS by URL (i.e. clone it).
 
@@ -111,9 +239,17 @@ class Resolver():
         Arguments:
             mets_url (string): Source mets URL
             dst_dir (string, None): Target directory for the workspace
-            clobber_mets (boolean, False): Whether to overwrite existing mets.xml. By default existing mets.xml will raise an exception.
-            download (boolean, False): Whether to download all the files
+            clobber_mets (boolean, False): Whether to overwrite existing mets.xml. By default existing mets.xml will be kept
+                (with a warning if it is known to have changed remotely). A remote METS downloaded before is
+                only transferred again if it changed since.
+            download (boolean, False): Whether to download all the files (in parallel, cf. :py:meth:`ocrd.workspace.Workspace.download_files`)
+            revalidate_files (boolean, False): Whether to check files downloaded before (with ``download``) for
+                remote changes and transfer them again if changed. By default existing files are kept.
             src_baseurl (string, None): Base URL for resolving relative file locations
+            mets_backend (string, "lxml"): How to hold the METS in memory, cf. :py:class:`ocrd.workspace.Workspace`
+            mets_cache (boolean, False): Whether to use the cache of the METS indexes, cf. :py:class:`ocrd.workspace.Workspace`
+            file_grps (list, None): ``USE`` of the fileGrps to load (default: all), cf. :py:class:`ocrd.workspace.Workspace`.
+                With ``download``, only the files of these fileGrps are downloaded.
 
         Returns:
             Workspace
@@ -151,17 +287,21 @@ class Resolver():
         log.debug("workspace_from_url\nmets_basename='%s'\nmets_url='%s'\nsrc_baseurl='%s'\ndst_dir='%s'",
             mets_basename, mets_url, src_baseurl, dst_dir)
 
+        mets_path = Path(dst_dir, mets_basename)
+        if not clobber_mets and not is_local_filename(mets_url) and mets_path.exists():
+            headers = self._conditional_headers(mets_url, dst_dir, mets_basename)
+            if headers and self.session.head(mets_url, headers=headers).status_code == 200:
+                log.warning("METS <%s> changed since downloaded to '%s', keeping it since clobber_mets is not set", mets_url, mets_path)
         self.download_to_directory(dst_dir, mets_url, basename=mets_basename, if_exists='overwrite' if clobber_mets else 'skip')
 
-        workspace = Workspace(self, dst_dir, mets_basename=mets_basename, baseurl=src_baseurl)
+        workspace = Workspace(self, dst_dir, mets_basename=mets_basename, baseurl=src_baseurl, mets_backend=mets_backend, mets_cache=mets_cache, file_grps=file_grps)
 
         if download:
-            for f in workspace.mets.find_files():
-                workspace.download_file(f)
+            workspace.download_files(workspace.mets.find_files(), if_exists='overwrite' if revalidate_files else 'skip')
 
         return workspace
 
-    def workspace_from_nothing(self, directory, mets_basename='mets.xml', clobber_mets=False):
+    def workspace_from_nothing(self, directory, mets_basename='mets.xml', clobber_mets=False, mets_backend='lxml', mets_cache=False):
         """
         Create an empty workspace.
         """
@@ -171,8 +311,8 @@ class Resolver():
         mets_path = Path(directory, mets_basename)
         if mets_path.exists() and not clobber_mets:
             raise FileExistsError("METS '%s' already exists in '%s' and clobber_mets not set." % (mets_basename, directory))
-        mets = OcrdMets.empty_mets()
+        mets = METS_BACKENDS[mets_backend].empty_mets()
         log.info("Writing METS to %s", mets_path)
         mets_path.write_bytes(mets.to_xml(xmllint=True))
 
-        return Workspace(self, directory, mets, mets_basename=mets_basename)
+        return Workspace(self, directory, mets, mets_basename=mets_basename, mets_backend=mets_backend, mets_cache=mets_cache)
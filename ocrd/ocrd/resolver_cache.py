@@ -0,0 +1,208 @@
+from os import chmod, fsync, getpid, listdir, makedirs, replace, stat, unlink, utime, walk
+from os.path import exists, join
+from threading import get_ident
+import hashlib
+import json
+
+from ocrd_utils import getLogger, import_file
+
+from .constants import DOWNLOAD_CHUNK_SIZE
+
+def _sha256(s):
+    return hashlib.sha256(s.encode('utf-8')).hexdigest()
+
+class ResolverCache():
+    """
+    Content-addressed cache of downloads, which can be shared between workspaces
+    (and processes).
+
+    Each download is stored once per content (``objects/<sha256>``), no matter
+    how many URLs it was downloaded from. For each URL, the checksum of its
+    content and its ``ETag``/``Last-Modified`` are recorded (``urls/<sha256 of URL>``).
+    A URL in the cache is only downloaded again if the server reports a change
+    (cf. ``If-None-Match``/``If-Modified-Since``).
+
+    Files are hardlinked into the workspace (copied if that is not possible) and
+    read-only. If the cache grows beyond ``max_size`` bytes, the least recently
+    used contents are evicted.
+    """
+
+    def __init__(self, directory, max_size=None):
+        """
+        Args:
+            directory (string): Directory of the cache (created if necessary)
+            max_size (integer): Size limit of the cache in bytes (default: unlimited)
+        """
+        self.directory = directory
+        self.max_size = max_size
+        # total size of the contents, once known
+        self._size = None
+        for subdir in ['objects', 'urls', 'tmp']:
+            makedirs(join(directory, subdir), exist_ok=True)
+
+    def _object_path(self, chksum):
+        return join(self.directory, 'objects', chksum[:2], chksum)
+
+    def _url_path(self, url):
+        return join(self.directory, 'urls', _sha256(url))
+
+    def _tmp_path(self):
+        return join(self.directory, 'tmp', '%d-%d' % (getpid(), get_ident()))
+
+    def _read_entry(self, url):
+        """
+        Get what is recorded about ``url`` if its content is still in the cache, else ``None``.
+        """
+        try:
+            with open(self._url_path(url), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url or not exists(self._object_path(entry['sha256'])):
+            return None
+        return entry
+
+    def download(self, session, url, dst_path):
+        """
+        Download ``url`` to ``dst_path`` via the cache.
+
+        Args:
+            session (requests.Session): Session to make the (conditional) request with
+            url (string): URL to download
+            dst_path (string): Path to link (or copy) the content to
+        """
+        log = getLogger('ocrd.resolver_cache.download')
+        entry = self._read_entry(url)
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        with session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304 and entry:
+                log.debug("Cache hit for '%s'", url)
+                chksum = entry['sha256']
+            elif response.status_code == 200:
+                log.debug("Cache miss for '%s'", url)
+                chksum, added = self._store(response)
+                if self.max_size is not None and added:
+                    if self._size is None:
+                        self._size = self.stats()['size']
+                    else:
+                        self._size += added
+                self._write_entry(url, {
+                    'url': url,
+                    'sha256': chksum,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                })
+            else:
+                raise Exception("HTTP request failed: %s (HTTP %d)" % (url, response.status_code))
+        self._link(chksum, dst_path)
+        if self.max_size is not None and self._size is not None and self._size > self.max_size:
+            self.prune(self.max_size)
+
+    def _store(self, response):
+        """
+        Store the content of ``response`` (unless stored already).
+
+        Returns:
+            The checksum of the content and the number of bytes added to the cache
+        """
+        tmp_path = self._tmp_path()
+        h = hashlib.sha256()
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                h.update(chunk)
+                f.write(chunk)
+            f.flush()
+            fsync(f.fileno())
+        chksum = h.hexdigest()
+        object_path = self._object_path(chksum)
+        if exists(object_path):
+            unlink(tmp_path)
+            return chksum, 0
+        makedirs(join(self.directory, 'objects', chksum[:2]), exist_ok=True)
+        chmod(tmp_path, 0o444)
+        size = stat(tmp_path).st_size
+        replace(tmp_path, object_path)
+        return chksum, size
+
+    def _write_entry(self, url, entry):
+        tmp_path = self._tmp_path()
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        replace(tmp_path, self._url_path(url))
+
+    def _link(self, chksum, dst_path):
+        """
+        Hardlink (or copy) content ``chksum`` to ``dst_path``, marking it as used.
+        """
+        object_path = self._object_path(chksum)
+        tmp_path = '%s.%d.tmp' % (dst_path, get_ident())
+        import_file(object_path, tmp_path, 'hardlink')
+        replace(tmp_path, str(dst_path))
+        # the modification time of the content is its time of last use (cf. prune)
+        try:
+            utime(object_path)
+        except OSError:
+            # content of another user
+            pass
+
+    def _objects(self):
+        """
+        List all contents as (last use, size, path).
+        """
+        ret = []
+        for dirpath, _, filenames in walk(join(self.directory, 'objects')):
+            for filename in filenames:
+                path = join(dirpath, filename)
+                st = stat(path)
+                ret.append((st.st_mtime, st.st_size, path))
+        return ret
+
+    def stats(self):
+        """
+        Summarize the cache.
+
+        Returns:
+            dict with the number of contents (``objects``), their total ``size``
+            and the number of URLs (``urls``)
+        """
+        objects = self._objects()
+        return {
+            'objects': len(objects),
+            'size': sum(size for _, size, _ in objects),
+            'urls': len(listdir(join(self.directory, 'urls'))),
+        }
+
+    def prune(self, max_size=0):
+        """
+        Evict the least recently used contents until the cache is no larger
+        than ``max_size`` bytes, and forget URLs whose content was evicted.
+
+        Returns:
+            Number of bytes freed
+        """
+        log = getLogger('ocrd.resolver_cache.prune')
+        objects = sorted(self._objects())
+        size = sum(size for _, size, _ in objects)
+        freed = 0
+        for _, obj_size, path in objects:
+            if size - freed <= max_size:
+                break
+            log.debug("Evicting %s", path)
+            unlink(path)
+            freed += obj_size
+        if freed:
+            for filename in listdir(join(self.directory, 'urls')):
+                path = join(self.directory, 'urls', filename)
+                try:
+                    with open(path, 'r') as f:
+                        chksum = json.load(f)['sha256']
+                except (OSError, ValueError, KeyError):
+                    chksum = None
+                if not chksum or not exists(self._object_path(chksum)):
+                    unlink(path)
+        self._size = size - freed
+        return freed
@@ -116,9 +116,9 @@ def validate_tasks(tasks, workspace, page_id=None, overwrite=False):
     return report
 
 
-def run_tasks(mets, log_level, page_id, task_strs, overwrite=False):
+def run_tasks(mets, log_level, page_id, task_strs, overwrite=False, mets_cache=False):
     resolver = Resolver()
-    workspace = resolver.workspace_from_url(mets)
+    workspace = resolver.workspace_from_url(mets, mets_cache=mets_cache)
     log = getLogger('ocrd.task_sequence.run_tasks')
     tasks = [ProcessorTask.parse(task_str) for task_str in task_strs]
 
@@ -138,6 +138,7 @@ def run_tasks(mets, log_level, page_id, task_strs, overwrite=False):
             log_level=log_level,
             page_id=page_id,
             overwrite=overwrite,
+            mets_cache=mets_cache,
             input_file_grp=','.join(task.input_file_grps),
             output_file_grp=','.join(task.output_file_grps),
             parameter=json.dumps(task.parameters)
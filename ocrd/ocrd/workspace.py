@@ -1,31 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import io
+from itertools import count
 from os import makedirs, unlink, listdir
+from os.path import exists, getsize, lexists
 from pathlib import Path
+from threading import BoundedSemaphore, Lock
+from time import sleep
+from urllib.parse import urlparse
 
 import cv2
-from PIL import Image
+from PIL import Image, ImageStat
 import numpy as np
 from atomicwrites import atomic_write
 from deprecated.sphinx import deprecated
 
-from ocrd_models import OcrdMets, OcrdExif, OcrdFile
+from ocrd_models import OcrdMets, OcrdMetsSqlite, OcrdExif, OcrdFile
 from ocrd_models.ocrd_page import parse
 from ocrd_utils import (
     getLogger,
+    get_local_filename,
     image_from_polygon,
     coordinates_of_segment,
+    coordinates_of_segments,
     adjust_canvas_to_rotation,
     adjust_canvas_to_transposition,
     shift_coordinates,
     rotate_coordinates,
     transform_coordinates,
     transpose_coordinates,
-    crop_image,
+    estimate_background,
     rotate_image,
     transpose_image,
     bbox_from_polygon,
-    polygon_from_points,
     xywh_from_bbox,
+    is_local_filename,
     pushd_popd,
     MIME_TO_EXT,
     MIME_TO_PIL,
@@ -33,9 +41,50 @@ from ocrd_utils import (
 )
 
 from .workspace_backup import WorkspaceBackupManager
+from .workspace_journal import WorkspaceJournal
+from .workspace_image_cache import WorkspaceImageCache, WorkspaceImageMemo
+from .workspace_image_source import ImageSource
+from .workspace_image_warp import warp_image
+from .constants import IMAGE_CACHE_SIZE, BACKGROUND_SAMPLE_SIZE, IMAGE_ENGINES
 
 log = getLogger('ocrd.workspace')
 
+def _background_fill(image, fill, background, alpha=None):
+    """
+    Get the color to fill ``image`` with: ``fill``, unless that is ``background``,
+    then the ``background`` color estimated for the image (possibly before adding
+    an alpha channel), with opacity ``alpha`` (if given) for images with alpha channel.
+    """
+    if fill != 'background':
+        return fill
+    if image.mode in ['RGBA', 'LA']:
+        if len(background) < Image.getmodebands(image.mode):
+            background += (255,)
+        if alpha is not None:
+            background = background[:-1] + (alpha,)
+    return background
+
+def _select_alternative_image(segment, feature_selector, feature_filter):
+    """
+    Get the most recent AlternativeImage of ``segment`` (or page) which has all
+    features of ``feature_selector`` and none of ``feature_filter`` (or ``None``).
+    """
+    # search from the end, because by convention we always append,
+    # and among multiple satisfactory images we want the most recent:
+    for alternative_image in reversed(segment.get_AlternativeImage()):
+        features = alternative_image.get_comments()
+        if (all(feature in features
+                for feature in feature_selector.split(',') if feature) and
+            not any(feature in features
+                    for feature in feature_filter.split(',') if feature)):
+            return alternative_image
+    return None
+
+METS_BACKENDS = {
+    'lxml': OcrdMets,
+    'sqlite': OcrdMetsSqlite,
+}
+
 
 class Workspace():
     """
@@ -50,15 +99,51 @@ class Workspace():
         mets_basename (string) : Basename of the METS XML file. Default: Last URL segment of the mets_url.
         overwrite_mode (boolean) : Whether to force add operations on this workspace globally
         baseurl (string) : Base URL to prefix to relative URL.
+        journal (boolean) : Whether :py:meth:`save_mets` should only append changes to the METS journal
+            (cf. :py:class:`WorkspaceJournal`) between checkpoints. Has no effect if ``mets`` is given.
+            (Note that tools reading the METS file other than through a ``Workspace`` do not see
+            the journaled changes before the next checkpoint.)
+        mets_backend (string) : How to hold the METS in memory if loaded from ``mets_basename``: ``lxml``
+            (:class:`OcrdMets`, default) or ``sqlite`` (:class:`OcrdMetsSqlite`, for very large METS)
+        mets_cache (boolean) : Whether to load the METS indexes from the cache file next to the METS file
+            while it is still valid, and to update that cache whenever the METS is saved
+            (cf. ``cache`` of :class:`OcrdMets`). Only supported by the ``lxml`` backend.
+        file_grps (list) : ``USE`` of the fileGrps to load from ``mets_basename`` (default: all), so the
+            contents of all others need not be parsed (cf. ``file_grps`` of :class:`OcrdMets`). All fileGrps
+            are loaded while the METS journal has changes. Only supported by the ``lxml`` backend,
+            without ``mets_cache``. Has no effect if ``mets`` is given.
+        image_cache_size (integer) : Maximum size in bytes of the decoded images kept in memory
+            for reuse (cf. :class:`WorkspaceImageCache`), ``0`` to disable
+        image_memo_size (integer) : Maximum size in bytes of the results of :py:meth:`image_from_page`
+            and :py:meth:`image_from_segment` kept in memory for reuse (cf. :class:`WorkspaceImageMemo`),
+            until files are added for their page. Disabled by default (``0``).
+        image_engine (string) : How :py:meth:`image_from_page` and :py:meth:`image_from_segment`
+            transpose and deskew images: ``pil`` (default) in separate passes, or ``cv2`` in a single
+            resampling pass (cf. :py:func:`ocrd.workspace_image_warp.warp_image`)
     """
 
-    def __init__(self, resolver, directory, mets=None, mets_basename='mets.xml', automatic_backup=False, baseurl=None):
+    def __init__(self, resolver, directory, mets=None, mets_basename='mets.xml', automatic_backup=False, baseurl=None, journal=False, mets_backend='lxml', mets_cache=False, file_grps=None, image_cache_size=IMAGE_CACHE_SIZE, image_memo_size=0, image_engine='pil'):
+        if mets_backend not in METS_BACKENDS:
+            raise Exception("Unknown METS backend '%s', must be one of %s" % (mets_backend, list(METS_BACKENDS)))
+        if image_engine not in IMAGE_ENGINES:
+            raise Exception("Unknown image engine '%s', must be one of %s" % (image_engine, IMAGE_ENGINES))
+        if mets_cache and mets_backend != 'lxml':
+            raise Exception("METS cache is only supported by the 'lxml' METS backend")
+        if file_grps is not None and (mets_backend != 'lxml' or mets_cache):
+            raise Exception("Loading only some fileGrps is only supported by the 'lxml' METS backend without METS cache")
         self.resolver = resolver
         self.directory = directory
         self.mets_target = str(Path(directory, mets_basename))
+        self.mets_backend = mets_backend
+        self.mets_cache = mets_cache
+        self.file_grps = file_grps
+        self.mets_journal = WorkspaceJournal(self)
+        self.image_cache = WorkspaceImageCache(image_cache_size)
+        self.image_memo = WorkspaceImageMemo(image_memo_size)
+        self.image_engine = image_engine
         self.overwrite_mode = False
         if mets is None:
-            mets = OcrdMets(filename=self.mets_target)
+            mets = self._load_mets(journal)
         self.mets = mets
         self.automatic_backup = automatic_backup
         self.baseurl = baseurl
@@ -76,7 +161,24 @@ class Workspace():
         """
         Reload METS from disk.
         """
-        self.mets = OcrdMets(filename=self.mets_target)
+        # unsaved changes are discarded anyway
+        self.mets = self._load_mets(self.mets.pop_journal() is not None)
+
+    def _load_mets(self, journal):
+        """
+        Load METS from disk, including the changes in the METS journal.
+        """
+        entries = self.mets_journal.read()
+        kwargs = {'cache': True} if self.mets_cache else {}
+        if self.file_grps is not None:
+            # changes to skipped fileGrps could not be replayed
+            if entries:
+                log.warning("Loading all fileGrps of '%s', since the METS journal has changes", self.mets_target)
+            else:
+                kwargs['file_grps'] = self.file_grps
+        mets = METS_BACKENDS[self.mets_backend](filename=self.mets_target, journal=journal, **kwargs)
+        mets.replay_journal(entries)
+        return mets
 
 
     @deprecated(version='1.0.0', reason="Use workspace.download_file")
@@ -101,26 +203,130 @@ class Workspace():
         Download a :py:mod:`ocrd.model.ocrd_file.OcrdFile` to the workspace.
         """
         log.debug('download_file %s [_recursion_count=%s]' % (f, _recursion_count))
-        with pushd_popd(self.directory):
-            try:
-                # If the f.url is already a file path, and is within self.directory, do nothing
-                url_path = Path(f.url).resolve()
-                if not (url_path.exists() and url_path.relative_to(str(Path(self.directory).resolve()))):
-                    raise Exception("Not already downloaded, moving on")
-            except Exception as e:
-                basename = '%s%s' % (f.ID, MIME_TO_EXT.get(f.mimetype, '')) if f.ID else f.basename
+        url = self._download_url(f.url, f.fileGrp, self._download_basename(f), _recursion_count=_recursion_count)
+        # avoid needless METS updates (and journal entries)
+        if f.url != url:
+            f.url = url
+        if f.local_filename != url:
+            f.local_filename = url
+        return f
+
+    def download_files(self, files, max_workers=8, max_per_host=4, retries=3, backoff=1.0, progress=None, if_exists='skip'):
+        """
+        Download many :py:class:`OcrdFile` to the workspace in parallel (cf. ``download_file``).
+
+        The URLs of the files in the METS are only updated (in the calling thread)
+        once all downloads are done. If some downloads failed (even after retrying),
+        the others are still updated before raising an exception.
+
+        Args:
+            files (list): Files to download
+            max_workers (integer): Maximum number of parallel downloads
+            max_per_host (integer): Maximum number of parallel downloads from the same host
+            retries (integer): How often to retry a failed remote download, waiting
+                ``backoff``, ``2 * backoff``, ``4 * backoff`` ... seconds in between
+            backoff (float): Seconds to wait before the first retry
+            progress (callable): Called as ``progress(n_done, n_total, ocrd_file)``
+                (in the calling thread) whenever a download is done
+            if_exists (string): What to do with files downloaded before, cf.
+                :py:meth:`ocrd.resolver.Resolver.download_to_directory` (``overwrite``
+                only transfers remote files that changed since)
+
+        Returns:
+            The files
+        """
+        files = list(files)
+        # read everything from the METS before starting threads
+        jobs = [(f.url, f.fileGrp, self._download_basename(f)) for f in files]
+        host_semaphores = {}
+        host_semaphores_lock = Lock()
+
+        def download_to_directory(directory, url, **kwargs):
+            if is_local_filename(url):
+                return self.resolver.download_to_directory(directory, url, **kwargs)
+            with host_semaphores_lock:
+                host_semaphore = host_semaphores.setdefault(urlparse(url).netloc, BoundedSemaphore(max_per_host))
+            for attempt in count():
+                try:
+                    with host_semaphore:
+                        return self.resolver.download_to_directory(directory, url, **kwargs)
+                except Exception as e: # pylint: disable=broad-except
+                    if attempt >= retries:
+                        raise
+                    log.warning("Downloading '%s' failed (%s), retrying in %.1fs", url, e, backoff * 2 ** attempt)
+                    sleep(backoff * 2 ** attempt)
+
+        urls = [None] * len(files)
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self._download_url, *job, download_to_directory=download_to_directory, if_exists=if_exists): i
+                       for i, job in enumerate(jobs)}
+            for n_done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
                 try:
-                    f.url = self.resolver.download_to_directory(self.directory, f.url, subdir=f.fileGrp, basename=basename)
-                except FileNotFoundError as e:
-                    if not self.baseurl:
-                        raise Exception("No baseurl defined by workspace. Cannot retrieve '%s'" % f.url)
-                    if _recursion_count >= 1:
-                        raise Exception("Already tried prepending baseurl '%s'. Cannot retrieve '%s'" % (self.baseurl, f.url))
-                    log.debug("First run of resolver.download_to_directory(%s) failed, try prepending baseurl '%s': %s", f.url, self.baseurl, e)
-                    f.url = '%s/%s' % (self.baseurl, f.url)
-                    f.url = self.download_file(f, _recursion_count + 1).local_filename
-            f.local_filename = f.url
-            return f
+                    urls[i] = future.result()
+                except Exception as e: # pylint: disable=broad-except
+                    log.error("Failed to download '%s': %s", jobs[i][0], e)
+                    errors.append(files[i].ID)
+                log.info("Downloaded %d/%d files", n_done, len(files))
+                if progress:
+                    progress(n_done, len(files), files[i])
+        for f, url in zip(files, urls):
+            if url is not None:
+                if f.url != url:
+                    f.url = url
+                if f.local_filename != url:
+                    f.local_filename = url
+        if errors:
+            raise Exception("Failed to download %d of %d files: %s" % (len(errors), len(files), ', '.join(map(str, errors))))
+        return files
+
+    def _download_basename(self, f):
+        """
+        Basename of the file ``f`` in the workspace when downloaded.
+        """
+        return '%s%s' % (f.ID, MIME_TO_EXT.get(f.mimetype, '')) if f.ID else f.basename
+
+    def _download_url(self, url, subdir, basename, _recursion_count=0, download_to_directory=None, if_exists='skip'):
+        """
+        Download ``url`` to ``subdir/basename`` in the workspace, unless it is a file
+        within the workspace already. If it cannot be found, retry with ``baseurl``.
+
+        This neither changes the METS nor the working directory, so it can be run in parallel.
+
+        Args:
+            download_to_directory (callable): Replacement for ``Resolver.download_to_directory``
+            if_exists (string): cf. ``Resolver.download_to_directory``
+
+        Returns:
+            The URL of the file in the workspace
+        """
+        if download_to_directory is None:
+            download_to_directory = self.resolver.download_to_directory
+        directory = Path(self.directory).resolve()
+        if is_local_filename(url):
+            # relative to the workspace (not the working directory)
+            path = Path(self.directory, get_local_filename(url))
+            try:
+                path.resolve().relative_to(directory)
+                if path.exists():
+                    return url
+            except (FileNotFoundError, ValueError):
+                pass
+            src_url = str(path)
+        else:
+            src_url = url
+        try:
+            return download_to_directory(str(directory), src_url, subdir=subdir, basename=basename, if_exists=if_exists)
+        except FileNotFoundError as e:
+            if not self.baseurl:
+                raise Exception("No baseurl defined by workspace. Cannot retrieve '%s'" % url)
+            if _recursion_count >= 1:
+                raise Exception("Already tried prepending baseurl '%s'. Cannot retrieve '%s'" % (self.baseurl, url))
+            log.debug("First run of resolver.download_to_directory(%s) failed, try prepending baseurl '%s': %s", url, self.baseurl, e)
+            return self._download_url('%s/%s' % (self.baseurl, url), subdir, basename,
+                                      _recursion_count=_recursion_count + 1, download_to_directory=download_to_directory,
+                                      if_exists=if_exists)
 
     def remove_file(self, ID, force=False, keep_file=False, page_recursive=False, page_same_group=False):
         """
@@ -139,8 +345,12 @@ class Workspace():
         if isinstance(ID, OcrdFile):
             ID = ID.ID
         try:
+            # (the pages of the files are gone with them)
+            page_ids = set(ocrd_file.pageId for ocrd_file in self.mets.find_files(ID=ID))
             ocrd_file_ = self.mets.remove_file(ID)
             ocrd_files = [ocrd_file_] if isinstance(ocrd_file_, OcrdFile) else ocrd_file_
+            for page_id in [None] if None in page_ids else page_ids:
+                self.image_memo.invalidate(page_id)
             if page_recursive:
                 with pushd_popd(self.directory):
                     for ocrd_file in ocrd_files:
@@ -221,8 +431,12 @@ class Workspace():
 
             #  print(kwargs)
             ret = self.mets.add_file(file_grp, **kwargs)
+            self.image_memo.invalidate(kwargs.get('pageId'))
 
             if content is not None:
+                # replace rather than write through (hard or symbolic) links to imported files
+                if lexists(kwargs['local_filename']):
+                    unlink(kwargs['local_filename'])
                 with open(kwargs['local_filename'], 'wb') as f:
                     if isinstance(content, str):
                         content = bytes(content, 'utf-8')
@@ -230,15 +444,80 @@ class Workspace():
 
         return ret
 
-    def save_mets(self):
+    def add_files(self, files, force=False, ignore=False):
+        """
+        Add many output files at once, cf. :py:meth:`add_file` and
+        :py:meth:`ocrd_models.ocrd_mets.OcrdMets.add_files`.
+
+        Arguments:
+            files (iterable): dicts with the keyword arguments of
+                :py:meth:`ocrd_models.ocrd_mets.OcrdMets.add_file` (``fileGrp``,
+                ``ID``, ``mimetype``, ``url``, ``pageId``, ``local_filename``),
+                and optionally the ``content`` to write to ``local_filename``
+            force (boolean): Whether to replace files with the same ``ID``
+            ignore (boolean): Do not check for existing files with the same ``ID``
+
+        Returns:
+            List of the added :class:`OcrdFile`
+        """
+        if self.overwrite_mode:
+            force = True
+        files = [dict(kwargs) for kwargs in files]
+        contents = [kwargs.pop('content', None) for kwargs in files]
+        log.debug('add_files: %d files', len(files))
+        with pushd_popd(self.directory):
+            for kwargs, content in zip(files, contents):
+                if content is not None and 'local_filename' not in kwargs:
+                    raise Exception("'content' was set but no 'local_filename'")
+                if 'local_filename' in kwargs:
+                    # If the local filename has folder components, create those folders
+                    local_filename_dir = kwargs['local_filename'].rsplit('/', 1)[0]
+                    if local_filename_dir != kwargs['local_filename'] and not Path(local_filename_dir).is_dir():
+                        makedirs(local_filename_dir)
+                    if 'url' not in kwargs:
+                        kwargs['url'] = kwargs['local_filename']
+
+            ret = self.mets.add_files(files, force=force, ignore=ignore)
+            page_ids = set(kwargs.get('pageId') for kwargs in files)
+            for page_id in [None] if None in page_ids else page_ids:
+                self.image_memo.invalidate(page_id)
+
+            for kwargs, content in zip(files, contents):
+                if content is not None:
+                    if lexists(kwargs['local_filename']):
+                        unlink(kwargs['local_filename'])
+                    with open(kwargs['local_filename'], 'wb') as f:
+                        if isinstance(content, str):
+                            content = bytes(content, 'utf-8')
+                        f.write(content)
+
+        return ret
+
+    def save_mets(self, checkpoint=False):
         """
         Write out the current state of the METS file.
+
+        If the METS records its changes (cf. ``journal``), only append those to
+        the METS journal instead, until ``checkpoint`` is set or the journal has
+        grown larger than the METS file. Backups are only made at checkpoints.
+        Call with ``checkpoint`` when done with the workspace, so that the METS
+        file is complete for tools reading it directly (not as a ``Workspace``).
+
+        With ``mets_cache``, the cache of the METS indexes is updated, too.
         """
+        changes = self.mets.pop_journal()
+        if changes is not None and not checkpoint and exists(self.mets_target):
+            log.info("Journaling %d changes to mets '%s'", len(changes), self.mets_target)
+            if self.mets_journal.append(changes) <= getsize(self.mets_target):
+                return
         log.info("Saving mets '%s'", self.mets_target)
         if self.automatic_backup:
             WorkspaceBackupManager(self).add()
-        with atomic_write(self.mets_target, overwrite=True) as f:
-            f.write(self.mets.to_xml(xmllint=True).decode('utf-8'))
+        with atomic_write(self.mets_target, mode='wb', overwrite=True) as f:
+            self.mets.write_xml(f)
+        self.mets_journal.remove()
+        if self.mets_cache:
+            self.mets.save_cache(self.mets_target)
 
     def resolve_image_exif(self, image_url):
         """
@@ -250,10 +529,11 @@ class Workspace():
         Return
             :class:`OcrdExif`
         """
-        files = self.mets.find_files(url=image_url)
-        f = files[0] if files else OcrdFile(None, url=image_url)
-        image_filename = self.download_file(f).local_filename
-        with Image.open(image_filename) as pil_img:
+        image_path = self._resolve_image_path(image_url)
+        pil_img = self.image_cache.get(image_path)
+        if pil_img is not None:
+            return OcrdExif(pil_img)
+        with Image.open(image_path) as pil_img:
             ocrd_exif = OcrdExif(pil_img)
         return ocrd_exif
 
@@ -261,10 +541,21 @@ class Workspace():
     def resolve_image_as_pil(self, image_url, coords=None):
         return self._resolve_image_as_pil(image_url, coords)
 
+    def _resolve_image_path(self, image_url):
+        """
+        Resolve an image URL to the absolute path of the (downloaded) image.
+        """
+        f = next(self.mets.iter_files(url=image_url, limit=1), None) or OcrdFile(None, url=image_url)
+        return str(Path(self.directory, self.download_file(f).local_filename).resolve())
+
     def _resolve_image_as_pil(self, image_url, coords=None):
         """
         Resolve an image URL to a PIL image.
 
+        Decoded images are cached (cf. ``image_cache``), the image returned
+        is a copy (without ``format``, use :py:meth:`resolve_image_exif` for
+        its metadata).
+
         Args:
             - coords (list) : Coordinates of the bounding box to cut from the image
 
@@ -272,13 +563,7 @@ class Workspace():
             Image or region in image as PIL.Image
 
         """
-        files = self.mets.find_files(url=image_url)
-        f = files[0] if files else OcrdFile(None, url=image_url)
-        image_filename = self.download_file(f).local_filename
-
-        with pushd_popd(self.directory):
-            pil_image = Image.open(image_filename)
-            pil_image.load() # alloc and give up the FD
+        pil_image = self.image_cache.open(self._resolve_image_path(image_url))
 
         if coords is None:
             return pil_image
@@ -298,7 +583,7 @@ class Workspace():
 
     def image_from_page(self, page, page_id,
                         fill='background', transparency=False,
-                        feature_selector='', feature_filter=''):
+                        feature_selector='', feature_filter='', lazy=False):
         """Extract an image for a PAGE-XML page from the workspace.
 
         Given ``page``, a PAGE PageType object, extract its PIL.Image,
@@ -328,7 +613,8 @@ class Workspace():
         Areas outside the polygon will be filled according to ``fill``:
 
         - if ``background`` (the default),
-          then fill with the median color of the image;
+          then fill with the median color of the image (estimated once
+          from the image file, and passed down as ``background``);
         - otherwise, use the given color, e.g. ``white`` or (255,255,255).
 
         Moreover, if ``transparency`` is true, and unless the image already
@@ -336,6 +622,11 @@ class Workspace():
         before cropping and rotating. (Thus, only the exposed areas will be
         transparent afterwards, for those that can interpret alpha channels).
 
+        If ``lazy`` is true, and the chosen image need not be cropped or
+        rotated, then return it as an :py:class:`ImageSource` instead of
+        decoding it, so ``image_from_segment`` will only decode the parts
+        needed for its segments.
+
         Return a tuple:
 
          * the extracted image,
@@ -348,6 +639,7 @@ class Workspace():
            - ``angle``: the rotation/reflection angle applied to the image so far,
            - ``features``: the AlternativeImage @comments for the image, i.e.
              names of all operations that lead up to this result,
+           - ``background``: the color filled in (if ``fill`` is ``background``),
 
          * an OcrdExif instance associated with the original image.
 
@@ -365,15 +657,26 @@ class Workspace():
                  feature_filter='binarized,grayscale_normalized')
            ``
         """
-        page_image = self._resolve_image_as_pil(page.imageFilename)
-        page_image_info = OcrdExif(page_image)
+        memo_key = None
+        if self.image_memo.max_size and not lazy:
+            border = page.get_Border()
+            memo_key = ('page', page_id, page.imageFilename,
+                        tuple((image.filename, image.comments) for image in page.get_AlternativeImage()),
+                        border.get_Coords().points if border else None, page.get_orientation(),
+                        feature_selector, feature_filter, fill, transparency)
+            ret = self.image_memo.get(memo_key)
+            if ret is not None:
+                return ret
+        # only read the header of the original image here, it need not be
+        # decoded at all if an AlternativeImage is used (see below):
+        page_image_info = self.resolve_image_exif(page.imageFilename)
         page_coords = dict()
         # use identity as initial affine coordinate transform:
         page_coords['transform'] = np.eye(3)
         # interim bbox (updated with each change to the transform):
-        page_bbox = [0, 0, page_image.width, page_image.height]
+        page_bbox = [0, 0, page_image_info.width, page_image_info.height]
         page_xywh = {'x': 0, 'y': 0,
-                     'w': page_image.width, 'h': page_image.height}
+                     'w': page_image_info.width, 'h': page_image_info.height}
         
         border = page.get_Border()
         # page angle: PAGE @orientation is defined clockwise,
@@ -391,32 +694,14 @@ class Workspace():
         
         # initialize AlternativeImage@comments classes as empty:
         page_coords['features'] = ''
-        alternative_image = None
-        alternative_images = page.get_AlternativeImage()
-        if alternative_images:
-            # (e.g. from page-level cropping, binarization, deskewing or despeckling)
-            if feature_selector or feature_filter:
-                alternative_image = None
-                # search from the end, because by convention we always append,
-                # and among multiple satisfactory images we want the most recent:
-                for alternative_image in reversed(alternative_images):
-                    features = alternative_image.get_comments()
-                    if (all(feature in features
-                            for feature in feature_selector.split(',') if feature) and
-                        not any(feature in features
-                                for feature in feature_filter.split(',') if feature)):
-                        break
-                    else:
-                        alternative_image = None
-            else:
-                alternative_image = alternative_images[-1]
-                features = alternative_image.get_comments()
-            if alternative_image:
-                log.debug("Using AlternativeImage %d (%s) for page '%s'",
-                          alternative_images.index(alternative_image) + 1,
-                          features, page_id)
-                page_image = self._resolve_image_as_pil(alternative_image.get_filename())
-                page_coords['features'] = features
+        # (e.g. from page-level cropping, binarization, deskewing or despeckling)
+        alternative_image = _select_alternative_image(page, feature_selector, feature_filter)
+        if alternative_image:
+            features = alternative_image.get_comments()
+            log.debug("Using AlternativeImage %d (%s) for page '%s'",
+                      page.get_AlternativeImage().index(alternative_image) + 1,
+                      features, page_id)
+            page_coords['features'] = features
         
         # adjust the coord transformation to the steps applied on the image,
         # and apply steps on the existing image in case it is missing there,
@@ -428,22 +713,32 @@ class Workspace():
         # This helps deal with arbitrary workflows (e.g. crop then deskew,
         # or deskew then crop), regardless of where images are generated.
         alternative_image_features = page_coords['features'].split(',')
+        operations = ((['cropped']
+                       if (border and
+                           not 'cropped' in page_coords['features'] and
+                           not 'cropped' in feature_filter.split(','))
+                       else []) +
+                      (['rotated-%d' % orientation]
+                       if (orientation and
+                           not 'rotated-%d' % orientation in page_coords['features'] and
+                           not 'rotated-%d' % orientation in feature_filter.split(','))
+                       else []) +
+                      (['deskewed']
+                       if (skew and
+                           not 'deskewed' in page_coords['features'] and
+                           not 'deskewed' in feature_filter.split(','))
+                       else []))
+        page_image_url = alternative_image.get_filename() if alternative_image else page.imageFilename
+        if lazy and not operations:
+            page_image = ImageSource(self._resolve_image_path(page_image_url), image_cache=self.image_cache)
+        else:
+            page_image = self._resolve_image_as_pil(page_image_url)
+        if fill == 'background':
+            # estimate once, for all operations on this image and its segments:
+            page_coords['background'] = self._image_background(page_image)
+        pending_transposition = None
         for i, feature in enumerate(alternative_image_features +
-                                    (['cropped']
-                                     if (border and
-                                         not 'cropped' in page_coords['features'] and
-                                         not 'cropped' in feature_filter.split(','))
-                                     else []) +
-                                    (['rotated-%d' % orientation]
-                                     if (orientation and
-                                         not 'rotated-%d' % orientation in page_coords['features'] and
-                                         not 'rotated-%d' % orientation in feature_filter.split(','))
-                                     else []) +
-                                    (['deskewed']
-                                     if (skew and
-                                         not 'deskewed' in page_coords['features'] and
-                                         not 'deskewed' in feature_filter.split(','))
-                                     else []) +
+                                    operations +
                                     # not a feature to be added, but merely as a fallback position
                                     # to always enter loop at i == len(alternative_image_features)
                                     ['_check']):
@@ -467,7 +762,7 @@ class Workspace():
                 log.debug("Using explicitly set page border '%s' for page '%s'",
                           page_points, page_id)
                 # get polygon outline of page border:
-                page_polygon = np.array(polygon_from_points(page_points), dtype=np.int32)
+                page_polygon = border.get_Coords().get_polygon().astype(np.int32)
                 page_polygon = transform_coordinates(page_polygon, page_coords['transform'])
                 page_polygon = np.round(page_polygon).astype(np.int32)
                 page_bbox = bbox_from_polygon(page_polygon)
@@ -484,11 +779,10 @@ class Workspace():
                     log.debug("Cropping %s for page '%s' to border", 
                               "AlternativeImage" if alternative_image else "image",
                               page_id)
-                    # create a mask from the page polygon:
+                    # crop into page rectangle, and mask with the page polygon:
                     page_image = image_from_polygon(page_image, page_polygon,
-                                                    fill=fill, transparency=transparency)
-                    # recrop into page rectangle:
-                    page_image = crop_image(page_image, box=page_bbox)
+                                                    fill=_background_fill(page_image, fill, page_coords.get('background')),
+                                                    transparency=transparency, crop=True)
                     page_coords['features'] += ',cropped'
 
             elif feature == 'rotated-%d' % orientation:
@@ -511,11 +805,11 @@ class Workspace():
                     log.info("Transposing %s for page '%s' by %d°",
                              "AlternativeImage" if alternative_image else
                              "image", page_id, orientation)
-                    page_image = transpose_image(page_image, {
-                        90: Image.ROTATE_90,
-                        180: Image.ROTATE_180,
-                        270: Image.ROTATE_270
-                    }.get(orientation)) # no default
+                    if self.image_engine == 'cv2':
+                        # together with deskewing (if any)
+                        pending_transposition = transposition
+                    else:
+                        page_image = transpose_image(page_image, transposition)
                     page_coords['features'] += ',rotated-%d' % orientation
             elif feature == 'deskewed':
                 # Rotate around center in affine coordinate transform:
@@ -531,11 +825,21 @@ class Workspace():
                     log.info("Rotating %s for page '%s' by %.2f°",
                              "AlternativeImage" if alternative_image else
                              "image", page_id, skew)
-                    page_image = rotate_image(page_image, skew,
-                                              fill=fill, transparency=transparency)
+                    if self.image_engine == 'cv2':
+                        page_image = warp_image(page_image, pending_transposition, skew,
+                                                fill=_background_fill(page_image, fill, page_coords.get('background'), alpha=0),
+                                                transparency=transparency)
+                        pending_transposition = None
+                    else:
+                        page_image = rotate_image(page_image, skew,
+                                                  fill=_background_fill(page_image, fill, page_coords.get('background'), alpha=0),
+                                                  transparency=transparency)
                     page_coords['features'] += ',deskewed'
                 (page_xywh['w'], page_xywh['h']) = adjust_canvas_to_rotation(
                     [page_xywh['w'], page_xywh['h']], skew)
+        if pending_transposition is not None:
+            # (not deskewing)
+            page_image = transpose_image(page_image, pending_transposition)
         
         # verify constraints again:
         if not all(feature in page_coords['features']
@@ -549,6 +853,8 @@ class Workspace():
                             'filter="%s" in page "%s"' % (
                                 feature_filter, page_id))
         page_image.format = 'PNG' # workaround for tesserocr#194
+        if memo_key:
+            return self.image_memo.put(page_id, memo_key, (page_image, page_coords, page_image_info))
         return page_image, page_coords, page_image_info
 
     def image_from_segment(self, segment, parent_image, parent_coords,
@@ -587,7 +893,8 @@ class Workspace():
         Areas outside the polygon will be filled according to ``fill``:
 
         - if ``background`` (the default),
-          then fill with the median color of the image;
+          then fill with the median color of the image (passed down from
+          the parent as ``background``, or estimated from the AlternativeImage);
         - otherwise, use the given color, e.g. ``white`` or (255,255,255).
 
         Moreover, if ``transparency`` is true, and unless the image already
@@ -619,7 +926,8 @@ class Workspace():
              orientation angle (if any)
            - ``angle``: the rotation/reflection angle applied to the image so far,
            - ``features``: the AlternativeImage @comments for the image, i.e.
-             names of all operations that lead up to this result.
+             names of all operations that lead up to this result,
+           - ``background``: the color filled in (if ``fill`` is ``background``).
 
         (These can be used to create a new AlternativeImage, or passed down
          for calls on lower hierarchy levels.)
@@ -648,19 +956,144 @@ class Workspace():
         # a dedicated processor for this (which produces clipped AlternativeImage
         # or reduced polygon coordinates).
         
-        # get polygon outline of segment relative to parent image:
-        segment_polygon = coordinates_of_segment(segment, parent_image, parent_coords)
+        memo_page_id, memo_key = None, None
+        if self.image_memo.max_size:
+            # only memoize segments of memoized parents (which are thus of a known page)
+            memo_page_id, parent_key = self.image_memo.origin(parent_image)
+            if parent_key:
+                memo_key = self._segment_memo_key(segment, parent_key, parent_coords, fill, transparency,
+                                                  feature_selector, feature_filter)
+                ret = self.image_memo.get(memo_key)
+                if ret is not None:
+                    return ret
+        ret = self._image_from_segment(segment, parent_image, parent_coords,
+                                       self._segment_background(parent_image, parent_coords, fill),
+                                       fill, transparency, feature_selector, feature_filter)
+        if memo_key:
+            return self.image_memo.put(memo_page_id, memo_key, ret)
+        return ret
+
+    def image_from_segments(self, segments, parent_image, parent_coords,
+                            fill='background', transparency=False,
+                            feature_selector='', feature_filter='', max_workers=1):
+        """Extract images for many PAGE-XML segments from their parent's image.
+
+        Same as calling :py:meth:`image_from_segment` for each of ``segments``
+        (all contained in the same parent), but the background color is only
+        determined once (unless passed down in ``parent_coords`` already).
+
+        If ``max_workers`` is larger than 1, then extract that many segments
+        in parallel threads.
+
+        Return a generator of tuples (image, coordinates) in the order of
+        ``segments``, cf. :py:meth:`image_from_segment`.
+
+        Example:
+
+         * get raw images of all lines of a region:
+
+           ``for line, (image, coords) in zip(lines, workspace.image_from_segments(lines,
+                 region_image, region_coords, feature_filter='binarized')):``
+        """
+        segments = list(segments)
+        memo_page_id, memo_keys, results = None, [None] * len(segments), [None] * len(segments)
+        if self.image_memo.max_size:
+            # only memoize segments of memoized parents (which are thus of a known page)
+            memo_page_id, parent_key = self.image_memo.origin(parent_image)
+            if parent_key:
+                memo_keys = [self._segment_memo_key(segment, parent_key, parent_coords, fill, transparency,
+                                                    feature_selector, feature_filter)
+                             for segment in segments]
+                results = [self.image_memo.get(memo_key) for memo_key in memo_keys]
+        todo = [segment for segment, ret in zip(segments, results) if ret is None]
+        if not todo:
+            yield from results
+            return
+        background = self._segment_background(parent_image, parent_coords, fill)
+        # get polygon outlines of all segments relative to parent image at once:
+        polygons = coordinates_of_segments(todo, parent_image, parent_coords)
+        image_paths = [None] * len(todo)
+        def extract(segment, segment_polygon, image_path):
+            return self._image_from_segment(segment, parent_image, parent_coords, background,
+                                            fill, transparency, feature_selector, feature_filter,
+                                            segment_polygon=segment_polygon, image_path=image_path)
+        executor = None
+        if max_workers > 1 and len(todo) > 1:
+            # resolve (i.e. possibly download and update in the METS) the AlternativeImages
+            # to use in this thread, because the METS must not be changed in parallel
+            image_paths = [self._resolve_image_path(alternative_image.get_filename()) if alternative_image else None
+                           for alternative_image in (_select_alternative_image(segment, feature_selector, feature_filter)
+                                                     for segment in todo)]
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            extracted = executor.map(extract, todo, polygons, image_paths)
+        else:
+            extracted = map(extract, todo, polygons, image_paths)
+        try:
+            for memo_key, ret in zip(memo_keys, results):
+                if ret is None:
+                    ret = next(extracted)
+                    if memo_key:
+                        ret = self.image_memo.put(memo_page_id, memo_key, ret)
+                yield ret
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+
+    def _segment_memo_key(self, segment, parent_key, parent_coords, fill, transparency,
+                          feature_selector, feature_filter):
+        return ('segment', parent_key, parent_coords['transform'].tobytes(),
+                parent_coords.get('angle'), parent_coords.get('features'),
+                segment.id, segment.get_Coords().points, segment.__dict__.get('orientation'),
+                tuple((image.filename, image.comments) for image in segment.get_AlternativeImage()),
+                feature_selector, feature_filter, fill, transparency)
+
+    def _segment_background(self, parent_image, parent_coords, fill):
+        """
+        Get the color to fill segments of ``parent_image`` with outside their polygon.
+        """
+        if fill != 'background':
+            return fill
+        if 'background' in parent_coords:
+            # estimated for the parent already
+            return parent_coords['background']
+        return self._image_background(parent_image)
+
+    def _image_background(self, image):
+        """
+        Estimate the background color of ``image`` (cf. :py:func:`ocrd_utils.estimate_background`),
+        subsampling large images to about ``BACKGROUND_SAMPLE_SIZE`` pixels.
+        """
+        if isinstance(image, ImageSource):
+            # (without decoding the whole image at once)
+            return tuple(ImageStat.Stat(image.histogram()).median)
+        subsample = int((image.width * image.height / BACKGROUND_SAMPLE_SIZE) ** 0.5)
+        return estimate_background(image, subsample=max(1, subsample))
+
+    def _image_from_segment(self, segment, parent_image, parent_coords, background,
+                            fill, transparency, feature_selector, feature_filter,
+                            segment_polygon=None, image_path=None):
+        """
+        Extract the image for ``segment`` (cf. :py:meth:`image_from_segment`),
+        cropping and masking only its bounding box with color ``background``
+        outside the polygon (``segment_polygon``, if already known).
+
+        If the segment has a matching AlternativeImage, it is taken from
+        ``image_path`` if already resolved, otherwise resolved here.
+        """
+        if segment_polygon is None:
+            # get polygon outline of segment relative to parent image:
+            segment_polygon = coordinates_of_segment(segment, parent_image, parent_coords)
         # get relative bounding box:
         segment_bbox = bbox_from_polygon(segment_polygon)
         # get size of the segment in the parent image after cropping
         # (i.e. possibly different from size before rotation at the parent, but
         #  also possibly different from size after rotation below/AlternativeImage):
         segment_xywh = xywh_from_bbox(*segment_bbox)
-        # create a mask from the segment polygon:
+        # crop (or only decode) the segment rectangle of the parent image,
+        # and mask it with the segment polygon:
         segment_image = image_from_polygon(parent_image, segment_polygon,
-                                           fill=fill, transparency=transparency)
-        # recrop into segment rectangle:
-        segment_image = crop_image(segment_image, box=segment_bbox)
+                                           fill=_background_fill(parent_image, fill, background),
+                                           transparency=transparency, crop=True)
         # subtract offset from parent in affine coordinate transform:
         # (consistent with image cropping)
         segment_coords = {
@@ -727,54 +1160,52 @@ class Workspace():
              if feature in ['binarized', 'grayscale_normalized',
                             'despeckled', 'dewarped']])
         
-        alternative_image = None
-        alternative_images = segment.get_AlternativeImage()
-        if alternative_images:
-            # (e.g. from segment-level cropping, binarization, deskewing or despeckling)
-            if feature_selector or feature_filter:
-                alternative_image = None
-                # search from the end, because by convention we always append,
-                # and among multiple satisfactory images we want the most recent:
-                for alternative_image in reversed(alternative_images):
-                    features = alternative_image.get_comments()
-                    if (all(feature in features
-                            for feature in feature_selector.split(',') if feature) and
-                        not any(feature in features
-                                for feature in feature_filter.split(',') if feature)):
-                        break
-                    else:
-                        alternative_image = None
-            else:
-                alternative_image = alternative_images[-1]
-                features = alternative_image.get_comments()
-            if alternative_image:
-                log.debug("Using AlternativeImage %d (%s) for segment '%s'",
-                          alternative_images.index(alternative_image) + 1,
-                          features, segment.id)
-                segment_image = self._resolve_image_as_pil(alternative_image.get_filename())
-                segment_coords['features'] = features
+        # (e.g. from segment-level cropping, binarization, deskewing or despeckling)
+        alternative_image = _select_alternative_image(segment, feature_selector, feature_filter)
+        if alternative_image:
+            features = alternative_image.get_comments()
+            log.debug("Using AlternativeImage %d (%s) for segment '%s'",
+                      segment.get_AlternativeImage().index(alternative_image) + 1,
+                      features, segment.id)
+            if image_path is None:
+                image_path = self._resolve_image_path(alternative_image.get_filename())
+            segment_image = self.image_cache.open(image_path)
+            segment_coords['features'] = features
+            if fill == 'background':
+                background = self._image_background(segment_image)
+        if fill == 'background':
+            segment_coords['background'] = background
         # transpose, if (still) necessary:
+        pending_transposition = None
         if (orientation and
             not 'rotated-%d' % orientation in segment_coords['features'] and
             not 'rotated-%d' % orientation in feature_filter.split(',')):
             log.info("Transposing %s for segment '%s' by %d°",
                      "AlternativeImage" if alternative_image else
                      "image", segment.id, orientation)
-            segment_image = transpose_image(segment_image, {
+            transposition = {
                 90: Image.ROTATE_90,
                 180: Image.ROTATE_180,
                 270: Image.ROTATE_270
-            }.get(orientation)) # no default
+            }.get(orientation) # no default
+            if self.image_engine == 'cv2':
+                # together with deskewing (if any)
+                pending_transposition = transposition
+            else:
+                segment_image = transpose_image(segment_image, transposition)
             segment_coords['features'] += ',rotated-%d' % orientation
         if (orientation and
             not 'rotated-%d' % orientation in feature_filter.split(',')):
             # FIXME we should enforce consistency here (i.e. split into transposition
             #       and minimal rotation)
-            if not (segment_image.width == segment_xywh['w'] and
-                    segment_image.height == segment_xywh['h']):
+            width, height = segment_image.size
+            if pending_transposition in [Image.ROTATE_90, Image.ROTATE_270]:
+                width, height = height, width
+            if not (width == segment_xywh['w'] and
+                    height == segment_xywh['h']):
                 log.error('segment "%s" image (%s; %dx%d) has not been transposed properly (%dx%d) during rotation',
                           segment.id, segment_coords['features'],
-                          segment_image.width, segment_image.height,
+                          width, height,
                           segment_xywh['w'], segment_xywh['h'])
         # deskew, if (still) necessary:
         if (skew and
@@ -783,9 +1214,19 @@ class Workspace():
             log.info("Rotating %s for segment '%s' by %.2f°",
                      "AlternativeImage" if alternative_image else
                      "image", segment.id, skew)
-            segment_image = rotate_image(segment_image, skew,
-                                         fill=fill, transparency=transparency)
+            if self.image_engine == 'cv2':
+                segment_image = warp_image(segment_image, pending_transposition, skew,
+                                           fill=_background_fill(segment_image, fill, background, alpha=0),
+                                           transparency=transparency)
+                pending_transposition = None
+            else:
+                segment_image = rotate_image(segment_image, skew,
+                                             fill=_background_fill(segment_image, fill, background, alpha=0),
+                                             transparency=transparency)
             segment_coords['features'] += ',deskewed'
+        if pending_transposition is not None:
+            # (not deskewing)
+            segment_image = transpose_image(segment_image, pending_transposition)
         if (skew and
             not 'deskewed' in feature_filter.split(',')):
             # FIXME we should enforce consistency here (i.e. rotation always reshapes,
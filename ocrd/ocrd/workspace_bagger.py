@@ -13,6 +13,7 @@ from bagit import Bag, make_manifests  # pylint: disable=no-name-in-module
 from ocrd_utils import (
     pushd_popd,
     getLogger,
+    import_file,
     is_local_filename,
     unzip_file_to_dir,
 
@@ -23,6 +24,7 @@ from ocrd_validators.constants import BAGIT_TXT, TMP_BAGIT_PREFIX, OCRD_BAGIT_PR
 from ocrd_modelfactory import page_from_file
 from ocrd_models.ocrd_page import to_xml
 
+from .constants import DOWNLOAD_VALIDATORS_DIR
 from .workspace import Workspace
 
 tempfile.tempdir = '/tmp' # TODO hard-coded
@@ -33,6 +35,9 @@ BACKUPDIR = join('/tmp', TMP_BAGIT_PREFIX + 'backup')
 class WorkspaceBagger():
     """
     Serialize/De-serialize from OCRD-ZIP to workspace and back.
+
+    Payload files are imported with the import strategy of the resolver
+    (cf. :py:func:`ocrd_utils.import_file`).
     """
 
     def __init__(self, resolver, strict=False):
@@ -93,6 +98,12 @@ class WorkspaceBagger():
             with open(join(bagdir, 'data', ocrd_mets), 'wb') as f:
                 f.write(workspace.mets.to_xml())
 
+        # ETag/Last-Modified of the downloads are not part of the payload
+        for file_grp_dir, dirnames, _ in walk(join(bagdir, 'data')):
+            if DOWNLOAD_VALIDATORS_DIR in dirnames:
+                dirnames.remove(DOWNLOAD_VALIDATORS_DIR)
+                rmtree(join(file_grp_dir, DOWNLOAD_VALIDATORS_DIR))
+
         # Walk through bagged workspace and fix the PAGE
         # Page/@imageFilename and
         # AlternativeImage/@filename
@@ -168,6 +179,8 @@ class WorkspaceBagger():
             raise Exception("Setting 'dest' and 'in_place' is a contradiction")
         if in_place and not skip_zip:
             raise Exception("Setting 'skip_zip' and not 'in_place' is a contradiction")
+        if in_place and self.resolver.import_strategy == 'symlink':
+            raise Exception("Cannot bag in place with import strategy 'symlink'")
 
         if tag_files is None:
             tag_files = []
@@ -234,6 +247,9 @@ class WorkspaceBagger():
                 raise Exception("Directory exists: %s" % new_dest)
             dest = new_dest
 
+        if self.resolver.import_strategy == 'symlink':
+            raise Exception("Cannot spill with import strategy 'symlink'")
+
         log.info("Spilling %s to %s", src, dest)
 
         bagdir = mkdtemp(prefix=TMP_BAGIT_PREFIX)
@@ -247,8 +263,8 @@ class WorkspaceBagger():
                 destfile = join(destdir, f)
                 if not exists(destdir):
                     makedirs(destdir)
-                log.debug("Copy %s -> %s", srcfile, destfile)
-                copyfile(srcfile, destfile)
+                log.debug("Import (%s) %s -> %s", self.resolver.import_strategy, srcfile, destfile)
+                import_file(srcfile, destfile, self.resolver.import_strategy)
 
         # TODO copy allowed tag files if present
 
@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from copy import copy
+from os import stat
+from threading import RLock
+import weakref
+
+from PIL import Image
+
+from ocrd_utils import getLogger
+
+def _image_nbytes(image):
+    """
+    Size of the pixel data of a decoded ``image`` (PIL stores multi-band
+    images with 4 bytes per pixel).
+    """
+    if image.mode in ('1', 'L', 'P'):
+        pixel_size = 1
+    elif image.mode.startswith('I;16'):
+        pixel_size = 2
+    else:
+        pixel_size = 4
+    return image.width * image.height * pixel_size
+
+class WorkspaceImageCache():
+    """
+    Least-recently-used cache of decoded images of a workspace, keyed by their
+    (resolved) path and invalidated when the file changes (size or modification
+    time).
+
+    The cached images are never handed out, only copies of them (or, for images
+    too large to cache, the decoded image itself), so callers may change the
+    images they get.
+    """
+
+    def __init__(self, max_size):
+        """
+        Args:
+            max_size (integer): Maximum total size of the pixel data in bytes
+                (images larger than that are not cached)
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # path: (stamp, image), least recently used first
+        self._images = OrderedDict()
+        # (images are decoded outside of it, in parallel)
+        self._lock = RLock()
+
+    def _stamp(self, path):
+        st = stat(path)
+        return (st.st_size, st.st_mtime_ns)
+
+    def get(self, path):
+        """
+        Get the cached decoded image at ``path`` (not a copy, so must not be
+        changed), or ``None`` if it is not cached or changed since.
+        """
+        with self._lock:
+            entry = self._images.get(path)
+            if entry is None:
+                return None
+            if entry[0] != self._stamp(path):
+                self._remove(path)
+                return None
+            self._images.move_to_end(path)
+            return entry[1]
+
+    def open(self, path):
+        """
+        Decode the image at ``path`` (if not cached yet) and return a copy of it.
+
+        Images larger than ``max_size`` are not cached, so they are returned
+        as decoded, without copying.
+        """
+        log = getLogger('ocrd.workspace_image_cache.open')
+        with self._lock:
+            image = self.get(path)
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if image is not None:
+            return image.copy()
+        stamp = self._stamp(path)
+        image = Image.open(path)
+        image.load() # alloc and give up the FD
+        nbytes = _image_nbytes(image)
+        if nbytes > self.max_size:
+            log.debug("Not caching %s (%d bytes)", path, nbytes)
+            return image
+        with self._lock:
+            if path in self._images:
+                # decoded in parallel
+                self._remove(path)
+            while self.size + nbytes > self.max_size:
+                self._remove(next(iter(self._images)))
+            self._images[path] = (stamp, image)
+            self.size += nbytes
+        return image.copy()
+
+    def _remove(self, path):
+        _, image = self._images.pop(path)
+        self.size -= _image_nbytes(image)
+
+    def clear(self):
+        """
+        Remove all images from the cache.
+        """
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+
+class WorkspaceImageMemo():
+    """
+    Least-recently-used memo of the results of ``Workspace.image_from_page``
+    and ``Workspace.image_from_segment``, by page.
+
+    Results are only stored for the keys given, so the keys must capture
+    everything the result depends on. Callers get copies of the results (so
+    may change them). Such a copy can in turn be passed as the parent image
+    to ``image_from_segment``, whose result is then memoized under the same
+    page (cf. ``origin``), so invalidating a page drops its segments, too.
+    """
+
+    def __init__(self, max_size):
+        """
+        Args:
+            max_size (integer): Maximum total size of the images in bytes
+                (``0`` to disable)
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # key: (page_id, result), least recently used first
+        self._results = OrderedDict()
+        # id of an image handed out: (weak reference to it, page_id, key)
+        self._origins = {}
+
+    def origin(self, image):
+        """
+        Get the page ID and key of the memoized result ``image`` is a copy of,
+        or ``(None, None)``.
+        """
+        image_ref, page_id, key = self._origins.get(id(image), (None, None, None))
+        if image_ref is None or image_ref() is not image or key not in self._results:
+            return None, None
+        return page_id, key
+
+    def get(self, key):
+        """
+        Get a copy of the result memoized for ``key``, or ``None``.
+        """
+        entry = self._results.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        return self._copy(entry[0], key, entry[1])
+
+    def put(self, page_id, key, result):
+        """
+        Memoize ``result`` (a tuple of image, coordinates and possibly more) for
+        ``key`` under ``page_id``, and return a copy of it.
+        """
+        nbytes = _image_nbytes(result[0])
+        if nbytes > self.max_size:
+            return result
+        while self.size + nbytes > self.max_size:
+            self._remove(next(iter(self._results)))
+        self._results[key] = (page_id, result)
+        self.size += nbytes
+        return self._copy(page_id, key, result)
+
+    def _copy(self, page_id, key, result):
+        image, coords = result[0].copy(), dict(result[1])
+        coords['transform'] = coords['transform'].copy()
+        def forget(image_ref, image_id=id(image)):
+            if self._origins.get(image_id, (None,))[0] is image_ref:
+                del self._origins[image_id]
+        self._origins[id(image)] = (weakref.ref(image, forget), page_id, key)
+        return (image, coords) + tuple(copy(item) for item in result[2:])
+
+    def _remove(self, key):
+        _, result = self._results.pop(key)
+        self.size -= _image_nbytes(result[0])
+
+    def invalidate(self, page_id=None):
+        """
+        Drop the results for ``page_id`` (or all results if ``None``).
+        """
+        for key in [key for key, (key_page_id, _) in self._results.items()
+                    if page_id is None or key_page_id == page_id]:
+            self._remove(key)
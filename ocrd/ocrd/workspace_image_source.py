@@ -0,0 +1,216 @@
+from mmap import mmap, ACCESS_READ
+
+from PIL import Image
+
+from ocrd_utils import getLogger
+
+# number of rows to decode at once when computing the histogram of the whole image
+HISTOGRAM_ROWS = 1024
+
+def _raw_args(args):
+    """
+    Normalize the arguments of a PIL ``raw`` tile to (rawmode, stride, orientation).
+    """
+    if isinstance(args, str):
+        args = (args,)
+    args = tuple(args) + (0, 1)[len(args) - 1:]
+    return args[0], args[1], args[2]
+
+def _intersects(extents, box):
+    return extents[0] < box[2] and box[0] < extents[2] and extents[1] < box[3] and box[1] < extents[3]
+
+def _shift_tile(tile, x, y):
+    extents = (tile[1][0] - x, tile[1][1] - y, tile[1][2] - x, tile[1][3] - y)
+    if hasattr(tile, '_replace'):
+        # named tuple (Pillow >= 11)
+        return tile._replace(extents=extents)
+    return (tile[0], extents) + tuple(tile[2:])
+
+class ImageSource():
+    """
+    Image file which is only decoded as far as needed.
+
+    Opening it only reads the header (``width``, ``height``, ``size``, ``mode``,
+    ``info``, ``format``). :py:meth:`crop` decodes just the strips or tiles of
+    the file which intersect the box, if the image data are stored uncompressed
+    (e.g. striped or tiled TIFF without compression): If there are several
+    strips or tiles, only those are decoded, otherwise only the rows of the
+    box are read from the memory-mapped file. Other images are decoded as a
+    whole (once), and JPEG images can be decoded at reduced scale instead.
+
+    Any other attribute (e.g. PIL.Image methods) is taken from the fully
+    decoded image, so an ``ImageSource`` can be passed where a PIL.Image is
+    expected, but does not save anything then. That image is a copy of its own
+    (never the one in the image cache), so in-place methods do not affect
+    other users of the cache.
+    """
+
+    def __init__(self, path, image_cache=None):
+        """
+        Args:
+            path (string): Path of the image file
+            image_cache (:py:class:`ocrd.workspace_image_cache.WorkspaceImageCache`):
+                Cache to take the decoded image from (if it is cached), and to
+                decode the whole image through
+        """
+        self.path = path
+        self._image_cache = image_cache
+        self._image = None
+        self._histogram = None
+        with Image.open(path) as image:
+            self.format = image.format
+            self.mode = image.mode
+            self.size = image.size
+            self.info = dict(image.info)
+            self._tile = list(image.tile)
+            # (TIFF) orientation other than top-left would be applied when decoding
+            self._oriented = hasattr(image, 'tag_v2') and image.tag_v2.get(274, 1) != 1
+        self.width, self.height = self.size
+
+    def __getattr__(self, name):
+        if name.startswith('_') and name != '__array_interface__':
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def load(self):
+        """
+        Decode the whole image (once).
+
+        Returns:
+            PIL.Image (a copy of the cached image, if any, which is also used
+            by all further calls of this ``ImageSource``)
+        """
+        if self._image is None:
+            if self._image_cache:
+                image = self._image_cache.open(self.path)
+            else:
+                image = Image.open(self.path)
+                image.load()
+            self._image = image
+        return self._image
+
+    def _decoded(self):
+        """
+        The whole image if decoded already (by this ``ImageSource`` or in the
+        image cache), or ``None``. Must only be read from.
+        """
+        if self._image is None and self._image_cache:
+            return self._image_cache.get(self.path)
+        return self._image
+
+    @property
+    def partial(self):
+        """
+        Whether parts of the image can be decoded without decoding all of it.
+        """
+        if self._oriented or not self._tile or any(tile[0] != 'raw' for tile in self._tile):
+            return False
+        return len(self._tile) > 1 or self._row_stride() is not None
+
+    def _row_stride(self):
+        """
+        Number of bytes per row of a single uncompressed tile covering the
+        whole image, or ``None`` if that is not how the image is stored.
+        """
+        if len(self._tile) != 1 or tuple(self._tile[0][1]) != (0, 0, self.width, self.height):
+            return None
+        rawmode, stride, _ = _raw_args(self._tile[0][3])
+        if stride:
+            return stride
+        try:
+            return len(Image.new(self.mode, (self.width, 1)).tobytes('raw', rawmode))
+        except (ValueError, KeyError, OSError):
+            return None
+
+    def crop(self, box, reduce=1):
+        """
+        Decode the rectangle ``box`` (x0, y0, x1, y1) of the image.
+
+        Like ``PIL.Image.crop``, areas outside the image are black.
+
+        Args:
+            reduce (integer): Decode at ``1/reduce`` scale, so ``box`` and the
+                result are ``reduce`` times smaller than the original.
+                (JPEG images are then only decoded at that scale.)
+
+        Returns:
+            PIL.Image
+        """
+        log = getLogger('ocrd.workspace_image_source.crop')
+        box = tuple(int(x) for x in box)
+        decoded = self._decoded()
+        if reduce > 1:
+            if decoded is None and self.format == 'JPEG':
+                with Image.open(self.path) as image:
+                    image.draft(self.mode, (self.width // reduce, self.height // reduce))
+                    image = image.resize((self.width // reduce, self.height // reduce))
+                return image.crop(box)
+            full_box = tuple(x * reduce for x in box)
+            return self.crop(full_box).resize((max(box[2] - box[0], 1), max(box[3] - box[1], 1)))
+        if decoded is not None:
+            return decoded.crop(box)
+        if not self.partial:
+            return self.load().crop(box)
+        # clip to the image, then pad the result as PIL would
+        clipped = (max(box[0], 0), max(box[1], 0), min(box[2], self.width), min(box[3], self.height))
+        if clipped[0] >= clipped[2] or clipped[1] >= clipped[3]:
+            return Image.new(self.mode, (box[2] - box[0], box[3] - box[1]))
+        log.debug("Decoding %s of %s", clipped, self.path)
+        if len(self._tile) > 1:
+            image = self._crop_tiles(clipped)
+        else:
+            image = self._crop_rows(clipped)
+        if clipped == box:
+            return image
+        padded = Image.new(self.mode, (box[2] - box[0], box[3] - box[1]))
+        padded.paste(image, (clipped[0] - box[0], clipped[1] - box[1]))
+        return padded
+
+    def _crop_tiles(self, box):
+        """
+        Decode only the tiles (or strips) of the image intersecting ``box``.
+        """
+        tiles = [tile for tile in self._tile if _intersects(tile[1], box)]
+        x0 = min(tile[1][0] for tile in tiles)
+        y0 = min(tile[1][1] for tile in tiles)
+        x1 = max(tile[1][2] for tile in tiles)
+        y1 = max(tile[1][3] for tile in tiles)
+        with Image.open(self.path) as image:
+            # decode into an image of just the size of these tiles
+            image._size = (x1 - x0, y1 - y0) # pylint: disable=protected-access
+            image.tile = [_shift_tile(tile, x0, y0) for tile in tiles]
+            image.load()
+            return image.crop((box[0] - x0, box[1] - y0, box[2] - x0, box[3] - y0))
+
+    def _crop_rows(self, box):
+        """
+        Read only the rows of ``box`` from the (memory-mapped) uncompressed image.
+        """
+        _, _, offset, args = self._tile[0][:4]
+        rawmode, _, orientation = _raw_args(args)
+        stride = self._row_stride()
+        # bottom-up images (orientation -1) store the last row first
+        first_row = box[1] if orientation > 0 else self.height - box[3]
+        with open(self.path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+            rows = data[offset + first_row * stride:offset + (first_row + box[3] - box[1]) * stride]
+        image = Image.frombytes(self.mode, (self.width, box[3] - box[1]), rows, 'raw', rawmode, stride, orientation)
+        return image.crop((box[0], 0, box[2], box[3] - box[1]))
+
+    def histogram(self):
+        """
+        Histogram of the whole image (cf. ``PIL.Image.histogram``), decoded in
+        parts if possible (so the image need not be in memory as a whole).
+        """
+        if self._histogram is None:
+            decoded = self._decoded()
+            if decoded is not None:
+                self._histogram = decoded.histogram()
+            elif not self.partial:
+                self._histogram = self.load().histogram()
+            else:
+                histogram = None
+                for y in range(0, self.height, HISTOGRAM_ROWS):
+                    part = self.crop((0, y, self.width, min(y + HISTOGRAM_ROWS, self.height))).histogram()
+                    histogram = part if histogram is None else [a + b for a, b in zip(histogram, part)]
+                self._histogram = histogram
+        return self._histogram
@@ -0,0 +1,121 @@
+from math import ceil, cos, floor, radians, sin
+
+import cv2
+import numpy as np
+from PIL import Image, ImageColor
+
+from ocrd_utils import estimate_background, getLogger, rotate_image, transpose_image
+
+# image modes which can be warped as 8-bit arrays of up to 4 channels
+WARP_MODES = ['1', 'L', 'LA', 'RGB', 'RGBA']
+
+def _transposition_matrix(method, size):
+    """
+    Get the affine matrix mapping (continuous) coordinates of the result of
+    ``PIL.Image.transpose(method)`` on an image of ``size`` to those of the
+    image, and the size of the result.
+    """
+    w, h = size
+    if method == Image.ROTATE_90:
+        return np.array([[0, -1, w], [1, 0, 0], [0, 0, 1]], dtype=np.float64), (h, w)
+    if method == Image.ROTATE_180:
+        return np.array([[-1, 0, w], [0, -1, h], [0, 0, 1]], dtype=np.float64), (w, h)
+    if method == Image.ROTATE_270:
+        return np.array([[0, 1, 0], [-1, 0, h], [0, 0, 1]], dtype=np.float64), (h, w)
+    raise Exception("Unsupported transposition %s" % method)
+
+def _rotation_matrix(angle, size):
+    """
+    Get the affine matrix mapping (continuous) coordinates of the result of
+    ``PIL.Image.rotate(angle, expand=True)`` on an image of ``size`` to those
+    of the image, and the size of the result (exactly as PIL does).
+    """
+    w, h = size
+    angle = -radians(angle)
+    a, b = round(cos(angle), 15), round(sin(angle), 15)
+    d, e = -b, a
+    # rotate around the center
+    c = a * -w / 2.0 + b * -h / 2.0 + w / 2.0
+    f = d * -w / 2.0 + e * -h / 2.0 + h / 2.0
+    xx = [a * x + b * y + c for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    yy = [d * x + e * y + f for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    nw = ceil(max(xx)) - floor(min(xx))
+    nh = ceil(max(yy)) - floor(min(yy))
+    # expand the canvas symmetrically
+    x, y = -(nw - w) / 2.0, -(nh - h) / 2.0
+    c, f = a * x + b * y + c, d * x + e * y + f
+    return np.array([[a, b, c], [d, e, f], [0, 0, 1]], dtype=np.float64), (nw, nh)
+
+def warp_image(image, method=None, angle=0, fill='background', transparency=False):
+    """Transpose and rotate an image in a single resampling pass.
+
+    Given a PIL.Image ``image``, a transposition ``method`` (one of
+    ``PIL.Image.ROTATE_90``, ``ROTATE_180``, ``ROTATE_270``, or ``None``)
+    and a rotation angle in degrees counter-clockwise ``angle``, compose
+    both into one affine transform and apply that with ``cv2.warpAffine``
+    (nearest neighbour), instead of transposing and then rotating the
+    image as a whole.
+
+    The result is the same as that of ``rotate_image(transpose_image(image,
+    method), angle, fill, transparency)`` (up to rounding of coordinates
+    at pixel boundaries), including size, ``fill`` and ``transparency``.
+    Images of other modes than ``WARP_MODES`` are transposed and rotated
+    with those functions.
+
+    Return a new PIL.Image.
+    """
+    LOG = getLogger('ocrd.workspace_image_warp.warp_image')
+    if not angle:
+        return transpose_image(image, method) if method is not None else image.copy()
+    if image.mode not in WARP_MODES:
+        if method is not None:
+            image = transpose_image(image, method)
+        return rotate_image(image, angle, fill=fill, transparency=transparency)
+    LOG.debug('warping image by %s and %.2f°', method, angle)
+    size = image.size
+    matrix = np.eye(3)
+    if method is not None:
+        matrix, size = _transposition_matrix(method, size)
+    rotation, size = _rotation_matrix(angle, size)
+    matrix = np.dot(matrix, rotation)
+    # PIL samples at pixel centers (x + 0.5), OpenCV at integer coordinates
+    matrix = np.dot(np.dot([[1, 0, -0.5], [0, 1, -0.5], [0, 0, 1]], matrix),
+                    [[1, 0, 0.5], [0, 1, 0.5], [0, 0, 1]])
+    mode = image.mode
+    if fill == 'background':
+        background = list(estimate_background(image))
+        if mode in ['RGBA', 'LA']:
+            background[-1] = 0 # fully transparent
+        elif transparency and mode in ['RGB', 'L']:
+            background.append(0) # fully transparent
+    else:
+        if isinstance(fill, str):
+            fill = ImageColor.getcolor(fill, mode)
+        background = list(fill) if isinstance(fill, (tuple, list)) else [fill]
+    array = np.array(image)
+    if mode == '1':
+        array = array.astype(np.uint8) * 255
+    if transparency and mode in ['RGB', 'L']:
+        # ensure no information is lost by adding transparency channel
+        # initialized to fully opaque (so rotation will expose areas
+        # as transparent):
+        mode += 'A'
+        array = np.dstack([array, np.full(array.shape[:2], 255, dtype=np.uint8)])
+    if len(background) < len(mode):
+        # opaque
+        background.append(255)
+    if mode == '1':
+        background = [255 * bool(value) for value in background]
+    new_array = cv2.warpAffine(array, matrix[:2], size,
+                               flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+                               borderMode=cv2.BORDER_CONSTANT,
+                               borderValue=tuple(background))
+    if new_array.ndim == 2 and array.ndim == 3:
+        # single channel got squeezed
+        new_array = new_array[:, :, np.newaxis]
+    if mode == 'LA':
+        # like rotate_image: fully transparent areas get the background color
+        new_array[new_array[:, :, 1] == 0] = background
+    if mode == '1':
+        return Image.fromarray(new_array > 127)
+    return Image.fromarray(new_array)
@@ -0,0 +1,118 @@
+from os import fsync, stat, unlink
+from os.path import exists, getsize
+import hashlib
+import json
+
+from ocrd_utils import getLogger
+
+from .constants import METS_JOURNAL_SUFFIX
+
+def _chksum(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _stamp(path):
+    try:
+        st = stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+class WorkspaceJournal():
+    """
+    Append-only log of the changes to the METS of a workspace that have not
+    been written to the METS file itself yet.
+
+    The journal is stored next to the METS file (``<mets_basename>.journal``)
+    as JSON lines: A header with the checksum of the METS file it applies to,
+    followed by one line per change (cf. ``OcrdMets.pop_journal``).
+
+    Only a :py:class:`ocrd.workspace.Workspace` loading the METS applies
+    the journal: Anything else reading the METS file directly does not see
+    the changes in the journal until they are written to the METS file (at
+    a checkpoint, cf. :py:meth:`ocrd.workspace.Workspace.save_mets`).
+    """
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.path = workspace.mets_target + METS_JOURNAL_SUFFIX
+        # offset after the last complete change if the journal applies to the METS file, else None
+        self._valid_size = None
+        # (size, mtime) of the METS file and the journal when last read or written
+        self._stamps = None
+
+    def read(self):
+        """
+        Read the changes that apply to the current METS file.
+
+        A journal left over from before the METS file was replaced is ignored,
+        as is an incomplete last change (e.g. if the process was killed while
+        appending).
+        """
+        log = getLogger('ocrd.workspace_journal.read')
+        self._valid_size = None
+        if not exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        try:
+            header = json.loads(lines[0].decode('utf-8'))
+        except ValueError:
+            log.warning("Ignoring corrupt METS journal %s", self.path)
+            return []
+        if header.get('mets') != _chksum(self.workspace.mets_target):
+            log.warning("Ignoring METS journal %s, which does not apply to the current METS", self.path)
+            return []
+        self._valid_size = len(lines[0]) + 1
+        entries = []
+        # the last line is empty, unless the last change is incomplete
+        for line in lines[1:-1]:
+            try:
+                entries.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                log.warning("Ignoring incomplete change in METS journal %s", self.path)
+                break
+            self._valid_size += len(line) + 1
+        self._stamps = (_stamp(self.workspace.mets_target), _stamp(self.path))
+        return entries
+
+    def append(self, entries):
+        """
+        Append changes (and sync them to disk), starting a new journal unless
+        the current one applies to the METS file.
+
+        If the METS file or the journal changed since last read or written
+        here (e.g. by another process writing the METS file at a checkpoint
+        and removing the journal), the journal is checked again first.
+
+        Returns:
+            The size of the journal in bytes
+        """
+        log = getLogger('ocrd.workspace_journal.append')
+        if self._valid_size is not None and self._stamps != (_stamp(self.workspace.mets_target), _stamp(self.path)):
+            log.warning("METS %s or its journal changed on disk, checking the journal again", self.workspace.mets_target)
+            self.read()
+        if self._valid_size is None:
+            header = {'mets': _chksum(self.workspace.mets_target)}
+            with open(self.path, 'wb') as f:
+                f.write(json.dumps(header).encode('utf-8') + b'\n')
+            self._valid_size = getsize(self.path)
+        with open(self.path, 'r+b') as f:
+            f.seek(self._valid_size)
+            f.truncate()
+            for entry in entries:
+                f.write(json.dumps(entry).encode('utf-8') + b'\n')
+            f.flush()
+            fsync(f.fileno())
+            self._valid_size = f.tell()
+        self._stamps = (_stamp(self.workspace.mets_target), _stamp(self.path))
+        return self._valid_size
+
+    def remove(self):
+        """
+        Remove the journal, e.g. after its changes were written to the METS file.
+        """
+        if exists(self.path):
+            unlink(self.path)
+        self._valid_size = None
+        self._stamps = None
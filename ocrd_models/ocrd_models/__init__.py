@@ -5,4 +5,5 @@ from .ocrd_agent import OcrdAgent
 from .ocrd_exif import OcrdExif
 from .ocrd_file import OcrdFile
 from .ocrd_mets import OcrdMets
+from .ocrd_mets_sqlite import OcrdMetsSqlite
 from .ocrd_xml_base import OcrdXmlDocument
@@ -6,6 +6,7 @@ import re
 
 __all__ = [
     'IDENTIFIER_PRIORITY',
+    'METS_CACHE_SUFFIX',
     'METS_XML_EMPTY',
     'NAMESPACES',
     'TAG_METS_AGENT',
@@ -33,6 +34,8 @@ REGEX_FILE_ID = re.compile('^[A-Za-z][^:]*$')
 
 IDENTIFIER_PRIORITY = ['purl', 'urn', 'doi', 'url']
 
+METS_CACHE_SUFFIX = '.cache'
+
 METS_XML_EMPTY = resource_string(__name__, 'mets-empty.xml')
 
 NAMESPACES = {
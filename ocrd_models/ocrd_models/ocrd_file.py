@@ -105,7 +105,7 @@ class OcrdFile():
         """
         if ID is None:
             return
-        self._el.set('ID', ID)
+        self._update_mets_index('ID', self._el, 'ID', ID)
 
     @property
     def pageId(self):
@@ -184,7 +184,7 @@ class OcrdFile():
         """
         if mimetype is None:
             return
-        self._el.set('MIMETYPE', mimetype)
+        self._update_mets_index('mimetype', self._el, 'MIMETYPE', mimetype)
 
     @property
     def fileGrp(self):
@@ -216,4 +216,15 @@ class OcrdFile():
         el_FLocat = self._el.find('mets:FLocat', NS)
         if el_FLocat is None:
             el_FLocat = ET.SubElement(self._el, TAG_METS_FLOCAT)
-        el_FLocat.set("{%s}href" % NS["xlink"], url)
+        self._update_mets_index('url', el_FLocat, "{%s}href" % NS["xlink"], url)
+
+    def _update_mets_index(self, name, el, key, value):
+        """
+        Set attribute ``key`` of ``el`` to ``value`` to change property ``name``, keeping
+        the file indexes (and journal) of the parent ``OcrdMets`` (if any) in sync.
+        """
+        if self.mets is None:
+            el.set(key, value)
+            return
+        # pylint: disable=protected-access
+        self.mets._update_file(self._el, name, el, key, value)
@@ -1,8 +1,16 @@
 """
 API to METS
 """
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+from hashlib import sha256
+from itertools import count
+from os import getpid, replace, stat
+from os.path import abspath
 from re import fullmatch
+import re
+import pickle
 from lxml import etree as ET
 
 from ocrd_utils import is_local_filename, getLogger, VERSION, REGEX_PREFIX
@@ -14,11 +22,13 @@ from .constants import (
     TAG_METS_FILE,
     TAG_METS_FILEGRP,
     TAG_METS_FILESEC,
+    TAG_METS_FLOCAT,
     TAG_METS_FPTR,
     TAG_METS_METSHDR,
     TAG_METS_STRUCTMAP,
     IDENTIFIER_PRIORITY,
     TAG_MODS_IDENTIFIER,
+    METS_CACHE_SUFFIX,
     METS_XML_EMPTY,
     REGEX_FILE_ID
 )
@@ -29,14 +39,24 @@ from .ocrd_agent import OcrdAgent
 
 log = getLogger('ocrd_models.ocrd_mets')
 REGEX_PREFIX_LEN = len(REGEX_PREFIX)
+# re.Pattern, which is only available as such since Python 3.7
+REGEX_TYPE = type(re.compile(''))
+# start (or empty-element) tag of a mets:fileGrp (in any namespace prefix) in raw METS
+REGEX_FILEGRP_START = re.compile(br'<((?:[\w.-]+:)?fileGrp)(\s[^>]*?)?(/?)>')
+# USE attribute of a (raw) start tag
+REGEX_USE = re.compile(br'\sUSE\s*=\s*(["\'])(.*?)\1')
+# what raw METS may contain that defeats cutting fileGrps with regular expressions
+REGEX_CUT_AMBIGUOUS = re.compile(br'<!--|<!\[CDATA\[|<!DOCTYPE|<\?(?!xml\s)|=\s*(?:"[^"<]*>|\'[^\'<]*>)')
+# ID of the start tags of mets:file in (decoded) raw METS
+REGEX_FILE_START_ID = re.compile(r'<(?:[\w.-]+:)?file\s[^>]*?\bID\s*=\s*["\']([^"\']*)')
 
 class OcrdMets(OcrdXmlDocument):
     """
     API to a single METS file
     """
 
-    @staticmethod
-    def empty_mets(now=None):
+    @classmethod
+    def empty_mets(cls, now=None, **kwargs):
         """
         Create an empty METS file from bundled template.
         """
@@ -45,13 +65,404 @@ class OcrdMets(OcrdXmlDocument):
         tpl = METS_XML_EMPTY.decode('utf-8')
         tpl = tpl.replace('{{ VERSION }}', VERSION)
         tpl = tpl.replace('{{ NOW }}', '%s' % now)
-        return OcrdMets(content=tpl.encode('utf-8'))
+        return cls(content=tpl.encode('utf-8'), **kwargs)
 
-    def __init__(self, **kwargs):
+    def __init__(self, file_grps=None, journal=False, cache=False, **kwargs):
         """
-
+        Args:
+            file_grps (list): ``USE`` of the ``mets:fileGrp`` to load (default: all).
+                When loading from ``filename``, the contents of all other fileGrps
+                are cut out before parsing (and kept as raw bytes): Their files
+                cannot be searched or changed, but are written back unchanged by
+                ``to_xml``. Cannot be combined with ``cache`` (which is ignored then).
+            journal (boolean): Whether to record all changes made through this API
+                (cf. ``pop_journal``), so they can be persisted without writing
+                the whole document.
+            cache (boolean): Whether to load the indexes from the cache file next to
+                ``filename`` (cf. ``save_cache``) instead of building them, if the
+                cache is still valid, and to (re-)create the cache otherwise.
+                Ignored unless loading all fileGrps from ``filename`` (i.e. without ``file_grps``).
         """
+        self._load_file_grps = file_grps
+        self._cache = cache and file_grps is None
+        # (VERSION, path, size, mtime, checksum) of the METS file if caching, else None
+        self._cache_key = None
+        # changes not yet persisted (None if not journaling)
+        self._journal = [] if journal else None
+        self._journal_suspended = False
+        # USE -> (el_fileGrp, original contents of the fileGrp as raw bytes)
+        self._skipped_file_grps = {}
+        # ID of all mets:file in skipped fileGrps
+        self._skipped_file_ids = set()
         super(OcrdMets, self).__init__(**kwargs)
+        self._fill_caches()
+
+    def _parse_file(self, filename):
+        """
+        Parse the METS file, skipping the contents of fileGrps not in ``file_grps`` (if given).
+        """
+        if self._cache:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            self._cache_key = _cache_key(filename, data)
+            return ET.ElementTree(ET.fromstring(data, base_url=filename))
+        if self._load_file_grps is None:
+            return super(OcrdMets, self)._parse_file(filename)
+        with open(filename, 'rb') as f:
+            cut = _cut_file_grps(f.read(), self._load_file_grps)
+        if cut is not None:
+            data, skipped = cut
+            tree = ET.ElementTree(ET.fromstring(data, base_url=filename))
+            el_fileGrps = [el_fileGrp for el_fileGrp in tree.iter(TAG_METS_FILEGRP) if el_fileGrp.get('USE') in skipped]
+            # each cut fileGrp must be a mets:fileGrp of its own
+            if len(el_fileGrps) == len(skipped):
+                for el_fileGrp in el_fileGrps:
+                    contents = skipped[el_fileGrp.get('USE')]
+                    self._skipped_file_grps[el_fileGrp.get('USE')] = (el_fileGrp, contents)
+                    self._skipped_file_ids.update(REGEX_FILE_START_ID.findall(contents.decode(tree.docinfo.encoding)))
+                return tree
+        log = getLogger('ocrd_models.ocrd_mets.OcrdMets')
+        log.debug("Cannot cut the fileGrps of %s before parsing, parsing all of it", filename)
+        return self._iterparse_file_grps(filename)
+
+    def _iterparse_file_grps(self, filename):
+        """
+        Parse the METS file incrementally, cutting the contents of fileGrps not in ``file_grps``
+        right after each was parsed (slower than :py:func:`_cut_file_grps`, but always correct).
+        """
+        # outermost fileGrp being parsed whose contents will be cut
+        el_cut = None
+        context = ET.iterparse(filename, events=('start', 'end'), tag=TAG_METS_FILEGRP)
+        for event, el_fileGrp in context:
+            use = el_fileGrp.get('USE')
+            if event == 'start':
+                if el_cut is None and use not in self._load_file_grps:
+                    el_cut = el_fileGrp
+                continue
+            if el_fileGrp is not el_cut:
+                continue
+            el_cut = None
+            if not len(el_fileGrp):
+                # nothing to cut
+                continue
+            if use in self._skipped_file_grps:
+                raise Exception("Cannot skip fileGrp %s, USE is not unique" % use)
+            xml = ET.tostring(el_fileGrp, with_tail=False)
+            contents = xml[xml.index(b'>') + 1:xml.rindex(b'</')]
+            self._skipped_file_grps[use] = (el_fileGrp, contents)
+            self._skipped_file_ids.update(el_file.get('ID') for el_file in el_fileGrp.iter(TAG_METS_FILE))
+            el_fileGrp.text = None
+            del el_fileGrp[:]
+        return context.root.getroottree()
+
+    def to_xml(self, xmllint=False):
+        """
+        Serialize all properties as pretty-printed XML, including the
+        contents of skipped fileGrps (cf. ``file_grps``)
+
+        Args:
+            xmllint (boolean): Format with ``xmllint`` in addition to pretty-printing
+        """
+        with self._skipped_file_grps_spliced():
+            return super(OcrdMets, self).to_xml(xmllint=xmllint)
+
+    def write_xml(self, f):
+        """
+        Serialize all properties as ``xmllint``-formatted XML directly to a file,
+        including the contents of skipped fileGrps (cf. ``file_grps``)
+
+        Args:
+            f (file): File object opened in binary mode
+        """
+        with self._skipped_file_grps_spliced():
+            super(OcrdMets, self).write_xml(f)
+
+    @contextmanager
+    def _skipped_file_grps_spliced(self):
+        """
+        Temporarily restore the original contents of skipped fileGrps
+        """
+        spliced = []
+        parser = ET.XMLParser(encoding=self._tree.docinfo.encoding)
+        for el_fileGrp, contents in self._skipped_file_grps.values():
+            # parse the contents within an element declaring the namespaces in scope there
+            nsdecls = b''.join(b' xmlns%s="%s"' % (b':' + prefix.encode('utf-8') if prefix else b'', uri.encode('utf-8'))
+                               for prefix, uri in el_fileGrp.nsmap.items())
+            el_original = ET.fromstring(b'<fileGrp%s>%s</fileGrp>' % (nsdecls, contents), parser=parser)
+            children = list(el_original)
+            el_fileGrp.text = el_original.text
+            el_fileGrp.extend(children)
+            spliced.append((el_fileGrp, children))
+        try:
+            yield
+        finally:
+            for el_fileGrp, children in spliced:
+                for el in children:
+                    el_fileGrp.remove(el)
+                el_fileGrp.text = None
+
+    def pop_journal(self):
+        """
+        Get and forget the changes recorded since the last call (or ``None`` if not journaling).
+
+        Each change is a JSON-serializable list, starting with the name of the
+        operation, that can be re-applied with ``replay_journal``.
+        Changes not made through the ``OcrdMets``, ``OcrdFile`` or ``OcrdMets.add_agent``
+        API (e.g. to an ``OcrdAgent`` after adding it) are not recorded.
+        """
+        if self._journal is None:
+            return None
+        ret, self._journal = self._journal, []
+        return ret
+
+    def replay_journal(self, entries):
+        """
+        Re-apply changes recorded by ``pop_journal`` (without recording them again).
+        """
+        suspended, self._journal_suspended = self._journal_suspended, True
+        try:
+            for op, *args in entries:
+                if op == 'add_file':
+                    kwargs = dict(args[0])
+                    self._add_file(self.add_file_group(kwargs.pop('fileGrp')), **kwargs)
+                elif op == 'update_file':
+                    ID, name, value = args
+                    # file may have been removed before it was changed
+                    ocrd_file = next(self.iter_files(ID=ID, limit=1), None)
+                    if ocrd_file:
+                        setattr(ocrd_file, name, value)
+                elif op == 'set_physical_page_for_file':
+                    pageId, ID, order, orderlabel = args
+                    self.set_physical_page_for_file(pageId, OcrdFile(None, ID=ID), order=order, orderlabel=orderlabel)
+                elif op == 'unique_identifier':
+                    self.unique_identifier = args[0]
+                elif op == 'add_agent':
+                    self.add_agent(*args[0], **args[1])
+                elif op in ['add_file_group', 'remove_file_group', 'remove_one_file', 'remove_physical_page']:
+                    getattr(self, op)(*args)
+                else:
+                    raise Exception("Unknown METS journal operation: %s" % op)
+        finally:
+            self._journal_suspended = suspended
+
+    def _journaled(self, *entry):
+        """
+        Record the change ``entry`` in the journal (if any) once it succeeded,
+        but not the changes it is made up of.
+        """
+        if self._journal is None or self._journal_suspended:
+            return _NOT_JOURNALED
+        return self._journal_entry(entry)
+
+    @contextmanager
+    def _journal_entry(self, entry):
+        self._journal_suspended = True
+        try:
+            yield
+        finally:
+            self._journal_suspended = False
+        self._journal.append(list(entry))
+
+    def _check_file_grp_loaded(self, fileGrp):
+        """
+        Raise an exception if ``fileGrp`` was skipped when loading (cf. ``file_grps``)
+        """
+        if fileGrp in self._skipped_file_grps:
+            raise Exception("fileGrp %s was not loaded (file_grps=%s)" % (fileGrp, self._load_file_grps))
+
+    def _fill_caches(self):
+        """
+        Build the in-memory indexes of ``mets:file`` (by ``ID``, fileGrp ``USE``,
+        ``MIMETYPE`` and ``xlink:href``), of physical page ``mets:div`` (by ``ID``)
+        and of ``mets:fptr`` (by ``FILEID``).
+
+        These are kept up-to-date by all methods changing files, fileGrps or pages,
+        and by the setters of :py:class:`OcrdFile`.
+        """
+        root = self._tree.getroot()
+        self._file_counter = count()
+        # el -> position in document order (within its fileGrp)
+        self._file_order = {}
+        # ID -> el
+        self._file_by_id = {}
+        # USE -> {el: None} (i.e. an ordered set)
+        self._files_by_grp = {}
+        # MIMETYPE -> {el: None}
+        self._files_by_mimetype = {}
+        # xlink:href -> {el: None}
+        self._files_by_url = {}
+        # pageId -> el_pagediv
+        self._page_by_id = {}
+        # FILEID -> [el_fptr]
+        self._fptrs_by_fileid = {}
+        if self._cache_key and self._load_cache():
+            return
+        for el_fileGrp in root.iter(TAG_METS_FILEGRP):
+            self._files_by_grp.setdefault(el_fileGrp.get('USE'), {})
+        for el_file in root.iter(TAG_METS_FILE):
+            self._index_file(el_file)
+        for el_pagediv in self._physical_page_divs():
+            self._page_by_id[el_pagediv.get('ID')] = el_pagediv
+        for el_fptr in root.iter(TAG_METS_FPTR):
+            self._fptrs_by_fileid.setdefault(el_fptr.get('FILEID'), []).append(el_fptr)
+        if self._cache_key:
+            self._save_cache(self._cache_key)
+
+    def _physical_page_divs(self):
+        """
+        List the physical page ``mets:div`` elements in document order.
+        """
+        return self._tree.getroot().xpath(
+            'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]',
+            namespaces=NS)
+
+    def save_cache(self, filename):
+        """
+        Store the indexes in a cache file next to the METS file ``filename``
+        (``<filename>.cache``), so they can be loaded instead of being built
+        when ``filename`` is opened again (cf. ``cache``), as long as it is unchanged.
+
+        Args:
+            filename (string): METS file the current state was just written to
+        """
+        with open(filename, 'rb') as f:
+            self._save_cache(_cache_key(filename, f.read()))
+
+    def _save_cache(self, key):
+        """
+        Write the cache of the indexes of the METS file with cache key ``key``.
+        """
+        if self._skipped_file_grps:
+            raise Exception("Cannot cache the indexes of a METS with skipped fileGrps")
+        root = self._tree.getroot()
+        # el -> position in document order
+        pos = {el: i for i, el in enumerate(root.iter(TAG_METS_FILE))}
+        grp_of, ids, mimetypes, urls = [None] * len(pos), [None] * len(pos), [None] * len(pos), [None] * len(pos)
+        for values, index in [(grp_of, self._files_by_grp), (mimetypes, self._files_by_mimetype), (urls, self._files_by_url)]:
+            for value, els in index.items():
+                for el in els:
+                    values[pos[el]] = value
+        for ID, el in self._file_by_id.items():
+            ids[pos[el]] = ID
+        # runs of files in the same fileGrp as [USE, length]
+        files = []
+        for USE in grp_of:
+            if files and files[-1][0] == USE:
+                files[-1][1] += 1
+            else:
+                files.append([USE, 1])
+        page_ids = {el: ID for ID, el in self._page_by_id.items()}
+        fptr_pos = {el: i for i, el in enumerate(root.iter(TAG_METS_FPTR))}
+        fptrs = [None] * len(fptr_pos)
+        for FILEID, els in self._fptrs_by_fileid.items():
+            for el in els:
+                fptrs[fptr_pos[el]] = FILEID
+        cache = {
+            'key': key,
+            'file_grps': list(self._files_by_grp),
+            'files': files,
+            'ids': ids,
+            'mimetypes': mimetypes,
+            'urls': urls,
+            'pages': [page_ids.get(el) for el in self._physical_page_divs()],
+            'fptrs': fptrs,
+        }
+        path = key[1] + METS_CACHE_SUFFIX
+        tmp_path = '%s.%d.tmp' % (path, getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            replace(tmp_path, path)
+        except OSError as e:
+            log.warning("Could not write METS cache %s: %s", path, e)
+
+    def _load_cache(self):
+        """
+        Fill the indexes from the cache file if it is valid for the parsed METS file.
+
+        Returns:
+            Whether the indexes were loaded
+        """
+        path = self._cache_key[1] + METS_CACHE_SUFFIX
+        try:
+            with open(path, 'rb') as f:
+                cache = _CacheUnpickler(f).load()
+        except FileNotFoundError:
+            return False
+        except Exception as e: # pylint: disable=broad-except
+            log.warning("Ignoring corrupt METS cache %s: %s", path, e)
+            return False
+        if not isinstance(cache, dict) or cache.get('key') != self._cache_key:
+            log.debug("Ignoring stale METS cache %s", path)
+            return False
+        root = self._tree.getroot()
+        els = list(root.iter(TAG_METS_FILE))
+        page_divs = self._physical_page_divs()
+        els_fptr = list(root.iter(TAG_METS_FPTR))
+        if sum(n for _, n in cache['files']) != len(els) or \
+                len(cache['pages']) != len(page_divs) or len(cache['fptrs']) != len(els_fptr):
+            log.warning("Ignoring METS cache %s, which does not match the METS", path)
+            return False
+        self._file_counter = count(len(els))
+        self._file_order = dict(zip(els, range(len(els))))
+        self._file_by_id = dict(zip(cache['ids'], els))
+        self._file_by_id.pop(None, None)
+        self._files_by_grp = {USE: {} for USE in cache['file_grps']}
+        start = 0
+        for USE, n in cache['files']:
+            self._files_by_grp[USE].update(dict.fromkeys(els[start:start + n]))
+            start += n
+        for index, values in [(self._files_by_mimetype, cache['mimetypes']), (self._files_by_url, cache['urls'])]:
+            for el, value in zip(els, values):
+                index.setdefault(value, {})[el] = None
+        self._page_by_id = dict(zip(cache['pages'], page_divs))
+        for FILEID, el_fptr in zip(cache['fptrs'], els_fptr):
+            self._fptrs_by_fileid.setdefault(FILEID, []).append(el_fptr)
+        return True
+
+    def _index_file(self, el):
+        """
+        Add a ``mets:file`` element to the file indexes (under its current attributes).
+        """
+        el_fileGrp = el.getparent()
+        if el_fileGrp is None:
+            return
+        if el not in self._file_order:
+            self._file_order[el] = next(self._file_counter)
+            self._files_by_grp.setdefault(el_fileGrp.get('USE'), {})[el] = None
+        if el.get('ID') is not None:
+            self._file_by_id[el.get('ID')] = el
+        self._files_by_mimetype.setdefault(el.get('MIMETYPE'), {})[el] = None
+        self._files_by_url.setdefault(_url_of(el), {})[el] = None
+
+    def _update_file(self, el, name, el_attr, key, value):
+        """
+        Change property ``name`` of the ``mets:file`` element ``el`` by setting attribute
+        ``key`` of ``el_attr`` (``el`` or a child) to ``value``, keeping the indexes and
+        the journal in sync. Nothing is changed or journaled if ``value`` is the same.
+        """
+        if el_attr.get(key) == value:
+            return
+        with self._journaled('update_file', el.get('ID'), name, value):
+            self._unindex_file(el)
+            el_attr.set(key, value)
+            self._index_file(el)
+
+    def _unindex_file(self, el):
+        """
+        Remove a ``mets:file`` element from the ``ID``, ``MIMETYPE`` and URL indexes
+        (under its current attributes), e.g. before changing one of those.
+
+        The fileGrp membership is not touched (files never change their fileGrp).
+        """
+        if self._file_by_id.get(el.get('ID')) is el:
+            del self._file_by_id[el.get('ID')]
+        for index, key in [(self._files_by_mimetype, el.get('MIMETYPE')),
+                           (self._files_by_url, _url_of(el))]:
+            if key in index:
+                index[key].pop(el, None)
+                if not index[key]:
+                    del index[key]
 
     def __str__(self):
         """
@@ -78,16 +489,17 @@ class OcrdMets(OcrdXmlDocument):
 
         See `specs <https://ocr-d.github.io/mets#unique-id-for-the-document-processed>`_ for details.
         """
-        id_el = None
-        for t in IDENTIFIER_PRIORITY:
-            id_el = self._tree.getroot().find('.//mods:identifier[@type="%s"]' % t, NS)
-            if id_el is not None:
-                break
-        if id_el is None:
-            mods = self._tree.getroot().find('.//mods:mods', NS)
-            id_el = ET.SubElement(mods, TAG_MODS_IDENTIFIER)
-            id_el.set('type', 'purl')
-        id_el.text = purl
+        with self._journaled('unique_identifier', purl):
+            id_el = None
+            for t in IDENTIFIER_PRIORITY:
+                id_el = self._tree.getroot().find('.//mods:identifier[@type="%s"]' % t, NS)
+                if id_el is not None:
+                    break
+            if id_el is None:
+                mods = self._tree.getroot().find('.//mods:mods', NS)
+                id_el = ET.SubElement(mods, TAG_MODS_IDENTIFIER)
+                id_el.set('type', 'purl')
+            id_el.text = purl
 
     @property
     def agents(self):
@@ -100,14 +512,15 @@ class OcrdMets(OcrdXmlDocument):
         """
         Add an `OcrdAgent </../../ocrd_models/ocrd_models.ocrd_agent.html>`_ to the list of agents in the metsHdr.
         """
-        el_metsHdr = self._tree.getroot().find('.//mets:metsHdr', NS)
-        if el_metsHdr is None:
-            el_metsHdr = ET.Element(TAG_METS_METSHDR)
-            self._tree.getroot().insert(0, el_metsHdr)
-        #  assert(el_metsHdr is not None)
-        el_agent = ET.SubElement(el_metsHdr, TAG_METS_AGENT)
-        #  print(ET.tostring(el_metsHdr))
-        return OcrdAgent(el_agent, *args, **kwargs)
+        with self._journaled('add_agent', list(args), kwargs):
+            el_metsHdr = self._tree.getroot().find('.//mets:metsHdr', NS)
+            if el_metsHdr is None:
+                el_metsHdr = ET.Element(TAG_METS_METSHDR)
+                self._tree.getroot().insert(0, el_metsHdr)
+            #  assert(el_metsHdr is not None)
+            el_agent = ET.SubElement(el_metsHdr, TAG_METS_AGENT)
+            #  print(ET.tostring(el_metsHdr))
+            return OcrdAgent(el_agent, *args, **kwargs)
 
     @property
     def file_groups(self):
@@ -116,75 +529,157 @@ class OcrdMets(OcrdXmlDocument):
         """
         return [el.get('USE') for el in self._tree.getroot().findall('.//mets:fileGrp', NS)]
 
-    # pylint: disable=multiple-statements
     def find_files(self, ID=None, fileGrp=None, pageId=None, mimetype=None, url=None, local_only=False):
         """
         Search ``mets:file`` in this METS document.
 
 
-        The ``ID``, ``fileGrp``, ``url`` and ``mimetype`` parameters can be
+        The ``ID``, ``fileGrp``, ``pageId``, ``url`` and ``mimetype`` parameters can be
         either a literal string or a regular expression if the string starts
         with ``//`` (double slash). If it is a regex, the leading ``//`` is removed
         and candidates are matched against the regex with ``re.fullmatch``. If it is
-        a literal string, comparison is done with string equality.
+        a literal string, comparison is done with string equality. Compiled regexes
+        (``re.compile``) can be passed, too. Literal ``pageId`` strings can be
+        comma-separated lists of page IDs.
+
+        Each parameter can also be a list of such values, matching files which
+        match any of them (e.g. ``fileGrp=['OCR-D-IMG', '//OCR-D-GT-.*']``).
 
         Args:
-            ID (string) : ID of the file
-            fileGrp (string) : USE of the fileGrp to list files of
-            pageId (string) : ID of physical page manifested by matching files
-            url (string) : @xlink:href of mets:Flocat of mets:file
-            mimetype (string) : MIMETYPE of matching files
+            ID (string|list) : ID of the file
+            fileGrp (string|list) : USE of the fileGrp to list files of
+            pageId (string|list) : ID of physical page manifested by matching files
+            url (string|list) : @xlink:href of mets:Flocat of mets:file
+            mimetype (string|list) : MIMETYPE of matching files
             local (boolean) : Whether to restrict results to local files
 
         Return:
             List of files.
         """
-        ret = []
-        if pageId:
-            if pageId.startswith(REGEX_PREFIX):
-                raise Exception("find_files does not support regex search for pageId")
-            pageIds, pageId = pageId.split(','), list()
-            for page in self._tree.getroot().xpath(
-                '//mets:div[@TYPE="page"]', namespaces=NS):
-                if page.get('ID') in pageIds:
-                    pageId.extend(
-                        [fptr.get('FILEID') for fptr in page.findall('mets:fptr', NS)])
-        for cand in self._tree.getroot().xpath('//mets:file', namespaces=NS):
-            if ID:
-                if ID.startswith(REGEX_PREFIX):
-                    if not fullmatch(ID[REGEX_PREFIX_LEN:], cand.get('ID')): continue
-                else:
-                    if not ID == cand.get('ID'): continue
+        return list(self.iter_files(ID=ID, fileGrp=fileGrp, pageId=pageId, mimetype=mimetype, url=url, local_only=local_only))
 
-            if pageId is not None and cand.get('ID') not in pageId:
-                continue
+    def exists(self, **kwargs):
+        """
+        Whether any ``mets:file`` matches the query. Same arguments as ``OcrdMets.find_files``
+        """
+        return next(self.iter_files(limit=1, **kwargs), None) is not None
 
-            if fileGrp:
-                if fileGrp.startswith(REGEX_PREFIX):
-                    if not fullmatch(fileGrp[REGEX_PREFIX_LEN:], cand.getparent().get('USE')): continue
-                else:
-                    if cand.getparent().get('USE') != fileGrp: continue
+    # pylint: disable=multiple-statements
+    def iter_files(self, ID=None, fileGrp=None, pageId=None, mimetype=None, url=None, local_only=False, limit=None):
+        """
+        Search ``mets:file`` in this METS document, yielding matches lazily.
 
-            if mimetype:
-                if mimetype.startswith(REGEX_PREFIX):
-                    if not fullmatch(mimetype[REGEX_PREFIX_LEN:], cand.get('MIMETYPE') or ''): continue
-                else:
-                    if cand.get('MIMETYPE') != mimetype: continue
+        Same arguments as ``OcrdMets.find_files``, plus:
 
-            if url:
-                cand_url = cand.find('mets:FLocat', namespaces=NS).get('{%s}href' % NS['xlink'])
-                if url.startswith(REGEX_PREFIX):
-                    if not fullmatch(url[REGEX_PREFIX_LEN:], cand_url): continue
-                else:
-                    if cand_url != url: continue
+        Args:
+            limit (integer) : Stop after this many matches
+
+        The candidates are determined before yielding the first match, so files
+        may be added or removed while iterating (without affecting the iteration).
+
+        Yield:
+            Files
+        """
+        if limit is not None and limit <= 0:
+            return
+        n_found = 0
+        # field -> (literal values, compiled regexes)
+        filters = {field: _parse_filter(value, comma_list=field == 'pageId')
+                   for field, value in [('ID', ID), ('fileGrp', fileGrp), ('pageId', pageId), ('mimetype', mimetype), ('url', url)]
+                   if value}
+        # narrow down the candidates with the indexes for all fields with only literal values,
+        # and check fields with regexes for each candidate
+        matching = [(field, self._files_matching(field, literals)) for field, (literals, regexes) in filters.items() if not regexes]
+        deferred = [field for field, (literals, regexes) in filters.items() if regexes]
+        if not matching and deferred:
+            # unless regexes are all there is: then match them against the keys of the smallest index
+            field = min(deferred, key=lambda field: len(self._index_of(field)))
+            deferred.remove(field)
+            matching.append((field, self._files_matching(field, *filters[field])))
+        if matching:
+            field, smallest = min(matching, key=lambda match: len(match[1]))
+            matching = [els for _, els in matching if els is not smallest]
+            # files by fileGrp are in document order already
+            # (but copied, because the index may change while yielding)
+            candidates = list(smallest) if field == 'fileGrp' else self._sorted_files(smallest)
+        else:
+            candidates = [el for els in self._files_by_grp.values() for el in els]
+        for cand in candidates:
+            if any(cand not in els for els in matching):
+                continue
+            if any(not self._file_matches(cand, field, *filters[field]) for field in deferred):
+                continue
 
             f = OcrdFile(cand, mets=self)
 
             # If only local resources should be returned and f is not a file path: skip the file
             if local_only and not is_local_filename(f.url):
                 continue
-            ret.append(f)
-        return ret
+            yield f
+            n_found += 1
+            if limit is not None and n_found >= limit:
+                return
+
+    def _index_of(self, field):
+        """
+        Get the index of ``mets:file`` (or physical page for ``pageId``) by ``field``.
+        """
+        return {
+            'ID': self._file_by_id,
+            'fileGrp': self._files_by_grp,
+            'pageId': self._page_by_id,
+            'mimetype': self._files_by_mimetype,
+            'url': self._files_by_url,
+        }[field]
+
+    def _files_matching(self, field, literals, regexes=()):
+        """
+        Look up the ``mets:file`` elements whose ``field`` is one of ``literals``
+        or fully matches one of ``regexes`` in the index.
+
+        Returns:
+            The elements as a ``dict`` (i.e. an ordered set)
+        """
+        index = self._index_of(field)
+        if regexes or field == 'fileGrp' and len(literals) > 1:
+            # in index order (i.e. document order for fileGrps)
+            literals = set(literals)
+            keys = [key for key in index if key in literals or any(regex.fullmatch(key or '') for regex in regexes)]
+        else:
+            keys = literals
+        if field == 'ID':
+            return {index[key]: None for key in keys if key in index}
+        if field == 'pageId':
+            return {self._file_by_id[el_fptr.get('FILEID')]: None
+                    for key in keys if key in index
+                    for el_fptr in index[key].findall('mets:fptr', NS)
+                    if el_fptr.get('FILEID') in self._file_by_id}
+        if len(keys) == 1:
+            return index.get(keys[0], {})
+        return {el: None for key in keys for el in index.get(key, {})}
+
+    def _file_matches(self, el, field, literals, regexes):
+        """
+        Whether the ``mets:file`` element ``el`` has a ``field`` that is one of
+        ``literals`` or fully matches one of ``regexes``.
+        """
+        if field == 'pageId':
+            values = [el_fptr.getparent().get('ID') for el_fptr in self._fptrs_by_fileid.get(el.get('ID'), [])
+                      if self._page_by_id.get(el_fptr.getparent().get('ID')) is el_fptr.getparent()]
+        elif field == 'fileGrp':
+            values = [el.getparent().get('USE')]
+        elif field == 'url':
+            values = [_url_of(el)]
+        else:
+            values = [el.get(field.upper())]
+        return any(value in literals or any(regex.fullmatch(value or '') for regex in regexes) for value in values)
+
+    def _sorted_files(self, els):
+        """
+        Sort ``mets:file`` elements into document order (by fileGrp, then by position in fileGrp).
+        """
+        grp_order = {fileGrp: i for i, fileGrp in enumerate(self._files_by_grp)}
+        return sorted(els, key=lambda el: (grp_order.get(el.getparent().get('USE')), self._file_order[el]))
 
     def add_file_group(self, fileGrp):
         """
@@ -200,8 +695,10 @@ class OcrdMets(OcrdXmlDocument):
             el_fileSec = ET.SubElement(self._tree.getroot(), TAG_METS_FILESEC)
         el_fileGrp = el_fileSec.find('mets:fileGrp[@USE="%s"]' % fileGrp, NS)
         if el_fileGrp is None:
-            el_fileGrp = ET.SubElement(el_fileSec, TAG_METS_FILEGRP)
-            el_fileGrp.set('USE', fileGrp)
+            with self._journaled('add_file_group', fileGrp):
+                el_fileGrp = ET.SubElement(el_fileSec, TAG_METS_FILEGRP)
+                el_fileGrp.set('USE', fileGrp)
+                self._files_by_grp.setdefault(fileGrp, {})
         return el_fileGrp
 
     def remove_file_group(self, USE, recursive=False):
@@ -212,6 +709,13 @@ class OcrdMets(OcrdXmlDocument):
             USE (string): USE attribute of the fileGrp to delete. Can be a regex if prefixed with //
             recursive (boolean): Whether to recursively delete all files in the group
         """
+        with self._journaled('remove_file_group', USE if isinstance(USE, str) else USE.get('USE'), recursive):
+            self._remove_file_group(USE, recursive=recursive)
+
+    def _remove_file_group(self, USE, recursive=False):
+        """
+        Remove a fileGrp (``USE`` string or element), cf. ``remove_file_group``
+        """
         el_fileSec = self._tree.getroot().find('mets:fileSec', NS)
         if el_fileSec is None:
             raise Exception("No fileSec!")
@@ -219,7 +723,7 @@ class OcrdMets(OcrdXmlDocument):
             if USE.startswith(REGEX_PREFIX):
                 for cand in el_fileSec.findall('mets:fileGrp', NS):
                     if fullmatch(USE[REGEX_PREFIX_LEN:], cand.get('USE')):
-                        self.remove_file_group(cand, recursive=recursive)
+                        self._remove_file_group(cand, recursive=recursive)
                 return
             else:
                 el_fileGrp = el_fileSec.find('mets:fileGrp[@USE="%s"]' % USE, NS)
@@ -227,12 +731,14 @@ class OcrdMets(OcrdXmlDocument):
             el_fileGrp = USE
         if el_fileGrp is None:   # pylint: disable=len-as-condition
             raise Exception("No such fileGrp: %s" % USE)
+        self._check_file_grp_loaded(el_fileGrp.get('USE'))
         files = el_fileGrp.findall('mets:file', NS)
         if files:
             if not recursive:
                 raise Exception("fileGrp %s is not empty and recursive wasn't set" % USE)
             for f in files:
                 self.remove_one_file(f.get('ID'))
+        self._files_by_grp.pop(el_fileGrp.get('USE'), None)
         el_fileGrp.getparent().remove(el_fileGrp)
 
     def add_file(self, fileGrp, mimetype=None, url=None, ID=None, pageId=None, force=False, local_filename=None, ignore=False, **kwargs):
@@ -250,24 +756,82 @@ class OcrdMets(OcrdXmlDocument):
             local_filename (string):
             mimetype (string):
         """
+        self._check_file_id(ID, ignore=ignore)
+        self._check_file_grp_loaded(fileGrp)
+        if not ignore and not force and self._has_file_id(ID):
+            raise Exception("File with ID='%s' already exists" % ID)
+        return self._add_file(self.add_file_group(fileGrp), mimetype=mimetype, url=url, ID=ID,
+                              pageId=pageId, local_filename=local_filename, ignore=ignore)
+
+    def add_files(self, files, force=False, ignore=False):
+        """
+        Add many `OcrdFile </../../ocrd_models/ocrd_models.ocrd_file.html>`_ at once.
+
+        Unlike repeated calls to ``add_file``, all ``ID`` are validated up front
+        (against each other and the existing files), so nothing is added if
+        any of them is invalid, and each ``mets:fileGrp`` is looked up only once.
+
+        Arguments:
+            files (iterable): dicts with the keyword arguments of ``add_file``
+                (``fileGrp``, ``ID``, ``mimetype``, ``url``, ``pageId``, ``local_filename``)
+            force (boolean): Whether to add files even if a ``mets:file`` with the same ``ID`` already exists.
+            ignore (boolean): Don't look for existing files. Shift responsibility for preventing errors from duplicate ID to the user.
+
+        Returns:
+            List of the added files
+        """
+        files = list(files)
+        new_ids = set()
+        for kwargs in files:
+            ID = kwargs.get('ID')
+            self._check_file_id(ID, ignore=ignore)
+            self._check_file_grp_loaded(kwargs.get('fileGrp'))
+            if not ignore and not force and (ID in new_ids or self._has_file_id(ID)):
+                raise Exception("File with ID='%s' already exists" % ID)
+            new_ids.add(ID)
+        el_fileGrps = {}
+        ret = []
+        for kwargs in files:
+            kwargs = dict(kwargs)
+            fileGrp = kwargs.pop('fileGrp')
+            if fileGrp not in el_fileGrps:
+                el_fileGrps[fileGrp] = self.add_file_group(fileGrp)
+            ret.append(self._add_file(el_fileGrps[fileGrp], ignore=ignore, **kwargs))
+        return ret
+
+    def _check_file_id(self, ID, ignore=False):
+        """
+        Raise an exception if ``ID`` is not a valid ``mets:file/@ID``
+        (or, unless ``ignore``, is used in a skipped fileGrp)
+        """
         if not ID:
             raise Exception("Must set ID of the mets:file")
         elif not REGEX_FILE_ID.fullmatch(ID):
             raise Exception("Invalid syntax for mets:file/@ID %s" % ID)
-        el_fileGrp = self._tree.getroot().find(".//mets:fileGrp[@USE='%s']" % (fileGrp), NS)
-        if el_fileGrp is None:
-            el_fileGrp = self.add_file_group(fileGrp)
-        if ID and not ignore and self.find_files(ID=ID) != []:
-            if not force:
-                raise Exception("File with ID='%s' already exists" % ID)
-            mets_file = self.find_files(ID=ID)[0]
-        else:
-            mets_file = OcrdFile(ET.SubElement(el_fileGrp, TAG_METS_FILE), mets=self)
-        mets_file.url = url
-        mets_file.mimetype = mimetype
-        mets_file.ID = ID
-        mets_file.pageId = pageId
-        mets_file.local_filename = local_filename
+        if not ignore and ID in self._skipped_file_ids:
+            raise Exception("File with ID='%s' already exists in a fileGrp that was not loaded" % ID)
+
+    def _has_file_id(self, ID):
+        """
+        Whether a ``mets:file`` with ``ID`` exists
+        """
+        return ID in self._file_by_id
+
+    def _add_file(self, el_fileGrp, mimetype=None, url=None, ID=None, pageId=None, local_filename=None, ignore=False):
+        """
+        Add (or, if ``ID`` exists and not ``ignore``, replace) a ``mets:file`` in ``el_fileGrp``
+        """
+        with self._journaled('add_file', {'fileGrp': el_fileGrp.get('USE'), 'mimetype': mimetype, 'url': url,
+                                          'ID': ID, 'pageId': pageId, 'ignore': ignore}):
+            if not ignore and ID in self._file_by_id:
+                mets_file = OcrdFile(self._file_by_id[ID], mets=self)
+            else:
+                mets_file = OcrdFile(ET.SubElement(el_fileGrp, TAG_METS_FILE), mets=self)
+            mets_file.url = url
+            mets_file.mimetype = mimetype
+            mets_file.ID = ID
+            mets_file.pageId = pageId
+            mets_file.local_filename = local_filename
 
         return mets_file
 
@@ -294,26 +858,30 @@ class OcrdMets(OcrdXmlDocument):
             ocrd_file = ID
             ID = ocrd_file.ID
         else:
-            ocrd_file = self.find_files(ID=ID)
-            if ocrd_file:
-                ocrd_file = ocrd_file[0]
+            ocrd_file = next(self.iter_files(ID=ID, limit=1), None)
 
         if not ocrd_file:
             raise FileNotFoundError("File not found: %s" % ID)
 
-        # Delete the physical page ref
-        for fptr in self._tree.getroot().findall('.//mets:fptr[@FILEID="%s"]' % ID, namespaces=NS):
-            log.info("Delete fptr element %s for page '%s'", fptr, ID)
-            page_div = fptr.getparent()
-            page_div.remove(fptr)
-            # delete empty pages
-            if not page_div.getchildren():
-                log.info("Delete empty page %s", page_div)
-                page_div.getparent().remove(page_div)
+        with self._journaled('remove_one_file', ID):
+            # Delete the physical page ref
+            for fptr in self._fptrs_by_fileid.pop(ID, []):
+                log.info("Delete fptr element %s for page '%s'", fptr, ID)
+                page_div = fptr.getparent()
+                page_div.remove(fptr)
+                # delete empty pages
+                if not page_div.getchildren():
+                    log.info("Delete empty page %s", page_div)
+                    self._page_by_id.pop(page_div.get('ID'), None)
+                    page_div.getparent().remove(page_div)
 
-        # Delete the file reference
-        # pylint: disable=protected-access
-        ocrd_file._el.getparent().remove(ocrd_file._el)
+            # Delete the file reference
+            # pylint: disable=protected-access
+            el_file = ocrd_file._el
+            self._unindex_file(el_file)
+            self._files_by_grp[el_file.getparent().get('USE')].pop(el_file, None)
+            del self._file_order[el_file]
+            el_file.getparent().remove(el_file)
 
         return ocrd_file
 
@@ -322,9 +890,7 @@ class OcrdMets(OcrdXmlDocument):
         """
         List all page IDs
         """
-        return self._tree.getroot().xpath(
-            'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]/@ID',
-            namespaces=NS)
+        return [pageId for pageId in self._page_by_id if pageId is not None]
 
     def get_physical_pages(self, for_fileIds=None):
         """
@@ -332,60 +898,178 @@ class OcrdMets(OcrdXmlDocument):
         """
         if for_fileIds is None:
             return self.physical_pages
-        ret = [None] * len(for_fileIds)
-        for page in self._tree.getroot().xpath(
-            'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]',
-                namespaces=NS):
-            for fptr in page.findall('mets:fptr', NS):
-                if fptr.get('FILEID') in for_fileIds:
-                    ret[for_fileIds.index(fptr.get('FILEID'))] = page.get('ID')
-        return ret
+        return [self._physical_page_for_fileid(fileId) for fileId in for_fileIds]
 
     def set_physical_page_for_file(self, pageId, ocrd_file, order=None, orderlabel=None):
         """
         Create a new physical page
         """
         #  print(pageId, ocrd_file)
-        # delete any page mapping for this file.ID
-        for el_fptr in self._tree.getroot().findall(
-                'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]/mets:fptr[@FILEID="%s"]' %
-                ocrd_file.ID, namespaces=NS):
-            el_fptr.getparent().remove(el_fptr)
-
-        # find/construct as necessary
-        el_structmap = self._tree.getroot().find('mets:structMap[@TYPE="PHYSICAL"]', NS)
-        if el_structmap is None:
-            el_structmap = ET.SubElement(self._tree.getroot(), TAG_METS_STRUCTMAP)
-            el_structmap.set('TYPE', 'PHYSICAL')
-        el_seqdiv = el_structmap.find('mets:div[@TYPE="physSequence"]', NS)
-        if el_seqdiv is None:
-            el_seqdiv = ET.SubElement(el_structmap, TAG_METS_DIV)
-            el_seqdiv.set('TYPE', 'physSequence')
-        el_pagediv = el_seqdiv.find('mets:div[@ID="%s"]' % pageId, NS)
-        if el_pagediv is None:
-            el_pagediv = ET.SubElement(el_seqdiv, TAG_METS_DIV)
-            el_pagediv.set('TYPE', 'page')
-            el_pagediv.set('ID', pageId)
-            if order:
-                el_pagediv.set('ORDER', order)
-            if orderlabel:
-                el_pagediv.set('ORDERLABEL', orderlabel)
-        el_fptr = ET.SubElement(el_pagediv, TAG_METS_FPTR)
-        el_fptr.set('FILEID', ocrd_file.ID)
+        with self._journaled('set_physical_page_for_file', pageId, ocrd_file.ID, order, orderlabel):
+            # delete any page mapping for this file.ID
+            el_fptrs = self._fptrs_by_fileid.get(ocrd_file.ID, [])
+            for el_fptr in list(el_fptrs):
+                if self._is_physical_page(el_fptr.getparent()):
+                    el_fptr.getparent().remove(el_fptr)
+                    el_fptrs.remove(el_fptr)
+
+            # find/construct as necessary
+            el_structmap = self._tree.getroot().find('mets:structMap[@TYPE="PHYSICAL"]', NS)
+            if el_structmap is None:
+                el_structmap = ET.SubElement(self._tree.getroot(), TAG_METS_STRUCTMAP)
+                el_structmap.set('TYPE', 'PHYSICAL')
+            el_seqdiv = el_structmap.find('mets:div[@TYPE="physSequence"]', NS)
+            if el_seqdiv is None:
+                el_seqdiv = ET.SubElement(el_structmap, TAG_METS_DIV)
+                el_seqdiv.set('TYPE', 'physSequence')
+            el_pagediv = self._page_by_id.get(pageId)
+            if el_pagediv is None:
+                el_pagediv = ET.SubElement(el_seqdiv, TAG_METS_DIV)
+                el_pagediv.set('TYPE', 'page')
+                el_pagediv.set('ID', pageId)
+                self._page_by_id[pageId] = el_pagediv
+                if order:
+                    el_pagediv.set('ORDER', order)
+                if orderlabel:
+                    el_pagediv.set('ORDERLABEL', orderlabel)
+            el_fptr = ET.SubElement(el_pagediv, TAG_METS_FPTR)
+            el_fptr.set('FILEID', ocrd_file.ID)
+            self._fptrs_by_fileid.setdefault(ocrd_file.ID, []).append(el_fptr)
 
     def get_physical_page_for_file(self, ocrd_file):
         """
         Get the pageId for a ocrd_file
         """
-        ret = self._tree.getroot().xpath(
-            '/mets:mets/mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"][./mets:fptr[@FILEID="%s"]]/@ID' %
-            ocrd_file.ID, namespaces=NS)
-        if ret:
-            return ret[0]
+        return self._physical_page_for_fileid(ocrd_file.ID)
+
+    def _physical_page_for_fileid(self, fileId):
+        """
+        Get the pageId of the first physical page with a ``mets:fptr`` to ``fileId``
+        """
+        for el_fptr in self._fptrs_by_fileid.get(fileId, []):
+            if self._is_physical_page(el_fptr.getparent()):
+                return el_fptr.getparent().get('ID')
+
+    def _is_physical_page(self, el_div):
+        """
+        Whether ``el_div`` is a (registered) physical page ``mets:div``
+        """
+        return self._page_by_id.get(el_div.get('ID')) is el_div
 
     def remove_physical_page(self, ID):
-        mets_div = self._tree.getroot().xpath(
-            'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"][@ID="%s"]' % ID,
-            namespaces=NS)
-        if mets_div:
-            mets_div[0].getparent().remove(mets_div[0])
+        """
+        Delete the physical page ``mets:div`` with ``ID``
+        """
+        with self._journaled('remove_physical_page', ID):
+            mets_div = self._page_by_id.pop(ID, None)
+            if mets_div is not None:
+                for el_fptr in mets_div.findall('mets:fptr', NS):
+                    self._fptrs_by_fileid[el_fptr.get('FILEID')].remove(el_fptr)
+                mets_div.getparent().remove(mets_div)
+
+class _NotJournaled():
+    """
+    Context manager that does nothing (cf. ``OcrdMets._journaled``)
+    """
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NOT_JOURNALED = _NotJournaled()
+
+class _CacheUnpickler(pickle.Unpickler):
+    """
+    Unpickler for the METS cache that only accepts plain data, so a crafted
+    cache file (e.g. shipped with a workspace) cannot run code when loaded.
+    """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError("Forbidden in METS cache: %s.%s" % (module, name))
+
+@lru_cache(maxsize=1024)
+def _compile(pattern, flags=0):
+    """
+    Compile a ``find_files`` regex once.
+    """
+    return re.compile(pattern, flags)
+
+def _parse_filter(value, comma_list=False):
+    """
+    Split a ``find_files`` filter (a string, a compiled regex or a list of them)
+    into literal values and compiled regexes.
+
+    Args:
+        comma_list (boolean): Whether literal strings are comma-separated lists of values
+    """
+    literals, regexes = [], []
+    for value_ in [value] if isinstance(value, (str, REGEX_TYPE)) else value:
+        if isinstance(value_, REGEX_TYPE):
+            regexes.append(value_)
+        elif value_.startswith(REGEX_PREFIX):
+            regexes.append(_compile(value_[REGEX_PREFIX_LEN:]))
+        elif comma_list:
+            literals.extend(value_.split(','))
+        else:
+            literals.append(value_)
+    return literals, regexes
+
+def _cut_file_grps(data, file_grps):
+    """
+    Cut the contents of all ``mets:fileGrp`` whose ``USE`` is not in ``file_grps``
+    out of the raw METS ``data`` (leaving them empty), so they need not be parsed.
+
+    Return the remaining METS, and a dict mapping the ``USE`` of each cut fileGrp
+    to its original contents (raw bytes). Return ``None`` instead if the METS cannot
+    be cut reliably without parsing it, i.e. if it has comments, CDATA sections,
+    processing instructions, a DOCTYPE, ``>`` in attribute values or fileGrps to
+    cut with the same ``USE``.
+    """
+    if REGEX_CUT_AMBIGUOUS.search(data):
+        return None
+    parts, skipped, pos = [], {}, 0
+    for match in REGEX_FILEGRP_START.finditer(data):
+        if match.start() < pos or match.group(3):
+            # nested in a cut fileGrp already, or empty
+            continue
+        use = REGEX_USE.search(match.group(2) or b'')
+        use = use.group(2).decode('utf-8') if use else None
+        if use in file_grps:
+            continue
+        if use in skipped:
+            return None
+        # find the matching end tag (counting nested fileGrps)
+        depth = 1
+        for tag in _compile(br'<(/?)%s(?:\s[^>]*?)?(/?)>' % re.escape(match.group(1))).finditer(data, match.end()):
+            if tag.group(1):
+                depth -= 1
+            elif not tag.group(2):
+                depth += 1
+            if not depth:
+                break
+        else:
+            raise Exception("Unterminated fileGrp %s in METS" % use)
+        end = tag.start()
+        parts.append(data[pos:match.end()])
+        skipped[use] = data[match.end():end]
+        pos = end
+    parts.append(data[pos:])
+    return b''.join(parts), skipped
+
+def _cache_key(filename, data):
+    """
+    Identify the METS file ``filename`` with contents ``data`` for the cache of its indexes.
+    """
+    path = abspath(filename)
+    st = stat(path)
+    return (VERSION, path, st.st_size, st.st_mtime_ns, sha256(data).hexdigest())
+
+def _url_of(el_file):
+    """
+    Get the ``xlink:href`` of the ``mets:FLocat`` of a ``mets:file`` element (or ``None``).
+    """
+    el_FLocat = el_file.find(TAG_METS_FLOCAT)
+    if el_FLocat is not None:
+        return el_FLocat.get('{%s}href' % NS['xlink'])
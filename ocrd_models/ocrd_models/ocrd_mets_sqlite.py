@@ -0,0 +1,499 @@
+"""
+API to METS, with files and physical pages stored in a SQLite database
+"""
+from contextlib import contextmanager
+from re import fullmatch
+import sqlite3
+
+from ocrd_utils import is_local_filename, getLogger, REGEX_PREFIX
+
+from .constants import (
+    NAMESPACES as NS,
+    TAG_METS_DIV,
+    TAG_METS_FILE,
+    TAG_METS_FILEGRP,
+    TAG_METS_FILESEC,
+    TAG_METS_FLOCAT,
+    TAG_METS_FPTR,
+    TAG_METS_STRUCTMAP,
+)
+from .ocrd_xml_base import ET
+from .ocrd_file import OcrdFile
+from .ocrd_mets import OcrdMets, _compile, _parse_filter, _url_of
+
+log = getLogger('ocrd_models.ocrd_mets_sqlite')
+REGEX_PREFIX_LEN = len(REGEX_PREFIX)
+IMPORT_BATCH_SIZE = 10000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS document (xml BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS filegrp (USE TEXT PRIMARY KEY, seq INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS file (seq INTEGER PRIMARY KEY, fileGrp TEXT NOT NULL, ID TEXT, mimetype TEXT, url TEXT, xml BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS file_fileGrp ON file (fileGrp, seq);
+CREATE INDEX IF NOT EXISTS file_ID ON file (ID);
+CREATE INDEX IF NOT EXISTS file_mimetype ON file (mimetype);
+CREATE INDEX IF NOT EXISTS file_url ON file (url);
+CREATE TABLE IF NOT EXISTS page (seq INTEGER PRIMARY KEY, ID TEXT, xml BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS page_ID ON page (ID);
+CREATE TABLE IF NOT EXISTS fptr (seq INTEGER PRIMARY KEY, pageId TEXT NOT NULL, FILEID TEXT);
+CREATE INDEX IF NOT EXISTS fptr_pageId ON fptr (pageId, seq);
+CREATE INDEX IF NOT EXISTS fptr_FILEID ON fptr (FILEID);
+'''
+
+class OcrdMetsSqlite(OcrdMets):
+    """
+    API to a single METS file, like :py:class:`OcrdMets`, but with all
+    ``mets:file`` and physical page ``mets:div`` moved from the XML tree to
+    (indexed tables in) a SQLite database.
+
+    The rest of the document stays in memory as XML. ``to_xml`` and
+    ``write_xml`` put everything back together in the original order.
+    """
+
+    def __init__(self, database='', **kwargs):
+        """
+        Args:
+            database (string): Filename of the SQLite database. If neither ``filename``
+                nor ``content`` is given, open the METS stored there (cf. ``commit``)
+                instead of importing one. Default: Temporary file, removed when closed.
+        """
+        if kwargs.get('file_grps') is not None:
+            raise Exception("OcrdMetsSqlite cannot load only some fileGrps")
+        if kwargs.get('cache'):
+            raise Exception("OcrdMetsSqlite cannot use a METS cache (but can be stored, cf. database)")
+        # rows not yet inserted while importing (table -> [row])
+        self._imported = {'file': [], 'page': [], 'fptr': []}
+        self._db = sqlite3.connect(database, check_same_thread=False)
+        self._db.create_function('fullmatch', 3, _fullmatch)
+        self._db.executescript(SCHEMA)
+        if kwargs.get('filename') is None and kwargs.get('content') is None:
+            row = self._db.execute('SELECT xml FROM document').fetchone()
+            if row is None:
+                raise Exception("No METS stored in database '%s'" % database)
+            kwargs['content'] = row[0]
+        else:
+            self._db.executescript('DELETE FROM document; DELETE FROM file; DELETE FROM page; DELETE FROM fptr;')
+        super(OcrdMetsSqlite, self).__init__(**kwargs)
+
+    def _parse_file(self, filename):
+        """
+        Parse the METS file, moving ``mets:file`` and physical pages to the database as soon as they are parsed.
+        """
+        context = ET.iterparse(filename, events=('end',), tag=(TAG_METS_FILE, TAG_METS_DIV), remove_blank_text=True)
+        for _, el in context:
+            if el.tag == TAG_METS_FILE:
+                self._import_file(el)
+            elif _is_page_div(el):
+                self._import_page(el)
+        return ET.ElementTree(context.root)
+
+    def _fill_caches(self):
+        """
+        Move all ``mets:file`` and physical pages still in the tree to the database.
+        """
+        root = self._tree.getroot()
+        for el_file in list(root.iter(TAG_METS_FILE)):
+            self._import_file(el_file)
+        for el_div in list(root.iter(TAG_METS_DIV)):
+            if _is_page_div(el_div):
+                self._import_page(el_div)
+        self._flush_imported()
+        self._update_file_groups()
+        self.commit()
+
+    def _import_file(self, el_file):
+        """
+        Move ``el_file`` from the tree to the database
+        """
+        self._imported['file'].append(_file_row(el_file))
+        el_file.getparent().remove(el_file)
+        if len(self._imported['file']) >= IMPORT_BATCH_SIZE:
+            self._flush_imported()
+
+    def _import_page(self, el_div):
+        """
+        Move the physical page ``el_div`` (and its ``mets:fptr``) from the tree to the database
+        """
+        for el_fptr in el_div.findall('mets:fptr', NS):
+            self._imported['fptr'].append((el_div.get('ID'), el_fptr.get('FILEID')))
+            el_div.remove(el_fptr)
+        self._imported['page'].append((el_div.get('ID'), ET.tostring(el_div, with_tail=False)))
+        el_div.getparent().remove(el_div)
+
+    def _flush_imported(self):
+        self._db.executemany('INSERT INTO file (fileGrp, ID, mimetype, url, xml) VALUES (?, ?, ?, ?, ?)', self._imported['file'])
+        self._db.executemany('INSERT INTO page (ID, xml) VALUES (?, ?)', self._imported['page'])
+        self._db.executemany('INSERT INTO fptr (pageId, FILEID) VALUES (?, ?)', self._imported['fptr'])
+        for rows in self._imported.values():
+            rows.clear()
+
+    def _insert_file(self, el_file):
+        self._db.execute('INSERT INTO file (fileGrp, ID, mimetype, url, xml) VALUES (?, ?, ?, ?, ?)', _file_row(el_file))
+
+    def _update_file_groups(self):
+        """
+        Store the order of the fileGrps (for sorting files in the database)
+        """
+        self._db.execute('DELETE FROM filegrp')
+        self._db.executemany('INSERT OR IGNORE INTO filegrp (USE, seq) VALUES (?, ?)',
+                             [(USE, seq) for seq, USE in enumerate(self.file_groups)])
+
+    def commit(self):
+        """
+        Commit all changes to the database, so it can be opened again with ``database``.
+        """
+        self._db.execute('DELETE FROM document')
+        self._db.execute('INSERT INTO document (xml) VALUES (?)', (ET.tostring(self._tree.getroot()),))
+        self._db.commit()
+
+    def to_xml(self, xmllint=False):
+        """
+        Serialize all properties as pretty-printed XML, including files and pages from the database
+
+        Args:
+            xmllint (boolean): Format with ``xmllint`` in addition to pretty-printing
+        """
+        with self._files_spliced():
+            return super(OcrdMetsSqlite, self).to_xml(xmllint=xmllint)
+
+    def write_xml(self, f):
+        """
+        Serialize all properties as ``xmllint``-formatted XML directly to a file,
+        including files and pages from the database
+
+        Args:
+            f (file): File object opened in binary mode
+        """
+        with self._files_spliced():
+            super(OcrdMetsSqlite, self).write_xml(f)
+
+    @contextmanager
+    def _files_spliced(self):
+        """
+        Temporarily insert all ``mets:file`` and physical pages from the database into the tree
+        """
+        # (parent, number of children before splicing)
+        spliced = []
+        for el_fileGrp in self._tree.getroot().iter(TAG_METS_FILEGRP):
+            spliced.append((el_fileGrp, len(el_fileGrp)))
+            el_fileGrp.extend(_parse_all(self._db.execute(
+                'SELECT xml FROM file WHERE fileGrp = ? ORDER BY seq', (el_fileGrp.get('USE'),))))
+        fptrs = {}
+        for pageId, FILEID in self._db.execute('SELECT pageId, FILEID FROM fptr ORDER BY seq'):
+            fptrs.setdefault(pageId, []).append(FILEID)
+        pages = self._db.execute('SELECT ID, xml FROM page ORDER BY seq').fetchall()
+        if pages:
+            el_seqdiv = self._physical_sequence()
+            spliced.append((el_seqdiv, len(el_seqdiv)))
+            el_pagedivs = _parse_all((xml,) for _, xml in pages)
+            for (ID, _), el_pagediv in zip(pages, el_pagedivs):
+                for FILEID in fptrs.get(ID, []):
+                    ET.SubElement(el_pagediv, TAG_METS_FPTR).set('FILEID', FILEID)
+            el_seqdiv.extend(el_pagedivs)
+        try:
+            yield
+        finally:
+            for el_parent, n_children in spliced:
+                del el_parent[n_children:]
+
+    def iter_files(self, ID=None, fileGrp=None, pageId=None, mimetype=None, url=None, local_only=False, limit=None):
+        """
+        Search ``mets:file`` in this METS document, yielding matches lazily.
+
+        Same arguments as ``OcrdMets.iter_files``
+        """
+        if limit is not None and limit <= 0:
+            return
+        clauses = []
+        params = []
+        pageIds = None
+        if pageId:
+            pageIds, regexes = _parse_filter(pageId, comma_list=True)
+            pageId_clauses = []
+            if pageIds:
+                pageId_clauses.append('pageId IN (%s)' % ', '.join('?' * len(pageIds)))
+                params += pageIds
+            for regex in regexes:
+                pageId_clauses.append('fullmatch(?, ?, pageId)')
+                params += [regex.pattern, regex.flags]
+            clauses.append('file.ID IN (SELECT FILEID FROM fptr WHERE %s)' % ' OR '.join(pageId_clauses))
+        for column, value in [('file.ID', ID), ('file.fileGrp', fileGrp), ('file.mimetype', mimetype), ('file.url', url)]:
+            if not value:
+                continue
+            literals, regexes = _parse_filter(value)
+            column_clauses = []
+            if literals:
+                # with a pageId, look up files by page rather than by the (much less selective) fileGrp/mimetype index
+                column_clauses.append('%s%s IN (%s)' % (
+                    '+' if pageIds and column != 'file.ID' else '', column, ', '.join('?' * len(literals))))
+                params += literals
+            for regex in regexes:
+                column_clauses.append("fullmatch(?, ?, coalesce(%s, ''))" % column)
+                params += [regex.pattern, regex.flags]
+            clauses.append('(%s)' % ' OR '.join(column_clauses))
+        query = 'SELECT file.fileGrp, file.xml FROM file JOIN filegrp ON filegrp.USE = file.fileGrp'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY filegrp.seq, file.seq'
+        if limit is not None and not local_only:
+            query += ' LIMIT %d' % limit
+        n_found = 0
+        for fileGrp_, xml in self._db.execute(query, params).fetchall():
+            el_file = _file_element(fileGrp_, xml)
+            loctype = _loctype_of(el_file)
+            f = OcrdFile(el_file, mets=self)
+            if _loctype_of(el_file) != loctype and el_file.get('ID') is not None:
+                # OcrdFile sets the LOCTYPE of files found, which OcrdMets keeps
+                self._store_file(el_file, el_file.get('ID'))
+            # If only local resources should be returned and f is not a file path: skip the file
+            if local_only and not is_local_filename(f.url):
+                continue
+            yield f
+            n_found += 1
+            if limit is not None and n_found >= limit:
+                return
+
+    def add_file_group(self, fileGrp):
+        """
+        Add a new ``mets:fileGrp``.
+
+        Arguments:
+            fileGrp (string): ``USE`` attribute of the new filegroup.
+        """
+        if ',' in fileGrp:
+            raise Exception('fileGrp must not contain commas')
+        el_fileSec = self._tree.getroot().find('mets:fileSec', NS)
+        if el_fileSec is None:
+            el_fileSec = ET.SubElement(self._tree.getroot(), TAG_METS_FILESEC)
+        el_fileGrp = el_fileSec.find('mets:fileGrp[@USE="%s"]' % fileGrp, NS)
+        if el_fileGrp is None:
+            with self._journaled('add_file_group', fileGrp):
+                el_fileGrp = ET.SubElement(el_fileSec, TAG_METS_FILEGRP)
+                el_fileGrp.set('USE', fileGrp)
+                self._update_file_groups()
+        return el_fileGrp
+
+    def _remove_file_group(self, USE, recursive=False):
+        """
+        Remove a fileGrp (``USE`` string or element), cf. ``remove_file_group``
+        """
+        el_fileSec = self._tree.getroot().find('mets:fileSec', NS)
+        if el_fileSec is None:
+            raise Exception("No fileSec!")
+        if isinstance(USE, str):
+            if USE.startswith(REGEX_PREFIX):
+                for cand in el_fileSec.findall('mets:fileGrp', NS):
+                    if fullmatch(USE[REGEX_PREFIX_LEN:], cand.get('USE')):
+                        self._remove_file_group(cand, recursive=recursive)
+                return
+            else:
+                el_fileGrp = el_fileSec.find('mets:fileGrp[@USE="%s"]' % USE, NS)
+        else:
+            el_fileGrp = USE
+        if el_fileGrp is None:   # pylint: disable=len-as-condition
+            raise Exception("No such fileGrp: %s" % USE)
+        files = list(self.iter_files(fileGrp=el_fileGrp.get('USE')))
+        if files:
+            if not recursive:
+                raise Exception("fileGrp %s is not empty and recursive wasn't set" % USE)
+            for f in files:
+                self.remove_one_file(f)
+        el_fileGrp.getparent().remove(el_fileGrp)
+        self._update_file_groups()
+
+    def _has_file_id(self, ID):
+        """
+        Whether a ``mets:file`` with ``ID`` exists
+        """
+        return self._db.execute('SELECT 1 FROM file WHERE ID = ? LIMIT 1', (ID,)).fetchone() is not None
+
+    def _add_file(self, el_fileGrp, mimetype=None, url=None, ID=None, pageId=None, local_filename=None, ignore=False):
+        """
+        Add (or, if ``ID`` exists and not ``ignore``, replace) a ``mets:file`` in ``el_fileGrp``
+        """
+        with self._journaled('add_file', {'fileGrp': el_fileGrp.get('USE'), 'mimetype': mimetype, 'url': url,
+                                          'ID': ID, 'pageId': pageId, 'ignore': ignore}):
+            row = None if ignore else self._db.execute(
+                'SELECT fileGrp, xml FROM file WHERE ID = ? ORDER BY seq LIMIT 1', (ID,)).fetchone()
+            if row:
+                el_file = _file_element(*row)
+            else:
+                el_file = _file_element(el_fileGrp.get('USE'))
+            # without mets, to store the row only once
+            mets_file = OcrdFile(el_file)
+            mets_file.url = url
+            mets_file.mimetype = mimetype
+            mets_file.ID = ID
+            if row:
+                self._store_file(el_file, ID)
+            else:
+                self._insert_file(el_file)
+            mets_file.mets = self
+            mets_file.pageId = pageId
+            mets_file.local_filename = local_filename
+
+        return mets_file
+
+    def _update_file(self, el, name, el_attr, key, value):
+        """
+        Change property ``name`` of the ``mets:file`` element ``el`` by setting attribute
+        ``key`` of ``el_attr`` (``el`` or a child) to ``value``, keeping the database and
+        the journal in sync. Nothing is changed or journaled if ``value`` is the same.
+        """
+        if el_attr.get(key) == value:
+            return
+        ID = el.get('ID')
+        with self._journaled('update_file', ID, name, value):
+            el_attr.set(key, value)
+            self._store_file(el, ID)
+
+    def _store_file(self, el_file, ID):
+        """
+        Update the database row of the ``mets:file`` with ``ID`` (in the fileGrp of ``el_file``) from ``el_file``
+        """
+        row = _file_row(el_file)
+        self._db.execute(
+            'UPDATE file SET ID = ?, mimetype = ?, url = ?, xml = ? WHERE seq = '
+            '(SELECT seq FROM file WHERE ID = ? AND fileGrp = ? ORDER BY seq LIMIT 1)', row[1:] + (ID, row[0]))
+
+    def remove_one_file(self, ID):
+        """
+        Delete a `OcrdFile </../../ocrd_models/ocrd_models.ocrd_file.html>`_.
+        """
+        log.info("remove_one_file(%s)" % ID)
+        if isinstance(ID, OcrdFile):
+            ocrd_file = ID
+            ID = ocrd_file.ID
+        else:
+            ocrd_file = next(self.iter_files(ID=ID, limit=1), None)
+
+        if not ocrd_file:
+            raise FileNotFoundError("File not found: %s" % ID)
+
+        with self._journaled('remove_one_file', ID):
+            # Delete the physical page refs, and pages left empty
+            pageIds = [pageId for pageId, in self._db.execute('SELECT DISTINCT pageId FROM fptr WHERE FILEID = ?', (ID,))]
+            self._db.execute('DELETE FROM fptr WHERE FILEID = ?', (ID,))
+            for pageId in pageIds:
+                if self._db.execute('SELECT 1 FROM fptr WHERE pageId = ? LIMIT 1', (pageId,)).fetchone() is None:
+                    for seq, xml in self._db.execute('SELECT seq, xml FROM page WHERE ID = ?', (pageId,)).fetchall():
+                        if not len(ET.fromstring(xml)):
+                            log.info("Delete empty page %s", pageId)
+                            self._db.execute('DELETE FROM page WHERE seq = ?', (seq,))
+            # Delete other refs (e.g. in the logical structMap)
+            for el_fptr in list(self._tree.getroot().iter(TAG_METS_FPTR)):
+                if el_fptr.get('FILEID') == ID:
+                    el_div = el_fptr.getparent()
+                    el_div.remove(el_fptr)
+                    if not el_div.getchildren():
+                        el_div.getparent().remove(el_div)
+
+            # Delete the file reference
+            self._db.execute('DELETE FROM file WHERE seq = (SELECT seq FROM file WHERE ID = ? AND fileGrp = ? ORDER BY seq LIMIT 1)',
+                             (ID, ocrd_file.fileGrp))
+
+        return ocrd_file
+
+    @property
+    def physical_pages(self):
+        """
+        List all page IDs
+        """
+        return [ID for ID, in self._db.execute('SELECT ID FROM page WHERE ID IS NOT NULL ORDER BY seq')]
+
+    def set_physical_page_for_file(self, pageId, ocrd_file, order=None, orderlabel=None):
+        """
+        Create a new physical page
+        """
+        with self._journaled('set_physical_page_for_file', pageId, ocrd_file.ID, order, orderlabel):
+            # delete any page mapping for this file.ID
+            self._db.execute('DELETE FROM fptr WHERE FILEID = ?', (ocrd_file.ID,))
+            if self._db.execute('SELECT 1 FROM page WHERE ID = ?', (pageId,)).fetchone() is None:
+                el_pagediv = ET.Element(TAG_METS_DIV)
+                el_pagediv.set('TYPE', 'page')
+                el_pagediv.set('ID', pageId)
+                if order:
+                    el_pagediv.set('ORDER', order)
+                if orderlabel:
+                    el_pagediv.set('ORDERLABEL', orderlabel)
+                self._db.execute('INSERT INTO page (ID, xml) VALUES (?, ?)', (pageId, ET.tostring(el_pagediv)))
+            self._db.execute('INSERT INTO fptr (pageId, FILEID) VALUES (?, ?)', (pageId, ocrd_file.ID))
+
+    def _physical_page_for_fileid(self, fileId):
+        """
+        Get the pageId of the first physical page with a ``mets:fptr`` to ``fileId``
+        """
+        row = self._db.execute('SELECT pageId FROM fptr WHERE FILEID = ? ORDER BY seq LIMIT 1', (fileId,)).fetchone()
+        return row[0] if row else None
+
+    def remove_physical_page(self, ID):
+        """
+        Delete the physical page ``mets:div`` with ``ID``
+        """
+        with self._journaled('remove_physical_page', ID):
+            self._db.execute('DELETE FROM fptr WHERE pageId = ?', (ID,))
+            self._db.execute('DELETE FROM page WHERE ID = ?', (ID,))
+
+    def _physical_sequence(self):
+        """
+        Find or create the ``mets:div[@TYPE="physSequence"]`` of the physical ``mets:structMap``
+        """
+        el_structmap = self._tree.getroot().find('mets:structMap[@TYPE="PHYSICAL"]', NS)
+        if el_structmap is None:
+            el_structmap = ET.SubElement(self._tree.getroot(), TAG_METS_STRUCTMAP)
+            el_structmap.set('TYPE', 'PHYSICAL')
+        el_seqdiv = el_structmap.find('mets:div[@TYPE="physSequence"]', NS)
+        if el_seqdiv is None:
+            el_seqdiv = ET.SubElement(el_structmap, TAG_METS_DIV)
+            el_seqdiv.set('TYPE', 'physSequence')
+        return el_seqdiv
+
+def _file_element(fileGrp, xml=None):
+    """
+    Parse a ``mets:file`` from the database (or create a new one) in a detached
+    ``mets:fileGrp`` with ``USE`` ``fileGrp``, so ``OcrdFile.fileGrp`` works.
+    """
+    el_fileGrp = ET.Element(TAG_METS_FILEGRP)
+    el_fileGrp.set('USE', fileGrp)
+    if xml is None:
+        return ET.SubElement(el_fileGrp, TAG_METS_FILE)
+    el_fileGrp.append(ET.fromstring(xml))
+    return el_fileGrp[0]
+
+def _loctype_of(el_file):
+    """
+    ``LOCTYPE`` and ``OTHERLOCTYPE`` of the ``mets:FLocat`` of ``el_file`` (if any)
+    """
+    el_FLocat = el_file.find(TAG_METS_FLOCAT)
+    if el_FLocat is None:
+        return None
+    return el_FLocat.get('LOCTYPE'), el_FLocat.get('OTHERLOCTYPE')
+
+def _file_row(el_file):
+    """
+    Values of the columns (``fileGrp``, ``ID``, ``mimetype``, ``url``, ``xml``) of the ``file`` table for ``el_file``
+    """
+    return (el_file.getparent().get('USE'), el_file.get('ID'), el_file.get('MIMETYPE'), _url_of(el_file),
+            ET.tostring(el_file, with_tail=False))
+
+def _parse_all(rows):
+    """
+    Parse the serialized elements in ``rows`` (1-tuples) in one go
+    """
+    return list(ET.fromstring(b''.join([b'<elements>'] + [xml for xml, in rows] + [b'</elements>'])))
+
+def _is_page_div(el_div):
+    """
+    Whether ``el_div`` is a ``mets:div`` for a page in the physical ``mets:structMap``
+    """
+    el_seqdiv = el_div.getparent()
+    if el_div.get('TYPE') != 'page' or el_seqdiv is None or el_seqdiv.get('TYPE') != 'physSequence':
+        return False
+    el_structmap = el_seqdiv.getparent()
+    return el_structmap is not None and el_structmap.tag == TAG_METS_STRUCTMAP and el_structmap.get('TYPE') == 'PHYSICAL'
+
+def _fullmatch(pattern, flags, value):
+    """
+    SQL ``fullmatch(pattern, flags, value)``, matching like ``find_files``
+    """
+    return _compile(pattern, flags).fullmatch(value) is not None
@@ -1,16 +1,19 @@
 """
 Base class for XML documents loaded from either content or filename.
 """
+from contextlib import contextmanager
+from io import BytesIO
 from os.path import exists
 from lxml import etree as ET
 
 from .constants import NAMESPACES
-from .utils import xmllint_format
 
 
 for curie in NAMESPACES:
     ET.register_namespace(curie, NAMESPACES[curie])
 
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+
 class OcrdXmlDocument():
     """
     Base class for XML documents loaded from either content or filename.
@@ -28,11 +31,18 @@ class OcrdXmlDocument():
         elif content:
             self._tree = ET.ElementTree(ET.XML(content, parser=ET.XMLParser(encoding='utf-8')))
         else:
-            self._tree = ET.ElementTree()
             filename = filename.replace('file://', '')
             if not exists(filename):
                 raise Exception('File does not exist: %s' % filename)
-            self._tree.parse(filename)
+            self._tree = self._parse_file(filename)
+
+    def _parse_file(self, filename):
+        """
+        Parse the XML file ``filename`` into an ``ElementTree``.
+        """
+        tree = ET.ElementTree()
+        tree.parse(filename)
+        return tree
 
     def to_xml(self, xmllint=False):
         """
@@ -41,8 +51,43 @@ class OcrdXmlDocument():
         Args:
             xmllint (boolean): Format with ``xmllint`` in addition to pretty-printing
         """
-        root = self._tree.getroot()
-        ret = ET.tostring(ET.ElementTree(root), pretty_print=True, encoding='UTF-8')
         if xmllint:
-            ret = xmllint_format(ret)
-        return ret
+            ret = BytesIO()
+            # not self.write_xml, which subclasses may wrap just like to_xml
+            OcrdXmlDocument.write_xml(self, ret)
+            return ret.getvalue()
+        root = self._tree.getroot()
+        return ET.tostring(ET.ElementTree(root), pretty_print=True, encoding='UTF-8')
+
+    def write_xml(self, f):
+        """
+        Serialize all properties as pretty-printed XML, formatted like ``xmllint``
+        does (i.e. ``to_xml(xmllint=True)``), in a single pass directly to a file.
+
+        Args:
+            f (file): File object opened in binary mode
+        """
+        root = self._tree.getroot()
+        f.write(XML_DECLARATION)
+        with _blank_text_stripped(root), ET.xmlfile(f, encoding='UTF-8') as xf:
+            xf.write(root, pretty_print=True)
+
+@contextmanager
+def _blank_text_stripped(root):
+    """
+    Temporarily drop whitespace-only text between child elements (e.g. the
+    indentation of the parsed file), which would prevent indenting like ``xmllint``.
+    """
+    stripped = []
+    for el in root.xpath('descendant-or-self::*[* and text() and not(text()[normalize-space()])]'):
+        stripped.append((el, el.text, [child.tail for child in el]))
+        el.text = None
+        for child in el:
+            child.tail = None
+    try:
+        yield
+    finally:
+        for el, text, tails in stripped:
+            el.text = text
+            for child, tail in zip(el, tails):
+                child.tail = tail
@@ -108,6 +108,7 @@ METHOD_SPECS = (
     _add_method(r'^(UnorderedGroupType|UnorderedGroupIndexedType)$', 'get_UnorderedGroupChildren'),
     _add_method(r'^(PageType)$', 'get_AllRegions'),
     _add_method(r'^(PcGtsType)$', 'get_AllAlternativeImagePaths'),
+    _add_method(r'^(CoordsType|BaselineType)$', 'polygon'),
     )
 
 
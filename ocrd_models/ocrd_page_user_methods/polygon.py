@@ -0,0 +1,47 @@
+# pylint: disable=line-too-long,invalid-name,missing-module-docstring
+@property
+def points(self):
+    """
+    The ``@points`` attribute (formatted from the polygon set by :py:meth:`set_polygon` only when needed)
+    """
+    if self._points is None and self._polygon is not None:
+        from ocrd_utils import points_from_polygon # pylint: disable=import-outside-toplevel
+        self._points = points_from_polygon(self._polygon)
+    return self._points
+
+@points.setter
+def points(self, points):
+    self._points = points
+    self._polygon = None
+
+def get_polygon(self):
+    """
+    Get the ``@points`` as a numpy array of x,y coordinates (parsed once and cached until the points change).
+
+    The array is read-only; use :py:meth:`set_polygon` to change the points.
+    """
+    if self._polygon is None and self._points is not None:
+        import numpy as np # pylint: disable=import-outside-toplevel
+        polygon = np.array(self._points.replace(',', ' ').split(), dtype=np.float64).reshape(-1, 2)
+        polygon.flags.writeable = False
+        self._polygon = polygon
+    return self._polygon
+
+def set_polygon(self, polygon):
+    """
+    Set the ``@points`` from a sequence or numpy array of x,y coordinates.
+
+    (The attribute string will be formatted only when needed, e.g. on export.)
+    """
+    import numpy as np # pylint: disable=import-outside-toplevel
+    polygon = np.array(polygon, dtype=np.float64).reshape(-1, 2)
+    polygon.flags.writeable = False
+    self._points = None
+    self._polygon = polygon
+
+def __eq__(self, other):
+    # compare the ``@points`` strings, not their cached polygons
+    def attributes(obj):
+        return [(name, value) for name, value in obj.__dict__.items()
+                if name not in ('parent_object_', 'gds_collector_', '_points', '_polygon')]
+    return type(self) == type(other) and self.points == other.points and attributes(self) == attributes(other)
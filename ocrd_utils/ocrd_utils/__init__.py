@@ -1,7 +1,7 @@
 """
 Utility functions and constants usable in various circumstances.
 
-* ``coordinates_of_segment``, ``coordinates_for_segment``
+* ``coordinates_of_segment``, ``coordinates_for_segment``, ``coordinates_of_segments``, ``coordinates_for_segments``
 
     These functions convert polygon outlines for PAGE elements on all hierarchy
     levels below page (i.e. region, line, word, glyph) between relative coordinates
@@ -17,6 +17,11 @@ Utility functions and constants usable in various circumstances.
     the same operations context) when traversing the element hierarchy top to bottom.
     (Used by ``Workspace`` methods ``image_from_page`` and ``image_from_segment``).
 
+* ``concatenate_polygons``, ``split_polygons``, ``transform_polygons``
+
+    These functions convert a ragged list of polygons to a single array of points
+    (plus offsets) and back, so many polygons can be transformed in one operation.
+
 * ``rotate_image``, ``crop_image``, ``transpose_image``
 
     These PIL.Image functions are safe replacements for the ``rotate``, ``crop``, and
@@ -26,6 +31,11 @@ Utility functions and constants usable in various circumstances.
 
     These functions apply polygon masks to PIL.Image objects.
 
+* ``estimate_background``
+
+    This function determines the median color of a PIL.Image from its
+    (possibly subsampled) histogram, to fill with in the functions above.
+
 * ``xywh_from_points``, ``points_from_xywh``, ``polygon_from_points`` etc.
 
    These functions have the syntax ``X_from_Y``, where ``X``/``Y`` can be
@@ -47,7 +57,7 @@ Utility functions and constants usable in various circumstances.
       (produced by tesserocr)
     * ``y0x0y1x1`` is the same as ``x0y0x1y1`` with positions of ``x`` and ``y`` in the list swapped
 
-* ``is_local_filename``, ``safe_filename``, ``abspath``, ``get_local_filename``
+* ``is_local_filename``, ``safe_filename``, ``abspath``, ``get_local_filename``, ``import_file``
 
     FS-related utilities
 
@@ -55,7 +65,7 @@ Utility functions and constants usable in various circumstances.
 
     String and OOP utilities
 
-* ``MIMETYPE_PAGE``, ``EXT_TO_MIME``, ``MIME_TO_EXT``, ``VERSION``
+* ``MIMETYPE_PAGE``, ``EXT_TO_MIME``, ``MIME_TO_EXT``, ``IMPORT_STRATEGIES``, ``VERSION``
 
     Constants
 
@@ -72,6 +82,7 @@ from .constants import (
     VERSION,
     MIMETYPE_PAGE,
     EXT_TO_MIME,
+    IMPORT_STRATEGIES,
     MIME_TO_EXT,
     PIL_TO_MIME,
     MIME_TO_PIL,
@@ -88,9 +99,13 @@ from .image import (
     bbox_from_points,
     bbox_from_polygon,
     bbox_from_xywh,
+    concatenate_polygons,
     coordinates_for_segment,
+    coordinates_for_segments,
     coordinates_of_segment,
+    coordinates_of_segments,
     crop_image,
+    estimate_background,
     image_from_polygon,
     points_from_bbox,
     points_from_polygon,
@@ -105,7 +120,9 @@ from .image import (
     rotate_coordinates,
     rotate_image,
     shift_coordinates,
+    split_polygons,
     transform_coordinates,
+    transform_polygons,
     transpose_coordinates,
     transpose_image,
     xywh_from_bbox,
@@ -125,6 +142,7 @@ from .logging import (
 
 from .os import (
     abspath,
+    import_file,
     pushd_popd,
     unzip_file_to_dir)
 
@@ -5,6 +5,7 @@ from pkg_resources import get_distribution
 
 __all__ = [
     'EXT_TO_MIME',
+    'IMPORT_STRATEGIES',
     'LOG_FORMAT',
     'LOG_TIMEFMT',
     'MIMETYPE_PAGE',
@@ -81,6 +82,9 @@ MIME_TO_PIL = {
 # Prefix to denote query is regular expression not fixed string
 REGEX_PREFIX = '//'
 
+# ways to import a local file into a workspace, cf. ocrd_utils.import_file
+IMPORT_STRATEGIES = ['copy', 'reflink', 'hardlink', 'symlink']
+
 # Log level format implementing https://ocr-d.de/en/spec/cli#logging
 LOG_FORMAT = r'%(asctime)s.%(msecs)03d %(levelname)s %(name)s - %(message)s'
 LOG_TIMEFMT = r'%H:%M:%S'
@@ -12,8 +12,12 @@ __all__ = [
     'bbox_from_points',
     'bbox_from_polygon',
     'bbox_from_xywh',
+    'concatenate_polygons',
     'coordinates_for_segment',
+    'coordinates_for_segments',
     'coordinates_of_segment',
+    'coordinates_of_segments',
+    'estimate_background',
     'image_from_polygon',
     'points_from_bbox',
     'points_from_polygon',
@@ -27,7 +31,9 @@ __all__ = [
     'polygon_mask',
     'rotate_coordinates',
     'shift_coordinates',
+    'split_polygons',
     'transform_coordinates',
+    'transform_polygons',
     'transpose_coordinates',
     'xywh_from_bbox',
     'xywh_from_points',
@@ -68,12 +74,21 @@ def adjust_canvas_to_transposition(size, method):
     return size
 
 def bbox_from_points(points):
-    """Construct a numeric list representing a bounding box from polygon coordinates in page representation."""
+    """Construct a numeric list representing a bounding box from polygon coordinates in page representation.
+
+    ``points`` may also be a numpy array of points already (e.g. ``CoordsType.get_polygon()``).
+    """
+    if isinstance(points, np.ndarray):
+        return tuple(int(value) for value in bbox_from_polygon(points))
     xys = [[int(p) for p in pair.split(',')] for pair in points.split(' ')]
     return bbox_from_polygon(xys)
 
 def bbox_from_polygon(polygon):
     """Construct a numeric list representing a bounding box from polygon coordinates in numeric list representation."""
+    if isinstance(polygon, np.ndarray) and len(polygon):
+        minx, miny = polygon.min(axis=0)
+        maxx, maxy = polygon.max(axis=0)
+        return minx, miny, maxx, maxy
     minx = sys.maxsize
     miny = sys.maxsize
     maxx = -sys.maxsize
@@ -127,16 +142,32 @@ def coordinates_of_segment(segment, parent_image, parent_coords):
 
     Return the rounded numpy array of the resulting polygon.
     """
-    # get polygon:
-    polygon = np.array(polygon_from_points(segment.get_Coords().points))
+    return coordinates_of_segments([segment], parent_image, parent_coords)[0]
+
+def coordinates_of_segments(segments, parent_image, parent_coords):
+    """Extract the coordinates of many PAGE segment elements relative to their parent.
+
+    Same as :py:func:`coordinates_of_segment` for each of ``segments``
+    (all contained in the same parent), but transforming all their
+    points in a single operation.
+
+    Return a list of the rounded numpy arrays of the resulting polygons.
+    """
+    # get polygons (parsed and cached by the PAGE model):
+    coordinates, offsets = concatenate_polygons([segment.get_Coords().get_polygon() for segment in segments])
     # apply affine transform:
-    polygon = transform_coordinates(polygon, parent_coords['transform'])
-    return np.round(polygon).astype(np.int32)
+    coordinates = transform_coordinates(coordinates, parent_coords['transform'])
+    return split_polygons(np.round(coordinates).astype(np.int32), offsets)
 
 def polygon_from_points(points):
     """
     Convert polygon coordinates in page representation to polygon coordinates in numeric list representation.
+
+    ``points`` may also be a numpy array of points already (e.g. ``CoordsType.get_polygon()``),
+    which is returned as is.
     """
+    if isinstance(points, np.ndarray):
+        return points
     polygon = []
     for pair in points.split(" "):
         x_y = pair.split(",")
@@ -171,11 +202,62 @@ def coordinates_for_segment(polygon, parent_image, parent_coords):
 
     Return the rounded numpy array of the resulting polygon.
     """
-    polygon = np.array(polygon, dtype=np.float32) # avoid implicit type cast problems
+    return coordinates_for_segments([polygon], parent_image, parent_coords)[0]
+
+def coordinates_for_segments(polygons, parent_image, parent_coords):
+    """Convert many relative polygons to absolute.
+
+    Same as :py:func:`coordinates_for_segment` for each of ``polygons``
+    (all relative to the same ``parent_image``), but inverting the
+    transform only once and applying it to all points in a single
+    operation.
+
+    Return a list of the rounded numpy arrays of the resulting polygons.
+    """
+    coordinates, offsets = concatenate_polygons(polygons)
     # apply inverse of affine transform:
-    inv_transform = np.linalg.inv(parent_coords['transform'])
-    polygon = transform_coordinates(polygon, inv_transform)
-    return np.round(polygon).astype(np.int32)
+    coordinates = transform_coordinates(coordinates, np.linalg.inv(parent_coords['transform']))
+    return split_polygons(np.round(coordinates).astype(np.int32), offsets)
+
+def concatenate_polygons(polygons):
+    """Concatenate a ragged list of polygons into a single array.
+
+    Given a list ``polygons`` of sequences or numpy arrays of points,
+    stack all points into one 2d numpy array (of floats), and record
+    the index of the first point of each polygon (plus the total number
+    of points) in a 1d numpy array of offsets.
+
+    Return a tuple of both arrays (cf. :py:func:`split_polygons`).
+    """
+    polygons = [np.asarray(polygon, dtype=np.float64).reshape(-1, 2) for polygon in polygons]
+    offsets = np.zeros(len(polygons) + 1, dtype=np.intp)
+    np.cumsum([len(polygon) for polygon in polygons], out=offsets[1:])
+    if not polygons:
+        return np.zeros((0, 2)), offsets
+    return np.concatenate(polygons), offsets
+
+def split_polygons(coordinates, offsets):
+    """Split a single array of points into a ragged list of polygons.
+
+    Inverse of :py:func:`concatenate_polygons`.
+
+    Return a list of numpy arrays (views into ``coordinates``).
+    """
+    return [coordinates[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+def transform_polygons(coordinates, offsets, transform=None, inverse=False):
+    """Apply an affine transformation to many polygons at once.
+
+    Given the concatenated points ``coordinates`` and ``offsets`` of
+    a ragged list of polygons (cf. :py:func:`concatenate_polygons`),
+    multiply all points with the transformation matrix ``transform``
+    (or its inverse, if ``inverse`` is true) in a single operation.
+
+    Return a list of numpy arrays of the resulting polygons.
+    """
+    if transform is not None and inverse:
+        transform = np.linalg.inv(transform)
+    return split_polygons(transform_coordinates(coordinates, transform), offsets)
 
 def polygon_mask(image, coordinates):
     """"Create a mask image of a polygon.
@@ -259,7 +341,7 @@ def rotate_image(image, angle, fill='background', transparency=False):
         image = image.copy()
         image.putalpha(255)
     if fill == 'background':
-        background = ImageStat.Stat(image).median
+        background = list(estimate_background(image))
         if image.mode in ['RGBA', 'LA']:
             background[-1] = 0 # fully transparent
         background = tuple(background)
@@ -299,20 +381,18 @@ def shift_coordinates(transform, offset):
 
 def transform_coordinates(polygon, transform=None):
     """Apply an affine transformation to a set of points.
-    Augment the 2d numpy array of points ``polygon`` with a an extra
-    column of ones (homogeneous coordinates), then multiply with
-    the transformation matrix ``transform`` (or the identity matrix),
-    and finally remove the extra column from the result.
+    Multiply the 2d numpy array of points ``polygon`` in homogeneous
+    coordinates (i.e. with an implicit column of ones) with the
+    transformation matrix ``transform`` (or the identity matrix),
+    without the z coordinate of the result.
     """
+    polygon = np.asarray(polygon, dtype=np.float64)
     if transform is None:
-        transform = np.eye(3)
-    polygon = np.insert(polygon, 2, 1, axis=1) # make 3d homogeneous coordinates
-    polygon = np.dot(transform, polygon.T).T
-    # ones = polygon[:,2]
-    # assert np.all(np.array_equal(ones, np.clip(ones, 1 - 1e-2, 1 + 1e-2))), \
-    #     'affine transform failed' # should never happen
-    polygon = np.delete(polygon, 2, axis=1) # remove z coordinate again
-    return polygon
+        return polygon.copy()
+    # same as np.dot(transform, [x, y, 1]) for each point, but without
+    # augmenting (copying) the points or computing the z coordinate:
+    transform = np.asarray(transform)
+    return np.dot(polygon, transform[:2, :2].T) + transform[:2, 2]
 
 def transpose_coordinates(transform, method, orig=np.array([0, 0])):
     """"Compose an affine coordinate transformation with a transposition (i.e. flip or rotate in 90° multiples).
@@ -420,7 +500,7 @@ def transpose_image(image, method):
     LOG.debug('transposing image with %s', membername(Image, method))
     return image.transpose(method)
 
-def crop_image(image, box=None):
+def crop_image(image, box=None, fill='background'):
     """"Crop an image to a rectangle, filling with background.
 
     Given a PIL.Image ``image`` and a list ``box`` of the bounding
@@ -430,7 +510,7 @@ def crop_image(image, box=None):
     larger than ``image`` width/height. PIL.Image.crop would fill
     with black.) Since ``image`` is not necessarily binarized yet,
     determine the background from the median color (instead of
-    white).
+    white), unless another color is given as ``fill``.
 
     Return a new PIL.Image.
     """
@@ -442,14 +522,41 @@ def crop_image(image, box=None):
         LOG.warning('crop coordinates (%s) exceed image (%dx%d)',
                     str(box), image.width, image.height)
     LOG.debug('cropping image to %s', str(box))
+    clipped = (max(box[0], 0), max(box[1], 0),
+               min(box[2], image.width), min(box[3], image.height))
+    if clipped == tuple(box):
+        # nothing to fill
+        return image.crop(box)
     xywh = xywh_from_bbox(*box)
-    background = tuple(ImageStat.Stat(image).median)
+    if fill == 'background':
+        background = estimate_background(image)
+    else:
+        background = fill
     new_image = Image.new(image.mode, (xywh['w'], xywh['h']),
                           background) # or 'white'
-    new_image.paste(image, (-xywh['x'], -xywh['y']))
+    # only paste the part of the image within the box:
+    if clipped[0] < clipped[2] and clipped[1] < clipped[3]:
+        new_image.paste(image.crop(clipped),
+                        (clipped[0] - xywh['x'], clipped[1] - xywh['y']))
     return new_image
 
-def image_from_polygon(image, polygon, fill='background', transparency=False):
+def estimate_background(image, subsample=1):
+    """Estimate the background color of an image.
+
+    Given a PIL.Image ``image``, determine the median of each band
+    from its histogram. If ``subsample`` is larger than 1, then only
+    every ``subsample``-th pixel in each direction is counted (which
+    is much faster on large images, and usually just as good).
+
+    Return a tuple with a value for each band (including alpha).
+    """
+    if subsample > 1:
+        image = image.resize((max(1, image.width // subsample),
+                              max(1, image.height // subsample)),
+                             Image.NEAREST)
+    return tuple(ImageStat.Stat(image.histogram()).median)
+
+def image_from_polygon(image, polygon, fill='background', transparency=False, crop=False):
     """"Mask an image with a polygon.
 
     Given a PIL.Image ``image`` and a numpy array ``polygon``
@@ -457,7 +564,8 @@ def image_from_polygon(image, polygon, fill='background', transparency=False):
     outside the polygon hull to a color according to ``fill``:
 
     - if ``background`` (the default),
-      then use the median color of the image;
+      then use the median color of the image
+      (or, if ``crop`` is true, of the part within the polygon's bounding box);
     - otherwise use the given color, e.g. ``'white'`` or (255,255,255).
 
     Moreover, if ``transparency`` is true, then add an alpha channel
@@ -466,14 +574,33 @@ def image_from_polygon(image, polygon, fill='background', transparency=False):
     Images which already have an alpha channel will have it shrunk
     from the polygon mask (i.e. everything outside the polygon will
     be transparent, in addition to existing transparent pixels).
+
+    If ``crop`` is true, then also crop to the bounding box of the polygon
+    (like ``crop_image``, filling areas outside ``image`` with ``fill``).
+    The polygon is then only rasterized and composited within that box,
+    so this takes memory and time proportional to the size of the polygon
+    rather than the image. (Any object with ``crop``, ``mode``, ``width``
+    and ``height`` like a PIL.Image can be passed as ``image`` then.)
     
     Return a new PIL.Image.
     """
-    mask = polygon_mask(image, polygon)
+    if crop and fill == 'background':
+        # estimate from the part within the box only (so nothing else needs decoding)
+        box = bbox_from_polygon(polygon)
+        clipped = (max(box[0], 0), max(box[1], 0),
+                   min(box[2], image.width), min(box[3], image.height))
+        if clipped[0] < clipped[2] and clipped[1] < clipped[3]:
+            image = image.crop(clipped)
+            polygon = np.array(polygon) - np.array(clipped[:2])
     if fill == 'background':
-        background = tuple(ImageStat.Stat(image).median)
+        background = estimate_background(image)
     else:
         background = fill
+    if crop:
+        box = bbox_from_polygon(polygon)
+        image = crop_image(image, box=box, fill=background)
+        polygon = np.array(polygon) - np.array(box[:2])
+    mask = polygon_mask(image, polygon)
     new_image = Image.new(image.mode, image.size, background)
     new_image.paste(image, mask=mask)
     # ensure no information is lost by a adding transparency channel
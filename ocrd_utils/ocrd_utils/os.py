@@ -3,16 +3,29 @@ Operating system functions.
 """
 __all__ = [
     'abspath',
+    'import_file',
     'pushd_popd',
     'unzip_file_to_dir',
 ]
 
 import contextlib
 from os import getcwd, chdir
+import os
 import os.path
+from shutil import copyfileobj
+import sys
 
 from zipfile import ZipFile
 
+from .constants import IMPORT_STRATEGIES
+from .logging import getLogger
+
+# ioctl to clone a file on copy-on-write file systems (btrfs, XFS, ...), cf. ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+# maximum number of bytes per copy_file_range/sendfile call
+KERNEL_COPY_CHUNK_SIZE = 1 << 30
+
 def abspath(url):
     """
     Get a full path to a file or file URL
@@ -46,3 +59,70 @@ def unzip_file_to_dir(path_to_zip, output_directory):
     z.close()
 
 
+
+def _reflink(fsrc, fdst):
+    import fcntl
+    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+def _copy(fsrc, fdst):
+    """
+    Copy within the kernel (``copy_file_range``, else ``sendfile``) where possible,
+    else via a buffer.
+    """
+    offset = 0
+    for name in ['copy_file_range', 'sendfile']:
+        if not hasattr(os, name) or (name == 'sendfile' and not sys.platform.startswith('linux')):
+            continue
+        try:
+            while True:
+                if name == 'copy_file_range':
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), KERNEL_COPY_CHUNK_SIZE, offset) # pylint: disable=no-member
+                else:
+                    n = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, KERNEL_COPY_CHUNK_SIZE)
+                if not n:
+                    return
+                offset += n
+        except OSError:
+            # not supported for these files, continue where the copy stopped
+            pass
+    fsrc.seek(offset)
+    copyfileobj(fsrc, fdst)
+
+def import_file(src, dst, strategy='copy'):
+    """
+    Import the local file ``src`` as ``dst`` (replacing it if it exists,
+    instead of writing through it).
+
+    Strategies (cf. ``IMPORT_STRATEGIES``):
+
+    * ``copy``: Copy the content without passing it through Python
+      (``copy_file_range`` or ``sendfile`` where available)
+    * ``reflink``: Clone the file (copy-on-write, i.e. without copying the
+      content, on file systems like btrfs or XFS), else ``copy``
+    * ``hardlink``: Hardlink the file, else (e.g. on another file system) ``copy``.
+      Note that changes to either file will affect both.
+    * ``symlink``: Symlink the file (by its absolute path)
+    """
+    if strategy not in IMPORT_STRATEGIES:
+        raise Exception("Invalid import strategy '%s', must be one of %s" % (strategy, IMPORT_STRATEGIES))
+    log = getLogger('ocrd_utils.import_file')
+    src, dst = str(src), str(dst)
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if strategy == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+        return
+    if strategy == 'hardlink':
+        try:
+            os.link(src, dst)
+            return
+        except OSError as e:
+            log.debug("Cannot hardlink '%s' to '%s', copying instead: %s", src, dst, e)
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+        if strategy == 'reflink':
+            try:
+                _reflink(fsrc, fdst)
+                return
+            except (ImportError, OSError) as e:
+                log.debug("Cannot reflink '%s' to '%s', copying instead: %s", src, dst, e)
+        _copy(fsrc, fdst)
@@ -5,7 +5,7 @@ import re
 from shapely.geometry import Polygon, LineString
 from shapely.validation import explain_validity
 
-from ocrd_utils import getLogger, polygon_from_points, deprecated_alias
+from ocrd_utils import getLogger, deprecated_alias
 from ocrd_models.ocrd_page import parse
 from ocrd_modelfactory import page_from_file
 
@@ -268,7 +268,7 @@ def validate_consistency(node, page_textequiv_consistency, page_textequiv_strate
             parent = node
         if parent:
             parent_points = parent.get_Coords().points
-            node_poly = make_poly(polygon_from_points(parent_points))
+            node_poly = make_poly(parent.get_Coords().get_polygon())
             if not isinstance(node_poly, Polygon):
                 report.add_error(CoordinateValidityError(tag, node_id, file_id,
                                                          parent_points, node_poly))
@@ -306,7 +306,7 @@ def validate_consistency(node, page_textequiv_consistency, page_textequiv_strate
             if check_coords and node_poly:
                 child_tag = child.original_tagname_
                 child_points = child.get_Coords().points
-                child_poly = make_poly(polygon_from_points(child_points))
+                child_poly = make_poly(child.get_Coords().get_polygon())
                 if not isinstance(child_poly, Polygon):
                     # report.add_error(CoordinateValidityError(child_tag, child.id, file_id, child_points))
                     # log.debug("Invalid coords of %s %s", child_tag, child.id)
@@ -320,7 +320,7 @@ def validate_consistency(node, page_textequiv_consistency, page_textequiv_strate
                     consistent = False
         if isinstance(node, TextLineType) and check_baseline and node.get_Baseline():
             baseline_points = node.get_Baseline().points
-            baseline_line = make_line(polygon_from_points(baseline_points))
+            baseline_line = make_line(node.get_Baseline().get_polygon())
             if not isinstance(baseline_line, LineString):
                 report.add_error(CoordinateValidityError("Baseline", node_id, file_id,
                                                          baseline_points, baseline_line))
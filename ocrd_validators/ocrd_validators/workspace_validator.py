@@ -56,7 +56,7 @@ class WorkspaceValidator():
                 if grp in workspace.mets.file_groups:
                     if page_id:
                         for one_page_id in page_id:
-                            if workspace.mets.find_files(fileGrp=grp, pageId=one_page_id):
+                            if workspace.mets.exists(fileGrp=grp, pageId=one_page_id):
                                 report.add_error("Output fileGrp[@USE='%s'] already contains output for page %s" % (grp, one_page_id))
                     else:
                         report.add_error("Output fileGrp[@USE='%s'] already in METS!" % grp)
@@ -173,7 +173,7 @@ class WorkspaceValidator():
             self.workspace.download_file(f)
             page = page_from_file(f).get_Page()
             imageFilename = page.imageFilename
-            if not self.mets.find_files(url=imageFilename):
+            if not self.mets.exists(url=imageFilename):
                 self.report.add_error("PAGE-XML %s : imageFilename '%s' not found in METS" % (f.url, imageFilename))
             if is_local_filename(imageFilename) and not Path(imageFilename).exists():
                 self.report.add_warning("PAGE-XML %s : imageFilename '%s' points to non-existent local file")
@@ -251,7 +251,7 @@ class WorkspaceValidator():
         """
         Validate ``mets:file`` URLs are sane.
         """
-        if not self.mets.find_files():
+        if not self.mets.exists():
             self.report.add_error("No files")
         for f in self.mets.find_files():
             if f._el.get('GROUPID'): # pylint: disable=protected-access
@@ -1,11 +1,16 @@
 # pylint: disable=unused-import
 
-from os.path import dirname, realpath
-from os import chdir
+from os.path import dirname, realpath, join, relpath, isfile
+from os import chdir, getcwd, stat
+import re
 import sys
 import logging
 import io
 import collections
+from contextlib import contextmanager
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
 from unittest import TestCase as VanillaTestCase, skip, main as unittests_main
 import pytest
 from ocrd_utils import initLogging
@@ -53,6 +58,66 @@ class CapturingTestCase(TestCase):
     def capture_out_err(self):
         return self.capfd.readouterr()
 
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+@contextmanager
+def serve_directory(directory, fail_first=0, ignore_range_start=False):
+    """
+    Serve the files in ``directory`` via HTTP on localhost (in a background thread),
+    responding to the first ``fail_first`` requests of each path with HTTP 503.
+
+    Supports ``Range: bytes=N-`` requests (with ``If-Range`` matching ``Last-Modified``),
+    but (if ``ignore_range_start``) responds to those with the whole file, like a
+    broken server would.
+
+    Yields the server, with the base URL as ``url``, the number of requests
+    per path as ``requests`` and all ``Range`` headers received as ``ranges``.
+    """
+    class Handler(SimpleHTTPRequestHandler):
+        def translate_path(self, path):
+            return join(directory, relpath(super().translate_path(path), getcwd()))
+        def send_head(self):
+            with server.lock:
+                server.requests[self.path] = server.requests.get(self.path, 0) + 1
+                n_requests = server.requests[self.path]
+                if 'Range' in self.headers:
+                    server.ranges.append(self.headers['Range'])
+            if n_requests <= fail_first:
+                self.send_error(503)
+                return None
+            match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+            path = self.translate_path(self.path)
+            if not match or not isfile(path) or \
+                    self.headers.get('If-Range') != self.date_time_string(stat(path).st_mtime):
+                return super().send_head()
+            start, size = 0 if ignore_range_start else int(match.group(1)), stat(path).st_size
+            if start >= size:
+                self.send_error(416)
+                return None
+            f = open(path, 'rb')
+            f.seek(start)
+            self.send_response(206)
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, size - 1, size))
+            self.send_header('Content-Length', str(size - start))
+            self.end_headers()
+            return f
+        def log_message(self, *args): # pylint: disable=arguments-differ
+            pass
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.url = 'http://127.0.0.1:%d' % server.server_address[1]
+    server.requests = {}
+    server.ranges = []
+    server.lock = Lock()
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
 #  import traceback
 #  import warnings
 #  def warn_with_traceback(message, category, filename, lineno, file=None, line=None):
@@ -364,6 +364,17 @@ class TestCli(TestCase):
             result = self.runner.invoke(workspace_cli, ['-d', tempdir, 'find', '--page-id', 'PHYS_0005,PHYS_0001', '-k', 'url'])
             self.assertEqual(len(result.stdout.split('\n')), 19)
 
+    def test_find_files_multiple_values(self):
+        with TemporaryDirectory() as tempdir:
+            ws = self.resolver.workspace_from_nothing(directory=tempdir)
+            for grp in ['A', 'B', 'C']:
+                ws.add_file(grp, ID='%s_1' % grp, mimetype='image/tiff', url='%s/1.tif' % grp, pageId='PHYS_0001')
+                ws.add_file(grp, ID='%s_2' % grp, mimetype='image/tiff', url='%s/2.tif' % grp, pageId='PHYS_0002')
+            ws.save_mets()
+            result = self.runner.invoke(workspace_cli, ['-d', tempdir, 'find', '-G', 'A', '-G', '//[C]', '-g', '//.*2', '-k', 'ID'])
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(result.stdout, 'A_2\nC_2\n')
+
     def test_mets_basename(self):
         with TemporaryDirectory() as tempdir:
             with pushd_popd(tempdir):
@@ -405,5 +416,23 @@ class TestCli(TestCase):
                     self.assertEqual(len(ws.mets.find_files(pageId='PHYS_0001')), 2)
                     self.assertEqual(ws.mets.find_files(ID='FILE_OCR-D-PAGE_0001')[0].url, 'OCR-D-PAGE/FILE_0001.xml')
 
+    def test_bulk_add_import_strategy(self):
+        with TemporaryDirectory() as srcdir, TemporaryDirectory() as wsdir:
+            Path(srcdir, "page_0001.tif").write_text('foo')
+            self.resolver.workspace_from_nothing(directory=wsdir)
+            exit_code, _, err = self.invoke_cli(workspace_cli, [
+                '-d', wsdir,
+                '--import-strategy', 'hardlink',
+                'bulk-add',
+                '--regex', r'^.*/page_(?P<pageid>.*)\.tif$',
+                '--url', 'OCR-D-IMG/FILE_{{ pageid }}.tif',
+                '--file-id', 'FILE_{{ pageid }}',
+                '--page-id', 'PHYS_{{ pageid }}',
+                '--file-grp', 'OCR-D-IMG',
+                '%s/*' % srcdir
+            ])
+            self.assertEqual(exit_code, 0, err)
+            self.assertEqual(Path(wsdir, 'OCR-D-IMG', 'FILE_0001.tif').stat().st_ino, Path(srcdir, 'page_0001.tif').stat().st_ino)
+
 if __name__ == '__main__':
     main(__file__)
@@ -1,5 +1,10 @@
 from datetime import datetime
-from os.path import join
+from io import BytesIO
+from os.path import exists, join
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import pickle
+import re
 from tests.base import TestCase, main, assets, copy_of_directory
 
 from ocrd_utils import (
@@ -8,6 +13,8 @@ from ocrd_utils import (
     MIMETYPE_PAGE
 )
 from ocrd_models import OcrdMets
+from ocrd_models.constants import TAG_METS_FILE
+from ocrd_models.utils import xmllint_format
 
 # pylint: disable=protected-access,deprecated-method,too-many-public-methods
 class TestOcrdMets(TestCase):
@@ -60,9 +67,78 @@ class TestOcrdMets(TestCase):
         self.assertEqual(len(self.mets.find_files(mimetype=MIMETYPE_PAGE)), 20, '20 ' + MIMETYPE_PAGE)
         self.assertEqual(len(self.mets.find_files(url='OCR-D-IMG/FILE_0005_IMAGE.tif')), 1, '1 xlink:href="OCR-D-IMG/FILE_0005_IMAGE.tif"')
 
-    def test_find_files_no_regex_for_pageid(self):
-        with self.assertRaisesRegex(Exception, "not support regex search for pageId"):
-            self.mets.find_files(pageId='//foo')
+    def test_find_files_index_in_sync(self):
+        mets = OcrdMets.empty_mets()
+        f = mets.add_file('OUTPUT', ID='foo123', mimetype='bla/quux', url='foo/bar.xml', pageId='foobar')
+        mets.add_file('OUTPUT', ID='foo456', mimetype='bla/quux', url='foo/baz.xml', pageId='foobar')
+        self.assertEqual([x.ID for x in mets.find_files(pageId='foobar')], ['foo123', 'foo456'])
+        mets.add_file('OUTPUT', ID='foo000', mimetype='bla/other', url='foo/baz.xml', pageId='barfoo')
+        self.assertEqual([x.ID for x in mets.find_files(pageId='barfoo', fileGrp='OUTPUT')], ['foo000'])
+        self.assertEqual([x.ID for x in mets.find_files(pageId='foobar', url='foo/baz.xml')], ['foo456'])
+        mets.remove_one_file('foo000')
+        f.url = 'foo/new.xml'
+        f.mimetype = 'bla/new'
+        self.assertEqual(mets.find_files(url='foo/bar.xml'), [])
+        self.assertEqual([x.ID for x in mets.find_files(url='foo/new.xml')], ['foo123'])
+        self.assertEqual([x.ID for x in mets.find_files(mimetype='bla/quux')], ['foo456'])
+        f.ID = 'foo789'
+        self.assertEqual(mets.find_files(ID='foo123'), [])
+        self.assertEqual([x.ID for x in mets.find_files(fileGrp='OUTPUT')], ['foo789', 'foo456'])
+        mets.remove_one_file('foo456')
+        self.assertEqual([x.ID for x in mets.find_files(mimetype='//bla/.*')], ['foo789'])
+        mets.remove_file_group('OUTPUT', recursive=True)
+        self.assertEqual(mets.find_files(), [])
+        self.assertEqual(mets.find_files(pageId='foobar'), [])
+
+    def test_iter_files_limit(self):
+        mets = OcrdMets.empty_mets()
+        for i in range(5):
+            mets.add_file('OUTPUT', ID='foo%d' % i, mimetype='bla/quux', pageId='foobar')
+        files = mets.iter_files(fileGrp='OUTPUT')
+        self.assertEqual(next(files).ID, 'foo0')
+        self.assertEqual([f.ID for f in mets.iter_files(pageId='foobar', limit=2)], ['foo0', 'foo1'])
+        self.assertEqual(list(mets.iter_files(limit=0)), [])
+        self.assertTrue(mets.exists(ID='foo3'))
+        self.assertTrue(mets.exists(mimetype='//bla/.*'))
+        self.assertFalse(mets.exists(ID='foo5'))
+        self.assertFalse(mets.exists(fileGrp='INPUT'))
+
+    def test_iter_files_change(self):
+        for kwargs in [{'fileGrp': 'OUTPUT'}, {'pageId': 'foobar'}, {'mimetype': 'bla/quux'}, {}]:
+            mets = OcrdMets.empty_mets()
+            for i in range(3):
+                mets.add_file('OUTPUT', ID='foo%d' % i, mimetype='bla/quux', pageId='foobar')
+            # files added and removed while iterating are not seen
+            ids = []
+            for f in mets.iter_files(**kwargs):
+                ids.append(f.ID)
+                mets.add_file('OUTPUT', ID='new_%s' % f.ID, mimetype='bla/quux', pageId='foobar')
+                mets.remove_file(f.ID)
+            self.assertEqual(ids, ['foo0', 'foo1', 'foo2'], kwargs)
+
+    def test_find_files_regex_pageid(self):
+        mets = OcrdMets.empty_mets()
+        for page in range(1, 4):
+            mets.add_file('IMG', ID='IMG_%d' % page, mimetype='image/tiff', url='IMG/%d.tif' % page, pageId='PHYS_%04d' % page)
+            mets.add_file('SEG', ID='SEG_%d' % page, mimetype=MIMETYPE_PAGE, url='SEG/%d.xml' % page, pageId='PHYS_%04d' % page)
+        self.assertEqual([f.ID for f in mets.find_files(pageId='//PHYS_000[12]')], ['IMG_1', 'IMG_2', 'SEG_1', 'SEG_2'])
+        self.assertEqual([f.ID for f in mets.find_files(pageId='//PHYS_000[12]', fileGrp='SEG')], ['SEG_1', 'SEG_2'])
+        self.assertEqual([f.ID for f in mets.find_files(pageId='//PHYS_000[12]', ID='//SEG_.*')], ['SEG_1', 'SEG_2'])
+        self.assertEqual(mets.find_files(pageId='//foo'), [])
+
+    def test_find_files_multiple_values(self):
+        mets = OcrdMets.empty_mets()
+        for page in range(1, 4):
+            mets.add_file('IMG', ID='IMG_%d' % page, mimetype='image/tiff', url='IMG/%d.tif' % page, pageId='PHYS_%04d' % page)
+            mets.add_file('SEG', ID='SEG_%d' % page, mimetype=MIMETYPE_PAGE, url='SEG/%d.xml' % page, pageId='PHYS_%04d' % page)
+            mets.add_file('GT-SEG', ID='GT_%d' % page, mimetype=MIMETYPE_PAGE, url='GT-SEG/%d.xml' % page, pageId='PHYS_%04d' % page)
+        self.assertEqual([f.ID for f in mets.find_files(pageId=['PHYS_0001', 'PHYS_0003'], fileGrp=['IMG', '//GT-.*'])],
+                         ['IMG_1', 'IMG_3', 'GT_1', 'GT_3'])
+        self.assertEqual([f.ID for f in mets.find_files(pageId='PHYS_0001,PHYS_0003', fileGrp='IMG')], ['IMG_1', 'IMG_3'])
+        self.assertEqual([f.ID for f in mets.find_files(ID=['SEG_2', 'IMG_1', 'foo'])], ['IMG_1', 'SEG_2'])
+        self.assertEqual([f.ID for f in mets.find_files(url=('SEG/3.xml', re.compile(r'IMG/[23]\.tif')))], ['IMG_2', 'IMG_3', 'SEG_3'])
+        self.assertEqual([f.ID for f in mets.find_files(mimetype=[MIMETYPE_PAGE], ID=re.compile('.*_2'))], ['SEG_2', 'GT_2'])
+        self.assertEqual([f.ID for f in mets.find_files(mimetype=re.compile('IMAGE/.*', re.I), pageId='//.*2')], ['IMG_2'])
 
     def test_find_files_local_only(self):
         self.assertEqual(len(self.mets.find_files(pageId='PHYS_0001', local_only=True)), 3, '3 local files for page "PHYS_0001"')
@@ -81,6 +157,19 @@ class TestOcrdMets(TestCase):
             mets = OcrdMets(filename=join(tempdir, 'mets.xml'))
             self.assertEqual(mets.get_physical_pages(for_fileIds=['FILE_0002_IMAGE']), ['PHYS_0002'])
 
+    def test_physical_pages_for_fileids_after_change(self):
+        mets = OcrdMets.empty_mets()
+        f1 = mets.add_file('OUTPUT', ID='foo1', pageId='page1')
+        mets.add_file('OUTPUT', ID='foo2', pageId='page2')
+        self.assertEqual(mets.get_physical_pages(for_fileIds=['foo2', 'foo3', 'foo1']), ['page2', None, 'page1'])
+        f1.pageId = 'page2'
+        self.assertEqual(mets.get_physical_pages(for_fileIds=['foo1', 'foo2']), ['page2', 'page2'])
+        self.assertEqual([f.ID for f in mets.find_files(pageId='page2')], ['foo1', 'foo2'])
+        self.assertEqual(mets.find_files(pageId='page1'), [])
+        mets.remove_physical_page('page2')
+        self.assertEqual(mets.get_physical_pages(for_fileIds=['foo1', 'foo2']), [None, None])
+        self.assertEqual(f1.pageId, None)
+
     def test_add_group(self):
         mets = OcrdMets.empty_mets()
         self.assertEqual(len(mets.file_groups), 0, '0 file groups')
@@ -114,6 +203,30 @@ class TestOcrdMets(TestCase):
         f2 = self.mets.add_file('OUTPUT', ID='best-id-ever', mimetype="boop/beep", force=True)
         self.assertEqual(f._el, f2._el)
 
+    def test_add_files(self):
+        mets = OcrdMets.empty_mets()
+        mets.add_file('OUTPUT', ID='foo0', pageId='page1')
+        ret = mets.add_files([
+            {'fileGrp': 'OUTPUT', 'ID': 'foo1', 'mimetype': 'bla/quux', 'pageId': 'page1'},
+            {'fileGrp': 'OTHER', 'ID': 'foo2', 'url': 'foo/bar.xml', 'pageId': 'page2'},
+        ])
+        self.assertEqual([f.ID for f in ret], ['foo1', 'foo2'])
+        self.assertEqual(mets.file_groups, ['OUTPUT', 'OTHER'])
+        self.assertEqual(mets.physical_pages, ['page1', 'page2'])
+        self.assertEqual([f.ID for f in mets.find_files(pageId='page1')], ['foo0', 'foo1'])
+        self.assertEqual(mets.find_files(ID='foo2')[0].url, 'foo/bar.xml')
+
+    def test_add_files_ID_already_exists(self):
+        mets = OcrdMets.empty_mets()
+        mets.add_file('OUTPUT', ID='foo1', mimetype='bla/quux')
+        with self.assertRaisesRegex(Exception, "File with ID='foo1' already exists"):
+            mets.add_files([{'fileGrp': 'OUTPUT', 'ID': 'foo2'}, {'fileGrp': 'OUTPUT', 'ID': 'foo1'}])
+        with self.assertRaisesRegex(Exception, "File with ID='foo3' already exists"):
+            mets.add_files([{'fileGrp': 'OUTPUT', 'ID': 'foo3'}, {'fileGrp': 'OUTPUT', 'ID': 'foo3'}])
+        self.assertEqual([f.ID for f in mets.find_files()], ['foo1'])
+        mets.add_files([{'fileGrp': 'OUTPUT', 'ID': 'foo1', 'mimetype': 'boop/beep'}], force=True)
+        self.assertEqual([f.mimetype for f in mets.find_files()], ['boop/beep'])
+
     def test_add_file_ignore(self):
         self.mets.add_file('OUTPUT', ID='best-id-ever', mimetype="beep/boop")
         self.mets.add_file('OUTPUT', ID='best-id-ever', mimetype="boop/beep", ignore=True)
@@ -174,6 +287,154 @@ class TestOcrdMets(TestCase):
         """)
         self.assertIn('Őh śéé Áŕ', mets.to_xml().decode('utf-8'))
 
+    def test_load_file_grps(self):
+        with copy_of_directory(assets.path_to('SBB0000F29300010000/data')) as tempdir:
+            mets_full = OcrdMets(filename=join(tempdir, 'mets.xml'))
+            mets = OcrdMets(filename=join(tempdir, 'mets.xml'), file_grps=['OCR-D-IMG'])
+            self.assertEqual(mets.file_groups, mets_full.file_groups)
+            self.assertEqual(mets.to_xml(xmllint=True), mets_full.to_xml(xmllint=True))
+            self.assertEqual(mets.find_files(fileGrp='//(?!OCR-D-IMG).*'), [])
+            with self.assertRaisesRegex(Exception, "was not loaded"):
+                mets.add_file(mets.file_groups[-1], ID='foo123')
+            with self.assertRaisesRegex(Exception, "was not loaded"):
+                mets.remove_file_group(mets.file_groups[-1], recursive=True)
+            imgs = mets.find_files(fileGrp='OCR-D-IMG')
+            self.assertEqual([f.ID for f in imgs], [f.ID for f in mets_full.find_files(fileGrp='OCR-D-IMG')])
+            mets.add_file('OCR-D-IMG', ID='foo123', pageId=imgs[0].pageId)
+            self.assertEqual(len(mets.find_files(fileGrp='OCR-D-IMG')), len(imgs) + 1)
+            self.assertIn('ID="foo123"', mets.to_xml().decode('utf-8'))
+            # the contents of the other fileGrps are not even parsed
+            self.assertEqual(len(list(mets._tree.iter(TAG_METS_FILE))), len(imgs) + 1)
+
+    def test_load_file_grps_raw(self):
+        with TemporaryDirectory() as tempdir:
+            path = join(tempdir, 'mets.xml')
+            mets = OcrdMets.empty_mets()
+            for fileGrp in ['OCR-D-IMG', 'OCR-D-GT', 'OCR-D-SEG']:
+                mets.add_file(fileGrp, ID='FILE_0001_%s' % fileGrp, mimetype='image/tiff', pageId='PHYS_0001',
+                              url='%s/FILE_0001.tif' % fileGrp)
+            # other prefix, single quotes, whitespace, nested fileGrp
+            xml = mets.to_xml().decode('utf-8').replace('mets:', 'm:').replace('xmlns:mets', 'xmlns:m')
+            xml = xml.replace('<m:fileGrp USE="OCR-D-GT">', "<m:fileGrp  USE = 'OCR-D-GT' >\n<m:fileGrp USE=\"NESTED\"/>")
+            Path(path).write_text(xml)
+            mets = OcrdMets(filename=path, file_grps=['OCR-D-IMG'])
+            self.assertEqual(mets.file_groups, ['OCR-D-IMG', 'OCR-D-GT', 'OCR-D-SEG'])
+            self.assertEqual(sorted(mets._skipped_file_ids), ['FILE_0001_OCR-D-GT', 'FILE_0001_OCR-D-SEG'])
+            self.assertEqual([f.ID for f in mets.find_files()], ['FILE_0001_OCR-D-IMG'])
+            with self.assertRaisesRegex(Exception, "already exists"):
+                mets.add_file('OCR-D-IMG', ID='FILE_0001_OCR-D-GT')
+            self.assertEqual(mets.to_xml(), OcrdMets(filename=path).to_xml())
+
+    def test_load_file_grps_ambiguous(self):
+        mets = OcrdMets.empty_mets()
+        for fileGrp in ['OCR-D-IMG', 'OCR-D-GT', 'OCR-D-SEG']:
+            mets.add_file(fileGrp, ID='FILE_0001_%s' % fileGrp, mimetype='image/tiff', pageId='PHYS_0001',
+                          url='%s/FILE_0001.tif' % fileGrp)
+        xml = mets.to_xml().decode('utf-8')
+        gt = '<mets:fileGrp USE="OCR-D-GT">'
+        for desc, (old, new) in {
+                'comment': (gt, gt + '<!-- </mets:fileGrp> -->'),
+                'CDATA': (gt, gt + '<![CDATA[</mets:fileGrp>]]>'),
+                'attribute': (gt, '<mets:fileGrp ADMID="a>b" USE="OCR-D-GT">'),
+                'foreign fileGrp': ('<mets:fileSec>', '<mets:fileSec><foo:fileGrp xmlns:foo="urn:foo" USE="FOO"><foo:bar/></foo:fileGrp>'),
+        }.items():
+            with self.subTest(desc), TemporaryDirectory() as tempdir:
+                path = join(tempdir, 'mets.xml')
+                Path(path).write_text(xml.replace(old, new))
+                mets = OcrdMets(filename=path, file_grps=['OCR-D-IMG'])
+                self.assertEqual(mets.file_groups, ['OCR-D-IMG', 'OCR-D-GT', 'OCR-D-SEG'])
+                self.assertEqual(sorted(mets._skipped_file_ids), ['FILE_0001_OCR-D-GT', 'FILE_0001_OCR-D-SEG'])
+                self.assertEqual([f.ID for f in mets.find_files()], ['FILE_0001_OCR-D-IMG'])
+                self.assertEqual(len(list(mets._tree.iter(TAG_METS_FILE))), 1)
+                with self.assertRaisesRegex(Exception, "was not loaded"):
+                    mets.add_file('OCR-D-GT', ID='foo123')
+                self.assertEqual(mets.to_xml(), OcrdMets(filename=path).to_xml())
+        with TemporaryDirectory() as tempdir:
+            path = join(tempdir, 'mets.xml')
+            Path(path).write_text(xml.replace('USE="OCR-D-GT"', 'USE="OCR-D-SEG"'))
+            with self.assertRaisesRegex(Exception, "USE is not unique"):
+                OcrdMets(filename=path, file_grps=['OCR-D-IMG'])
+
+    def test_write_xml(self):
+        mets = OcrdMets.empty_mets()
+        mets.add_file('OCR-D-IMG', ID='FILE_0001_IMAGE', mimetype='image/tiff', url='OCR-D-IMG/FILE_0001.tif', pageId='PHYS_0001')
+        mets.add_file('OCR-D-GT', ID='FILE_0001_GT', mimetype='application/vnd.prima.page+xml', url='OCR-D-GT/FILE_0001.xml', pageId='PHYS_0001')
+        expected = xmllint_format(mets.to_xml())
+        f = BytesIO()
+        mets.write_xml(f)
+        self.assertEqual(f.getvalue(), expected)
+        self.assertEqual(mets.to_xml(xmllint=True), expected)
+        self.assertIn(b'\n      <mets:file ', expected)
+
+    def test_write_xml_whitespace(self):
+        mets = OcrdMets.empty_mets()
+        mets.add_file('OCR-D-IMG', ID='FILE_0001_IMAGE', mimetype='image/tiff', url='OCR-D-IMG/FILE_0001.tif', pageId='PHYS_0001')
+        expected = mets.to_xml(xmllint=True)
+        # start tags indented with tabs instead
+        original = re.sub(br'\n( +)(?=<\w)', lambda m: b'\n' + b'\t' * (len(m.group(1)) // 2), expected)
+        mets = OcrdMets(content=original)
+        # whitespace is kept when parsing and serializing without xmllint
+        serialized = mets.to_xml()
+        self.assertIn(b'\n\t\t\t<mets:file ', serialized)
+        f = BytesIO()
+        mets.write_xml(f)
+        self.assertEqual(f.getvalue(), expected)
+        # but only stripped temporarily for writing
+        self.assertEqual(mets.to_xml(), serialized)
+
+    def test_journal(self):
+        mets = OcrdMets.empty_mets(now='2020-08-20T12:00:00')
+        mets_journaled = OcrdMets(content=mets.to_xml(), journal=True)
+        for m in [mets, mets_journaled]:
+            m.add_file('OCR-D-IMG', ID='FILE_0001_IMAGE', mimetype='image/tiff', url='OCR-D-IMG/FILE_0001.tif', pageId='PHYS_0001')
+            m.add_file('OCR-D-IMG', ID='FILE_0002_IMAGE', mimetype='image/tiff', url='OCR-D-IMG/FILE_0002.tif', pageId='PHYS_0002')
+            m.find_files(ID='FILE_0002_IMAGE')[0].mimetype = 'image/png'
+            # unchanged values are not journaled
+            m.find_files(ID='FILE_0002_IMAGE')[0].mimetype = 'image/png'
+            m.find_files(ID='FILE_0002_IMAGE')[0].url = 'OCR-D-IMG/FILE_0002.tif'
+            m.remove_one_file('FILE_0001_IMAGE')
+            m.unique_identifier = 'foo'
+        self.assertIsNone(mets.pop_journal())
+        journal = mets_journaled.pop_journal()
+        self.assertEqual([entry[0] for entry in journal],
+                         ['add_file_group', 'add_file', 'add_file', 'update_file', 'remove_one_file', 'unique_identifier'])
+        self.assertEqual(mets_journaled.pop_journal(), [])
+        replayed = OcrdMets.empty_mets(now='2020-08-20T12:00:00')
+        replayed.replay_journal(journal)
+        self.assertEqual(replayed.to_xml(), mets.to_xml())
+
+    def test_cache(self):
+        def indexes(mets):
+            return ([(f.ID, f.fileGrp, f.mimetype, f.url, f.pageId) for f in mets.find_files()],
+                    mets.file_groups, mets.physical_pages, sorted(mets._fptrs_by_fileid))
+        with copy_of_directory(assets.path_to('SBB0000F29300010000/data')) as tempdir:
+            mets_path = join(tempdir, 'mets.xml')
+            expected = indexes(OcrdMets(filename=mets_path))
+            self.assertEqual(indexes(OcrdMets(filename=mets_path, cache=True)), expected)
+            self.assertTrue(exists(mets_path + '.cache'))
+            mets = OcrdMets(filename=mets_path, cache=True)
+            self.assertEqual(indexes(mets), expected)
+            # cache is used unless stale
+            with open(mets_path + '.cache', 'rb') as f:
+                cache = pickle.load(f)
+            cache['urls'] = ['foo'] * len(cache['urls'])
+            with open(mets_path + '.cache', 'wb') as f:
+                pickle.dump(cache, f)
+            self.assertEqual(OcrdMets(filename=mets_path, cache=True).find_files(url=expected[0][0][3]), [])
+            mets.add_file('OCR-D-NEW', ID='NEW_0001', mimetype='image/png', url='OCR-D-NEW/NEW_0001.png', pageId='PHYS_0001')
+            mets.remove_one_file(expected[0][0][0])
+            with open(mets_path, 'wb') as f:
+                mets.write_xml(f)
+            self.assertEqual(indexes(OcrdMets(filename=mets_path, cache=True)), indexes(mets))
+            # updated from the current state
+            mets.save_cache(mets_path)
+            self.assertEqual(indexes(OcrdMets(filename=mets_path, cache=True)), indexes(mets))
+            # no code is run from a crafted cache
+            with open(mets_path + '.cache', 'wb') as f:
+                pickle.dump(OcrdMets, f)
+            with self.assertLogs('ocrd_models.ocrd_mets', level='WARNING'):
+                self.assertEqual(indexes(OcrdMets(filename=mets_path, cache=True)), indexes(mets))
+
     def test_remove_page(self):
         with copy_of_directory(assets.path_to('SBB0000F29300010000/data')) as tempdir:
             mets = OcrdMets(filename=join(tempdir, 'mets.xml'))
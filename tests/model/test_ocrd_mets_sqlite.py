@@ -0,0 +1,70 @@
+from os.path import join
+import re
+from tempfile import TemporaryDirectory
+
+from tests.base import TestCase, main, assets
+
+from ocrd_models import OcrdMets, OcrdMetsSqlite
+
+# pylint: disable=protected-access
+class TestOcrdMetsSqlite(TestCase):
+
+    def setUp(self):
+        self.mets_lxml = OcrdMets(filename=assets.url_of('SBB0000F29300010000/data/mets.xml'))
+        self.mets = OcrdMetsSqlite(filename=assets.url_of('SBB0000F29300010000/data/mets.xml'))
+
+    def test_round_trip(self):
+        self.assertEqual(self.mets.to_xml(xmllint=True), self.mets_lxml.to_xml(xmllint=True))
+        self.assertEqual(OcrdMetsSqlite(content=self.mets.to_xml()).to_xml(xmllint=True), self.mets_lxml.to_xml(xmllint=True))
+
+    def test_properties(self):
+        self.assertEqual(self.mets.file_groups, self.mets_lxml.file_groups)
+        self.assertEqual(self.mets.physical_pages, self.mets_lxml.physical_pages)
+        self.assertEqual(self.mets.unique_identifier, self.mets_lxml.unique_identifier)
+        self.assertEqual([str(agent) for agent in self.mets.agents], [str(agent) for agent in self.mets_lxml.agents])
+
+    def test_find_files(self):
+        for kwargs in [{}, {'fileGrp': 'OCR-D-IMG'}, {'pageId': 'PHYS_0001'}, {'ID': '//FILE_0001.*'},
+                       {'mimetype': '//image/.*'}, {'url': '//.*'}, {'local_only': True}, {'pageId': '//PHYS_000[12]'},
+                       {'pageId': ['PHYS_0001', '//PHYS_0002'], 'fileGrp': ['OCR-D-IMG', '//OCR-D-GT-.*']},
+                       {'ID': re.compile('file_0001.*', re.I), 'mimetype': ['//image/.*', 'application/vnd.prima.page+xml']}]:
+            self.assertEqual([(f.ID, f.fileGrp, f.url, f.pageId) for f in self.mets.find_files(**kwargs)],
+                             [(f.ID, f.fileGrp, f.url, f.pageId) for f in self.mets_lxml.find_files(**kwargs)], kwargs)
+
+    def test_iter_files_change(self):
+        for mets in [self.mets_lxml, self.mets]:
+            expected = [f.ID for f in mets.find_files(fileGrp='OCR-D-IMG')]
+            ids = []
+            for f in mets.iter_files(fileGrp='OCR-D-IMG'):
+                ids.append(f.ID)
+                mets.add_file('OCR-D-IMG', ID='NEW_%s' % f.ID, mimetype='image/png', url='OCR-D-IMG/NEW_%s.png' % f.ID)
+                mets.remove_one_file(f.ID)
+            self.assertEqual(ids, expected)
+
+    def test_changes(self):
+        for mets in [self.mets_lxml, self.mets]:
+            f = mets.find_files(fileGrp='OCR-D-IMG')[1]
+            f.url = 'OCR-D-IMG/changed.tif'
+            f.pageId = 'PHYS_NEW'
+            mets.add_file('OCR-D-NEW', ID='NEW_0001', mimetype='image/png', url='OCR-D-NEW/NEW_0001.png', pageId='PHYS_0001')
+            with self.assertRaisesRegex(Exception, "File with ID='NEW_0001' already exists"):
+                mets.add_file('OCR-D-NEW', ID='NEW_0001')
+            mets.remove_one_file(mets.find_files()[0].ID)
+            mets.remove_file_group(mets.file_groups[1], recursive=True)
+            mets.unique_identifier = 'foo'
+            mets.add_agent(name='bar')
+        self.assertEqual([f.url for f in self.mets.find_files(pageId='PHYS_NEW')], ['OCR-D-IMG/changed.tif'])
+        self.assertEqual(self.mets.physical_pages, self.mets_lxml.physical_pages)
+        self.assertEqual(self.mets.to_xml(xmllint=True), self.mets_lxml.to_xml(xmllint=True))
+
+    def test_database(self):
+        with TemporaryDirectory() as tempdir:
+            mets = OcrdMetsSqlite(filename=assets.url_of('SBB0000F29300010000/data/mets.xml'), database=join(tempdir, 'mets.sqlite'))
+            mets.add_file('OCR-D-NEW', ID='NEW_0001', mimetype='image/png', url='OCR-D-NEW/NEW_0001.png', pageId='PHYS_0001')
+            mets.commit()
+            self.assertEqual(OcrdMetsSqlite(database=join(tempdir, 'mets.sqlite')).to_xml(), mets.to_xml())
+            with self.assertRaisesRegex(Exception, "No METS stored"):
+                OcrdMetsSqlite(database=join(tempdir, 'empty.sqlite'))
+
+if __name__ == '__main__':
+    main()
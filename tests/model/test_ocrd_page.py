@@ -1,8 +1,11 @@
+import numpy as np
+
 from tests.base import TestCase, main, assets
 
 from ocrd_models.ocrd_page_generateds import TextTypeSimpleType
 from ocrd_models.ocrd_page import (
     AlternativeImageType,
+    CoordsType,
     PcGtsType,
     PageType,
     TextRegionType,
@@ -290,5 +293,31 @@ class TestOcrdPage(TestCase):
             # TODO: Test with word/glyph-level AlternativeImages
             # self.assertEqual(len(pcgts.get_AllAlternativeImagePaths(word=False)), 37)
 
+    def test_coords_polygon(self):
+        pcgts = parseString(simple_page.encode('utf8'), silence=True)
+        line = pcgts.get_Page().get_TextRegion()[0].get_TextLine()[0]
+        coords = line.get_Coords()
+        polygon = coords.get_polygon()
+        self.assertEqual(polygon.tolist(), [[114, 366], [918, 366], [918, 438], [114, 438]])
+        # parsed once, and read-only
+        self.assertIs(coords.get_polygon(), polygon)
+        with self.assertRaises(ValueError):
+            polygon[0, 0] = 0
+        self.assertEqual(line.get_Baseline().get_polygon().tolist(), [[114, 429], [918, 429]])
+        # invalidated when the points change
+        coords.set_points('1,2 3,4 5,6')
+        self.assertEqual(coords.get_polygon().tolist(), [[1, 2], [3, 4], [5, 6]])
+        # the string is only formatted when needed
+        coords.set_polygon(np.array([[10, 20], [30, 20], [30, 40]]))
+        self.assertIsNone(coords._points)
+        self.assertIn('<pc:Coords points="10,20 30,20 30,40"/>', to_xml(pcgts))
+        self.assertEqual(coords.get_points(), '10,20 30,20 30,40')
+        # compared by their points
+        coords = CoordsType()
+        coords.set_polygon([[10, 20], [30, 20], [30, 40]])
+        self.assertEqual(coords, CoordsType(points='10,20 30,20 30,40'))
+        self.assertNotEqual(coords, CoordsType(points='10,20 30,20 30,41'))
+        self.assertIsNone(CoordsType().get_polygon())
+
 if __name__ == '__main__':
     main(__file__)
@@ -95,6 +95,13 @@ class TestDecorators(TestCase):
                 exit_code, out, err = self.invoke_cli(cli_dummy_processor, ['-p', '{"baz": "forty-two"}', '--mets', 'mets.xml', *DEFAULT_IN_OUT])
                 self.assertEqual(exit_code, 0)
 
+    def test_processor_run_mets_cache(self):
+        with copy_of_directory(assets.path_to('SBB0000F29300010000/data')) as tempdir:
+            with pushd_popd(tempdir):
+                exit_code, out, err = self.invoke_cli(cli_dummy_processor, ['--mets-cache', '--mets', 'mets.xml', *DEFAULT_IN_OUT])
+                self.assertEqual(exit_code, 0)
+                self.assertTrue(exists('mets.xml.cache'))
+
     def test_param_merging(self):
         json1 = '{"foo": 23, "bar": 100}'
         json2 = '{"foo": 42}'
@@ -1,8 +1,9 @@
+from os import utime
 from os.path import join as pjoin
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
-from tests.base import TestCase, assets, main, copy_of_directory
+from tests.base import TestCase, assets, main, copy_of_directory, serve_directory
 
 from ocrd.resolver import Resolver
 from ocrd_utils import pushd_popd
@@ -147,5 +148,109 @@ class TestResolver(TestCase):
                 self.assertEqual(fn, pjoin('baz', 'mets.xml'))
                 self.assertTrue(Path(dst, fn).exists())
 
+    def test_download_to_directory_import_strategy(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as dst:
+            Path(src, 'foo.tif').write_bytes(b'0123456789')
+            resolver = Resolver(import_strategy='symlink')
+            fn = resolver.download_to_directory(dst, pjoin(src, 'foo.tif'), subdir='baz')
+            self.assertTrue(Path(dst, fn).is_symlink())
+            self.assertEqual(Path(dst, fn).read_bytes(), b'0123456789')
+            with self.assertRaisesRegex(Exception, "Invalid import strategy 'move'"):
+                Resolver(import_strategy='move')
+
+    def test_download_to_directory_http(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as dst:
+            Path(src, 'foo.tif').write_bytes(b'0123456789')
+            with serve_directory(src) as server:
+                fn = self.resolver.download_to_directory(dst, server.url + '/foo.tif', subdir='baz')
+                self.assertEqual(Path(dst, fn).read_bytes(), b'0123456789')
+                self.assertEqual(sorted(p.name for p in Path(dst, 'baz').iterdir()), ['foo.tif'])
+                # validators are kept hidden, not next to the file
+                self.assertTrue(Path(dst, '.validators', 'baz', 'foo.tif.json').exists())
+                with self.assertRaisesRegex(Exception, r"HTTP request failed: .*/bar.tif \(HTTP 404\)"):
+                    self.resolver.download_to_directory(dst, server.url + '/bar.tif')
+                self.assertEqual(server.ranges, [])
+
+    def test_download_to_directory_http_resume(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as dst:
+            Path(src, 'foo.tif').write_bytes(b'0123456789')
+            with serve_directory(src) as server:
+                last_modified = self.resolver.session.head(server.url + '/foo.tif').headers['Last-Modified']
+                # interrupted download
+                Path(dst, 'foo.tif.part').write_bytes(b'01234')
+                Path(dst, 'foo.tif.part.validator').write_text(last_modified)
+                self.resolver.download_to_directory(dst, server.url + '/foo.tif', basename='foo.tif')
+                self.assertEqual(server.ranges, ['bytes=5-'])
+                self.assertEqual(Path(dst, 'foo.tif').read_bytes(), b'0123456789')
+                # no partial downloads left (validators are hidden)
+                self.assertEqual(sorted(p.name for p in Path(dst).iterdir() if not p.name.startswith('.')), ['foo.tif'])
+                # changed since
+                Path(dst, 'foo.tif.part').write_bytes(b'abcde')
+                Path(dst, 'foo.tif.part.validator').write_text('Thu, 01 Jan 1970 00:00:00 GMT')
+                self.resolver.download_to_directory(dst, server.url + '/foo.tif', basename='foo.tif', if_exists='overwrite')
+                self.assertEqual(Path(dst, 'foo.tif').read_bytes(), b'0123456789')
+                # complete already
+                Path(dst, 'foo.tif.part').write_bytes(b'0123456789')
+                Path(dst, 'foo.tif.part.validator').write_text(last_modified)
+                self.resolver.download_to_directory(dst, server.url + '/foo.tif', basename='foo.tif', if_exists='overwrite')
+                self.assertEqual(Path(dst, 'foo.tif').read_bytes(), b'0123456789')
+                # no partial downloads left (validators are hidden)
+                self.assertEqual(sorted(p.name for p in Path(dst).iterdir() if not p.name.startswith('.')), ['foo.tif'])
+            with serve_directory(src, ignore_range_start=True) as server:
+                # range not as requested: downloaded again
+                Path(dst, 'foo.tif.part').write_bytes(b'01234')
+                Path(dst, 'foo.tif.part.validator').write_text(last_modified)
+                self.resolver.download_to_directory(dst, server.url + '/foo.tif', basename='foo.tif', if_exists='overwrite')
+                self.assertEqual(server.ranges, ['bytes=5-'])
+                self.assertEqual(server.requests, {'/foo.tif': 2})
+                self.assertEqual(Path(dst, 'foo.tif').read_bytes(), b'0123456789')
+
+    def test_workspace_from_url_file_grps(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as dst:
+            with serve_directory(src) as server:
+                ws = self.resolver.workspace_from_nothing(directory=src)
+                for i, fileGrp in enumerate(['OCR-D-IMG', 'OCR-D-GT']):
+                    Path(src, '%d.tif' % i).write_bytes(b'%d' % i)
+                    ws.add_file(fileGrp, ID='FILE_%d' % i, mimetype='image/tiff', url='%s/%d.tif' % (server.url, i))
+                ws.save_mets()
+                ws = self.resolver.workspace_from_url(server.url + '/mets.xml', dst_dir=dst, download=True, file_grps=['OCR-D-GT'])
+                self.assertEqual(server.requests, {'/mets.xml': 1, '/1.tif': 1})
+                self.assertEqual([f.ID for f in ws.mets.find_files()], ['FILE_1'])
+                ws.save_mets()
+                self.assertIn('%s/0.tif' % server.url, Path(dst, 'mets.xml').read_text())
+
+    def test_workspace_from_url_conditional(self):
+        def touch(path):
+            # Last-Modified has a resolution of seconds
+            utime(str(path), (0, path.stat().st_mtime + 10))
+        with TemporaryDirectory() as src, TemporaryDirectory() as dst:
+            with serve_directory(src) as server:
+                ws = self.resolver.workspace_from_nothing(directory=src)
+                for i in range(2):
+                    Path(src, '%d.tif' % i).write_bytes(b'%d' % i)
+                    ws.add_file('OCR-D-IMG', ID='FILE_%d' % i, mimetype='image/tiff', url='%s/%d.tif' % (server.url, i))
+                ws.save_mets()
+                self.resolver.workspace_from_url(server.url + '/mets.xml', dst_dir=dst, download=True).save_mets()
+                self.assertEqual(server.requests, {'/mets.xml': 1, '/0.tif': 1, '/1.tif': 1})
+                self.assertTrue(Path(dst, '.validators', 'mets.xml.json').exists())
+                # unchanged: local METS (pointing to the downloaded files) is kept
+                ws = self.resolver.workspace_from_url(server.url + '/mets.xml', dst_dir=dst, clobber_mets=True, download=True)
+                self.assertEqual(server.requests, {'/mets.xml': 2, '/0.tif': 1, '/1.tif': 1})
+                self.assertEqual(ws.mets.find_files(ID='FILE_0')[0].url, 'OCR-D-IMG/FILE_0.tif')
+                # changed: only transfer what changed
+                Path(src, '1.tif').write_bytes(b'changed')
+                touch(Path(src, '1.tif'))
+                touch(Path(src, 'mets.xml'))
+                self.resolver.workspace_from_url(server.url + '/mets.xml', dst_dir=dst)
+                self.assertEqual(server.requests['/mets.xml'], 3)
+                self.assertIn('OCR-D-IMG/FILE_0.tif', Path(dst, 'mets.xml').read_text())
+                ws = self.resolver.workspace_from_url(server.url + '/mets.xml', dst_dir=dst, clobber_mets=True, download=True)
+                self.assertEqual(server.requests, {'/mets.xml': 4, '/0.tif': 1, '/1.tif': 1})
+                self.assertEqual(Path(dst, 'OCR-D-IMG', 'FILE_1.tif').read_bytes(), b'1')
+                ws = self.resolver.workspace_from_url(server.url + '/mets.xml', dst_dir=dst, clobber_mets=True, download=True, revalidate_files=True)
+                self.assertEqual(server.requests, {'/mets.xml': 5, '/0.tif': 2, '/1.tif': 2})
+                self.assertEqual(Path(dst, 'OCR-D-IMG', 'FILE_0.tif').read_bytes(), b'0')
+                self.assertEqual(Path(dst, 'OCR-D-IMG', 'FILE_1.tif').read_bytes(), b'changed')
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,78 @@
+from os import utime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from click.testing import CliRunner
+
+from tests.base import TestCase, main, serve_directory
+
+from ocrd.cli import cli
+from ocrd.resolver import Resolver
+from ocrd.resolver_cache import ResolverCache
+
+class TestResolverCache(TestCase):
+
+    def test_download(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as cache_dir, \
+                TemporaryDirectory() as dst1, TemporaryDirectory() as dst2:
+            Path(src, 'foo.tif').write_bytes(b'0123456789')
+            Path(src, 'bar.tif').write_bytes(b'0123456789')
+            resolver = Resolver(cache=ResolverCache(cache_dir))
+            with serve_directory(src) as server:
+                for dst in [dst1, dst2]:
+                    for basename in ['foo.tif', 'bar.tif']:
+                        resolver.download_to_directory(dst, server.url + '/' + basename)
+                self.assertEqual(Path(dst2, 'foo.tif').read_bytes(), b'0123456789')
+                # stored once, linked into both workspaces
+                self.assertEqual(resolver.cache.stats(), {'objects': 1, 'size': 10, 'urls': 2})
+                self.assertEqual(len({Path(dst, basename).stat().st_ino for dst in [dst1, dst2] for basename in ['foo.tif', 'bar.tif']}), 1)
+                # changed since
+                Path(src, 'foo.tif').write_bytes(b'abcdefghij')
+                utime(str(Path(src, 'foo.tif')), (0, Path(src, 'foo.tif').stat().st_mtime + 10))
+                resolver.download_to_directory(dst2, server.url + '/foo.tif', if_exists='overwrite')
+                self.assertEqual(Path(dst2, 'foo.tif').read_bytes(), b'abcdefghij')
+                self.assertEqual(Path(dst1, 'foo.tif').read_bytes(), b'0123456789')
+                self.assertEqual(resolver.cache.stats(), {'objects': 2, 'size': 20, 'urls': 2})
+                with self.assertRaisesRegex(Exception, r"HTTP request failed: .*/baz.tif \(HTTP 404\)"):
+                    resolver.download_to_directory(dst1, server.url + '/baz.tif')
+
+    def test_prune(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as cache_dir, TemporaryDirectory() as dst:
+            for i in range(3):
+                Path(src, '%d.tif' % i).write_bytes(b'%d' % i * 10)
+            resolver = Resolver(cache=ResolverCache(cache_dir, max_size=25))
+            with serve_directory(src) as server:
+                for i in range(3):
+                    resolver.download_to_directory(dst, '%s/%d.tif' % (server.url, i))
+                    objects = sorted(resolver.cache._objects()) # pylint: disable=protected-access
+                    for n, (_, _, path) in enumerate(objects):
+                        utime(path, (0, 1000 * (i + 1) + n))
+                # least recently used evicted
+                self.assertEqual(resolver.cache.stats(), {'objects': 2, 'size': 20, 'urls': 2})
+                self.assertEqual(server.requests, {'/0.tif': 1, '/1.tif': 1, '/2.tif': 1})
+                resolver.download_to_directory(dst, server.url + '/0.tif', if_exists='overwrite')
+                self.assertEqual(server.requests['/0.tif'], 2)
+                self.assertEqual(Path(dst, '0.tif').read_bytes(), b'0' * 10)
+                self.assertEqual(resolver.cache.prune(), 20)
+                self.assertEqual(resolver.cache.stats(), {'objects': 0, 'size': 0, 'urls': 0})
+                # downloaded files are kept
+                self.assertEqual(Path(dst, '2.tif').read_bytes(), b'2' * 10)
+
+    def test_cli(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as cache_dir, TemporaryDirectory() as dst:
+            Path(src, 'foo.tif').write_bytes(b'0123456789')
+            with serve_directory(src) as server:
+                Resolver(cache=ResolverCache(cache_dir)).download_to_directory(dst, server.url + '/foo.tif')
+            runner = CliRunner()
+            result = runner.invoke(cli, ['resolver', 'cache', '-d', cache_dir, 'stats'])
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(result.output, 'objects\t1\nsize\t10\nurls\t1\n')
+            result = runner.invoke(cli, ['resolver', 'cache', '-d', cache_dir, 'prune', '--max-size', '1K'])
+            self.assertEqual(result.output, 'freed\t0\n')
+            result = runner.invoke(cli, ['resolver', 'cache', '-d', cache_dir, 'prune', '--max-size', '1X'])
+            self.assertNotEqual(result.exit_code, 0)
+            result = runner.invoke(cli, ['resolver', 'cache', '-d', cache_dir, 'prune'])
+            self.assertEqual(result.output, 'freed\t10\n')
+
+if __name__ == '__main__':
+    main()
@@ -200,6 +200,22 @@ print('''%s''')
                 ws.reload_mets()
                 self.assertEqual(len(ws.mets.find_files()), 3)
 
+    def test_task_run_mets_cache(self):
+        resolver = Resolver()
+        with TemporaryDirectory() as tempdir:
+            with pushd_popd(tempdir):
+                ws = resolver.workspace_from_nothing(tempdir)
+                ws.add_file('GRP0', content='', local_filename='GRP0/foo', ID='file0', mimetype=MIMETYPE_PAGE)
+                ws.save_mets()
+                run_tasks('mets.xml', 'DEBUG', None, [
+                    "dummy -I GRP0 -O GRP1",
+                    "dummy -I GRP1 -O GRP2",
+                ], mets_cache=True)
+                # updated by the last task
+                self.assertTrue(Path(tempdir, 'mets.xml.cache').exists())
+                ws = resolver.workspace_from_url('mets.xml', mets_cache=True)
+                self.assertEqual(len(ws.mets.find_files()), 3)
+
 
 if __name__ == '__main__':
     main(__file__)
@@ -2,7 +2,8 @@ from os import getcwd
 from tempfile import TemporaryDirectory
 from pathlib import Path
 
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageStat
 
 from tests.base import TestCase, main, assets
 from ocrd_utils import (
@@ -12,9 +13,18 @@ from ocrd_utils import (
     make_file_id,
 
     bbox_from_points,
+    bbox_from_polygon,
     bbox_from_xywh,
 
     concat_padded,
+    concatenate_polygons,
+    coordinates_for_segment,
+    coordinates_for_segments,
+    coordinates_of_segment,
+    coordinates_of_segments,
+    crop_image,
+    estimate_background,
+    image_from_polygon,
     is_local_filename,
     get_local_filename,
     is_string,
@@ -34,15 +44,25 @@ from ocrd_utils import (
     polygon_from_points,
     polygon_from_x0y0x1y1,
 
+    rotate_coordinates,
+    shift_coordinates,
+    split_polygons,
+    transform_coordinates,
+    transform_polygons,
+
     xywh_from_points,
     xywh_from_polygon,
     pushd_popd,
+    import_file,
+
+    IMPORT_STRATEGIES,
 
     MIME_TO_EXT, EXT_TO_MIME,
     MIME_TO_PIL, PIL_TO_MIME,
 )
 from ocrd_models.utils import xmllint_format
 from ocrd_models import OcrdFile, OcrdMets
+from ocrd_models.ocrd_page import TextRegionType, CoordsType
 
 class MockOcrdFile(OcrdFile):
     """
@@ -92,6 +112,8 @@ class TestUtils(TestCase):
     def test_bbox_from_points(self):
         self.assertEqual(
             bbox_from_points('100,100 200,100 200,200 100,200'), (100, 100, 200, 200))
+        polygon = CoordsType(points='100,100 200,100 200,200 100,200').get_polygon()
+        self.assertEqual(bbox_from_points(polygon), (100, 100, 200, 200))
 
     def test_bbox_from_xywh(self):
         self.assertEqual(
@@ -107,6 +129,9 @@ class TestUtils(TestCase):
         self.assertEqual(
             xywh_from_points('100,100 200,100 200,200 100,200'),
             {'x': 100, 'y': 100, 'w': 100, 'h': 100})
+        self.assertEqual(
+            xywh_from_points(np.array([[100, 100], [200, 100], [200, 200], [100, 200]])),
+            {'x': 100, 'y': 100, 'w': 100, 'h': 100})
 
     def test_xywh_from_points_unordered(self):
         self.assertEqual(
@@ -117,6 +142,8 @@ class TestUtils(TestCase):
         self.assertEqual(
             polygon_from_points('100,100 200,100 200,200 100,200'),
             [[100, 100], [200, 100], [200, 200], [100, 200]])
+        polygon = CoordsType(points='100,100 200,100 200,200 100,200').get_polygon()
+        self.assertIs(polygon_from_points(polygon), polygon)
 
     def test_concat_padded(self):
         self.assertEqual(concat_padded('x', 0), 'x_0001')
@@ -164,6 +191,79 @@ class TestUtils(TestCase):
             self.assertEqual(getcwd(), '/tmp')
         self.assertEqual(getcwd(), cwd)
 
+    def test_import_file(self):
+        with TemporaryDirectory() as tempdir:
+            src = Path(tempdir, 'src.tif')
+            src.write_bytes(b'0123456789' * 100000)
+            for strategy in IMPORT_STRATEGIES:
+                dst = Path(tempdir, '%s.tif' % strategy)
+                # existing files are replaced, not written through
+                import_file(src, dst, strategy)
+                import_file(src, dst, strategy)
+                self.assertEqual(dst.read_bytes(), src.read_bytes())
+                self.assertEqual(dst.is_symlink(), strategy == 'symlink')
+                self.assertEqual(dst.stat().st_ino == src.stat().st_ino, strategy in ['hardlink', 'symlink'])
+            with self.assertRaisesRegex(Exception, "Invalid import strategy 'move'"):
+                import_file(src, dst, 'move')
+
+    def test_estimate_background(self):
+        image = Image.new('RGB', (300, 200), (200, 190, 180))
+        image.paste((0, 0, 0), (0, 0, 100, 100))
+        self.assertEqual(estimate_background(image), tuple(ImageStat.Stat(image).median))
+        self.assertEqual(estimate_background(image), (200, 190, 180))
+        self.assertEqual(estimate_background(image, subsample=7), (200, 190, 180))
+        # (at least one pixel, from the center)
+        self.assertEqual(estimate_background(image.convert('L'), subsample=1000), (192,))
+        self.assertEqual(crop_image(image, box=(-10, -10, 10, 10)).getpixel((0, 0)), (200, 190, 180))
+        self.assertEqual(crop_image(image, box=(-10, -10, 10, 10), fill='white').getpixel((0, 0)), (255, 255, 255))
+
+    def test_image_from_polygon_crop(self):
+        image = Image.new('RGB', (300, 200), (200, 190, 180))
+        image.paste((0, 0, 0), (0, 0, 100, 100))
+        for polygon in [[[10, 20], [150, 30], [120, 180]], [[-10, -20], [150, 30], [120, 250]]]:
+            for kwargs in [{}, {'fill': 'white'}, {'fill': (10, 20, 30, 255), 'transparency': True}]:
+                expected = crop_image(image_from_polygon(image, polygon, **kwargs), box=bbox_from_polygon(polygon),
+                                      fill=kwargs.get('fill', (200, 190, 180)))
+                cropped = image_from_polygon(image, polygon, crop=True, **kwargs)
+                self.assertEqual((cropped.mode, cropped.size), (expected.mode, expected.size))
+                if polygon[0][0] < 0 and 'transparency' in kwargs:
+                    # areas outside the image, but also outside the polygon are transparent, too
+                    self.assertEqual(cropped.getpixel((cropped.width - 1, 0)), (10, 20, 30, 0))
+                    self.assertEqual(expected.getpixel((expected.width - 1, 0)), (10, 20, 30, 255))
+                else:
+                    self.assertEqual(cropped.tobytes(), expected.tobytes(), kwargs)
+
+    def test_transform_polygons(self):
+        transform = rotate_coordinates(shift_coordinates(np.eye(3), np.array([-10, -20])), 30, np.array([50, 40]))
+        polygons = [[[10, 20], [150, 30], [120, 180]], [], [[0, 0], [5, 0], [5, 5], [0, 5]]]
+        coordinates, offsets = concatenate_polygons(polygons)
+        self.assertEqual(coordinates.shape, (7, 2))
+        self.assertEqual(list(offsets), [0, 3, 3, 7])
+        self.assertEqual([polygon.tolist() for polygon in split_polygons(coordinates, offsets)], polygons)
+        transformed = transform_polygons(coordinates, offsets, transform)
+        for polygon, result in zip(polygons, transformed):
+            if polygon:
+                # same as augmenting with ones, multiplying and dropping the z coordinate
+                expected = np.dot(transform, np.insert(np.array(polygon), 2, 1, axis=1).T).T[:, :2]
+                self.assertTrue(np.allclose(result, expected))
+                self.assertTrue(np.allclose(transform_coordinates(polygon, transform), expected))
+        restored = transform_polygons(np.concatenate(transformed), offsets, transform, inverse=True)
+        self.assertTrue(np.allclose(np.concatenate(restored), coordinates))
+        self.assertEqual(concatenate_polygons([])[0].shape, (0, 2))
+
+    def test_coordinates_of_segments(self):
+        coords = {'transform': rotate_coordinates(shift_coordinates(np.eye(3), np.array([-10, -20])), 90, np.array([50, 40]))}
+        segments = [TextRegionType(id='r%d' % i, Coords=CoordsType(points='%d,%d %d,20  40,%d' % (i, i, 10 * i, 100 - i)))
+                    for i in range(5)]
+        polygons = coordinates_of_segments(segments, None, coords)
+        for segment, polygon in zip(segments, polygons):
+            self.assertEqual(polygon.dtype, np.int32)
+            self.assertEqual(polygon.tolist(), coordinates_of_segment(segment, None, coords).tolist())
+        absolute = coordinates_for_segments(polygons, None, coords)
+        for segment, polygon, result in zip(segments, polygons, absolute):
+            self.assertEqual(points_from_polygon(result), ' '.join(segment.get_Coords().points.split()))
+            self.assertEqual(result.tolist(), coordinates_for_segment(polygon, None, coords).tolist())
+
     def test_is_local_filename(self):
         self.assertTrue(is_local_filename('/foo/bar'))
         self.assertTrue(is_local_filename('file:///foo/bar'))
@@ -1,18 +1,21 @@
-from os import walk
+from concurrent.futures import ThreadPoolExecutor
+from os import walk, utime
 from subprocess import run, PIPE
+from threading import current_thread
 from os.path import join, exists, abspath, basename, dirname
 from tempfile import TemporaryDirectory, mkdtemp
 from shutil import copyfile
 from pathlib import Path
 
-from PIL import Image
+from PIL import Image, ImageChops
 
-from tests.base import TestCase, assets, main, copy_of_directory
+from tests.base import TestCase, assets, main, copy_of_directory, serve_directory
 
-from ocrd_models.ocrd_page import parseString
+from ocrd_models.ocrd_page import parseString, PageType, AlternativeImageType, TextRegionType, CoordsType, BorderType
 from ocrd_utils import pushd_popd
 from ocrd.resolver import Resolver
 from ocrd.workspace import Workspace
+from ocrd.workspace_image_source import ImageSource
 
 
 TMP_FOLDER = '/tmp/test-core-workspace'
@@ -69,6 +72,116 @@ class TestWorkspace(TestCase):
             with self.assertRaisesRegex(Exception, "'content' was set but no 'local_filename'"):
                 ws1.add_file('GRP', ID='ID1', content=b'CONTENT')
 
+    def test_workspace_add_files(self):
+        with TemporaryDirectory() as tempdir:
+            ws1 = self.resolver.workspace_from_nothing(directory=tempdir)
+            ret = ws1.add_files([
+                {'fileGrp': 'GRP', 'ID': 'ID1', 'mimetype': 'image/tiff', 'pageId': 'PHYS_1',
+                 'content': b'CONTENT', 'local_filename': join('GRP', 'ID1.tif')},
+                {'fileGrp': 'GRP', 'ID': 'ID2', 'mimetype': 'image/tiff', 'pageId': 'PHYS_2',
+                 'url': 'http://foo/bar'},
+            ])
+            self.assertEqual([f.ID for f in ret], ['ID1', 'ID2'])
+            self.assertEqual(ws1.mets.physical_pages, ['PHYS_1', 'PHYS_2'])
+            self.assertEqual(ws1.mets.find_files(ID='ID1')[0].url, join('GRP', 'ID1.tif'))
+            self.assertTrue(exists(join(tempdir, 'GRP', 'ID1.tif')))
+            with self.assertRaisesRegex(Exception, "File with ID='ID2' already exists"):
+                ws1.add_files([{'fileGrp': 'GRP', 'ID': 'ID3'}, {'fileGrp': 'GRP', 'ID': 'ID2'}])
+            self.assertEqual(len(ws1.mets.find_files()), 2)
+
+    def test_save_mets_journal(self):
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            mets_size = Path(tempdir, 'mets.xml').stat().st_size
+            ws1 = Workspace(self.resolver, tempdir, journal=True)
+            ws1.mets.add_file('GRP', ID='ID1', mimetype='image/tiff', url='GRP/ID1.tif', pageId='PHYS_1')
+            ws1.mets.add_file('GRP', ID='ID2', mimetype='image/tiff', url='GRP/ID2.tif', pageId='PHYS_2')
+            ws1.save_mets()
+            ws1.mets.find_files(ID='ID2')[0].url = 'GRP/ID2.png'
+            ws1.mets.remove_one_file('ID1')
+            ws1.save_mets()
+            self.assertEqual(Path(tempdir, 'mets.xml').stat().st_size, mets_size)
+            self.assertTrue(exists(join(tempdir, 'mets.xml.journal')))
+            ws2 = Workspace(self.resolver, tempdir)
+            self.assertEqual(ws2.mets.to_xml(), ws1.mets.to_xml())
+            # incomplete change from an interrupted save is ignored
+            with open(join(tempdir, 'mets.xml.journal'), 'a') as f:
+                f.write('["remove_one_file", "ID')
+            self.assertEqual(Workspace(self.resolver, tempdir).mets.to_xml(), ws1.mets.to_xml())
+            ws1.save_mets(checkpoint=True)
+            self.assertFalse(exists(join(tempdir, 'mets.xml.journal')))
+            self.assertEqual(Workspace(self.resolver, tempdir).mets.physical_pages, ['PHYS_2'])
+            # downloading a file already in the workspace does not change anything
+            Path(tempdir, 'GRP', 'ID2.png').parent.mkdir()
+            Path(tempdir, 'GRP', 'ID2.png').write_bytes(b'')
+            ws1.download_file(ws1.mets.find_files(ID='ID2')[0])
+            self.assertEqual(ws1.mets.pop_journal(), [])
+
+    def test_save_mets_journal_changed(self):
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            ws1 = Workspace(self.resolver, tempdir, journal=True)
+            ws1.mets.add_file('GRP', ID='ID1', mimetype='image/tiff', url='GRP/ID1.tif', pageId='PHYS_1')
+            ws1.save_mets()
+            # written to the METS file and journal removed by another process
+            Workspace(self.resolver, tempdir, journal=True).save_mets(checkpoint=True)
+            self.assertFalse(exists(join(tempdir, 'mets.xml.journal')))
+            ws1.mets.add_file('GRP', ID='ID2', mimetype='image/tiff', url='GRP/ID2.tif', pageId='PHYS_2')
+            ws1.save_mets()
+            self.assertEqual([f.ID for f in Workspace(self.resolver, tempdir).mets.find_files()], ['ID1', 'ID2'])
+            # journal restarted by another process (shorter than before)
+            ws2 = Workspace(self.resolver, tempdir, journal=True)
+            ws2.save_mets(checkpoint=True)
+            ws2.mets.remove_one_file('ID1')
+            ws2.save_mets()
+            ws1.mets.add_file('GRP', ID='ID3', mimetype='image/tiff', url='GRP/ID3.tif', pageId='PHYS_3')
+            ws1.save_mets()
+            self.assertEqual([f.ID for f in Workspace(self.resolver, tempdir).mets.find_files()], ['ID2', 'ID3'])
+
+    def test_mets_backend_sqlite(self):
+        with TemporaryDirectory() as tempdir:
+            ws1 = self.resolver.workspace_from_nothing(directory=tempdir, mets_backend='sqlite')
+            ws1.add_file('GRP', ID='ID1', mimetype='image/tiff', url='GRP/ID1.tif', pageId='PHYS_1')
+            ws1.save_mets()
+            ws2 = Workspace(self.resolver, tempdir, mets_backend='sqlite')
+            self.assertEqual([f.ID for f in ws2.mets.find_files(pageId='PHYS_1')], ['ID1'])
+            self.assertEqual(ws2.mets.to_xml(), Workspace(self.resolver, tempdir).mets.to_xml())
+            with self.assertRaisesRegex(Exception, "Unknown METS backend"):
+                Workspace(self.resolver, tempdir, mets_backend='foo')
+
+    def test_mets_cache(self):
+        with TemporaryDirectory() as tempdir:
+            ws1 = self.resolver.workspace_from_nothing(directory=tempdir, mets_cache=True)
+            ws1.add_file('GRP', ID='ID1', mimetype='image/tiff', url='GRP/ID1.tif', pageId='PHYS_1')
+            ws1.save_mets()
+            self.assertTrue(exists(join(tempdir, 'mets.xml.cache')))
+            ws2 = Workspace(self.resolver, tempdir, mets_cache=True)
+            self.assertEqual([f.ID for f in ws2.mets.find_files(pageId='PHYS_1')], ['ID1'])
+            ws2.add_file('GRP', ID='ID2', mimetype='image/tiff', url='GRP/ID2.tif', pageId='PHYS_2')
+            ws2.save_mets()
+            ws2.reload_mets()
+            self.assertEqual([f.ID for f in ws2.mets.find_files(fileGrp='GRP')], ['ID1', 'ID2'])
+            with self.assertRaisesRegex(Exception, "only supported by the 'lxml' METS backend"):
+                Workspace(self.resolver, tempdir, mets_backend='sqlite', mets_cache=True)
+
+    def test_file_grps(self):
+        with TemporaryDirectory() as tempdir:
+            ws1 = self.resolver.workspace_from_nothing(directory=tempdir)
+            ws1.add_file('GRP1', ID='ID1', mimetype='image/tiff', url='GRP1/ID1.tif', pageId='PHYS_1')
+            ws1.add_file('GRP2', ID='ID2', mimetype='image/tiff', url='GRP2/ID2.tif', pageId='PHYS_1')
+            ws1.save_mets()
+            ws2 = Workspace(self.resolver, tempdir, file_grps=['GRP2'], journal=True)
+            self.assertEqual([f.ID for f in ws2.mets.find_files()], ['ID2'])
+            ws2.add_file('GRP2', ID='ID3', mimetype='image/tiff', url='GRP2/ID3.tif', pageId='PHYS_2')
+            ws2.save_mets()
+            # all fileGrps loaded while the journal has changes
+            self.assertEqual([f.ID for f in Workspace(self.resolver, tempdir, file_grps=['GRP2']).mets.find_files()], ['ID1', 'ID2', 'ID3'])
+            ws2.save_mets(checkpoint=True)
+            ws2.reload_mets()
+            self.assertEqual([f.ID for f in ws2.mets.find_files()], ['ID2', 'ID3'])
+            self.assertEqual([f.ID for f in Workspace(self.resolver, tempdir).mets.find_files()], ['ID1', 'ID2', 'ID3'])
+            with self.assertRaisesRegex(Exception, "only supported by the 'lxml' METS backend without METS cache"):
+                Workspace(self.resolver, tempdir, file_grps=['GRP2'], mets_cache=True)
 
     def test_workspace_str(self):
         with TemporaryDirectory() as tempdir:
@@ -120,6 +233,39 @@ class TestWorkspace(TestCase):
             self.assertTrue(Path(ws_dir, 'mets.xml').exists())  # sanity check, mets.xml must exist
             self.assertTrue(Path(ws_dir, 'OCR-D-GT-PAGE/PAGE_0017_PAGE.xml').exists())
 
+    def test_download_files(self):
+        with TemporaryDirectory() as srcdir, TemporaryDirectory() as tempdir:
+            ws1 = self.resolver.workspace_from_nothing(directory=tempdir)
+            for i in range(10):
+                Path(srcdir, '%d.tif' % i).write_bytes(b'%d' % i)
+                ws1.add_file('GRP', ID='FILE_%d' % i, mimetype='image/tiff', url=join(srcdir, '%d.tif' % i))
+            progress = []
+            ws1.download_files(ws1.mets.find_files(), max_workers=4,
+                               progress=lambda n_done, n_total, f: progress.append((n_done, n_total)))
+            self.assertEqual(progress, [(i, 10) for i in range(1, 11)])
+            self.assertEqual([f.url for f in ws1.mets.find_files()], ['GRP/FILE_%d.tif' % i for i in range(10)])
+            self.assertEqual(Path(tempdir, 'GRP/FILE_3.tif').read_bytes(), b'3')
+            # other files are updated even if some fail
+            ws1.add_file('GRP2', ID='MISSING', mimetype='image/tiff', url=join(srcdir, 'missing.tif'))
+            ws1.add_file('GRP2', ID='FILE_10', mimetype='image/tiff', url=join(srcdir, '0.tif'))
+            with self.assertRaisesRegex(Exception, "Failed to download 1 of 2 files: MISSING"):
+                ws1.download_files(ws1.mets.find_files(fileGrp='GRP2'))
+            self.assertEqual([f.url for f in ws1.mets.find_files(fileGrp='GRP2')], [join(srcdir, 'missing.tif'), 'GRP2/FILE_10.tif'])
+
+    def test_download_files_http(self):
+        with TemporaryDirectory() as srcdir, TemporaryDirectory() as tempdir:
+            for i in range(5):
+                Path(srcdir, '%d.tif' % i).write_bytes(b'%d' % i)
+            with serve_directory(srcdir, fail_first=1) as server:
+                ws1 = self.resolver.workspace_from_nothing(directory=tempdir)
+                ws1.baseurl = server.url
+                for i in range(5):
+                    ws1.add_file('GRP', ID='FILE_%d' % i, mimetype='image/tiff', url='%d.tif' % i)
+                ws1.download_files(ws1.mets.find_files(), max_per_host=2, backoff=0)
+                self.assertEqual(server.requests, {'/%d.tif' % i: 2 for i in range(5)})
+            self.assertEqual([f.url for f in ws1.mets.find_files()], ['GRP/FILE_%d.tif' % i for i in range(5)])
+            self.assertEqual(Path(tempdir, 'GRP/FILE_4.tif').read_bytes(), b'4')
+
     def test_superfluous_copies_in_ws_dir(self):
         """
         https://github.com/OCR-D/core/issues/227
@@ -262,6 +408,248 @@ class TestWorkspace(TestCase):
             img = ws.resolve_image_as_pil('OCR-D-IMG/INPUT_0017.tif', coords=([100, 100], [50, 50]))
             self.assertEqual(img.width, 50)
 
+    def test_image_cache(self):
+        with TemporaryDirectory() as tempdir:
+            ws = self.resolver.workspace_from_nothing(directory=tempdir)
+            Image.new('RGB', (100, 50), 'white').save(join(tempdir, 'foo.tif'), dpi=(300, 300))
+            # pylint: disable=protected-access
+            img = ws._resolve_image_as_pil('foo.tif')
+            img.paste('black', (0, 0, 100, 50))
+            self.assertEqual(ws._resolve_image_as_pil('foo.tif').getpixel((0, 0)), (255, 255, 255))
+            self.assertEqual(ws.resolve_image_exif('foo.tif').xResolution, 300)
+            self.assertEqual((ws.image_cache.hits, ws.image_cache.misses), (1, 1))
+            self.assertEqual(ws.image_cache.size, 100 * 50 * 4)
+            # changed since
+            Image.new('L', (100, 50)).save(join(tempdir, 'foo.tif'))
+            utime(join(tempdir, 'foo.tif'), (0, 1))
+            self.assertEqual(ws._resolve_image_as_pil('foo.tif').mode, 'L')
+            self.assertEqual((ws.image_cache.hits, ws.image_cache.misses), (1, 2))
+            self.assertEqual(ws.image_cache.size, 100 * 50)
+            # least recently used evicted
+            Image.new('L', (100, 50)).save(join(tempdir, 'bar.tif'))
+            ws = Workspace(self.resolver, tempdir, image_cache_size=100 * 50 * 2)
+            for url in ['foo.tif', 'bar.tif', 'foo.tif', 'bar.tif']:
+                ws._resolve_image_as_pil(url)
+            self.assertEqual((ws.image_cache.hits, ws.image_cache.misses), (2, 2))
+            Image.new('L', (100, 50)).save(join(tempdir, 'baz.tif'))
+            for url in ['baz.tif', 'bar.tif', 'foo.tif']:
+                ws._resolve_image_as_pil(url)
+            self.assertEqual((ws.image_cache.hits, ws.image_cache.misses), (3, 4))
+            ws = Workspace(self.resolver, tempdir, image_cache_size=0)
+            for url in ['foo.tif', 'foo.tif']:
+                ws._resolve_image_as_pil(url)
+            self.assertEqual((ws.image_cache.hits, ws.image_cache.misses, ws.image_cache.size), (0, 2, 0))
+            # images too large to cache are handed out as decoded
+            img = ws._resolve_image_as_pil('foo.tif')
+            img.paste(255, (0, 0, 100, 50))
+            self.assertEqual(ws._resolve_image_as_pil('foo.tif').getpixel((0, 0)), 0)
+            # counted consistently from several threads
+            ws = Workspace(self.resolver, tempdir)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(ws._resolve_image_as_pil, ['foo.tif', 'bar.tif', 'baz.tif'] * 100))
+            self.assertEqual(ws.image_cache.hits + ws.image_cache.misses, 300)
+            self.assertEqual(ws.image_cache.size, 3 * 100 * 50)
+
+    def test_image_from_page_alternative_image_only(self):
+        with TemporaryDirectory() as tempdir:
+            ws = self.resolver.workspace_from_nothing(directory=tempdir)
+            Image.new('RGB', (100, 50), 'white').save(join(tempdir, 'foo.tif'), dpi=(300, 300))
+            Image.new('1', (100, 50), 1).save(join(tempdir, 'foo.bin.png'))
+            page = PageType(imageFilename='foo.tif', imageWidth=100, imageHeight=50)
+            page.add_AlternativeImage(AlternativeImageType(filename='foo.bin.png', comments='binarized'))
+            img, _, info = ws.image_from_page(page, 'PHYS_0001', feature_selector='binarized')
+            self.assertEqual(img.mode, '1')
+            self.assertEqual(info.xResolution, 300)
+            # the original was not decoded
+            self.assertEqual(ws.image_cache.misses, 1)
+            img, _, info = ws.image_from_page(page, 'PHYS_0001', feature_filter='binarized')
+            self.assertEqual(img.mode, 'RGB')
+            self.assertEqual(ws.image_cache.misses, 2)
+
+    def test_image_memo(self):
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            ws = Workspace(self.resolver, tempdir, image_memo_size=1024 * 1024)
+            Image.new('RGB', (100, 50), 'white').save(join(tempdir, 'foo.tif'))
+            page = PageType(imageFilename='foo.tif', imageWidth=100, imageHeight=50)
+            region = TextRegionType(id='r1', Coords=CoordsType(points='10,10 60,10 60,40 10,40'))
+            page.add_TextRegion(region)
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+            page_image.paste('black', (0, 0, 100, 50))
+            page_coords['transform'][0, 2] = 1000
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+            self.assertEqual(page_image.getpixel((0, 0)), (255, 255, 255))
+            self.assertEqual(page_coords['transform'][0, 2], 0)
+            self.assertEqual((ws.image_memo.hits, ws.image_memo.misses), (1, 1))
+            ws.image_from_page(page, 'PHYS_0001', transparency=True)
+            self.assertEqual((ws.image_memo.hits, ws.image_memo.misses), (1, 2))
+            for _ in range(2):
+                region_image, _ = ws.image_from_segment(region, page_image, page_coords)
+                self.assertEqual(region_image.size, (50, 30))
+            self.assertEqual((ws.image_memo.hits, ws.image_memo.misses), (2, 3))
+            # invalidated by adding a file for the page
+            ws.save_image_file(region_image, 'r1_bin', 'OCR-D-BIN', page_id='PHYS_0001')
+            ws.image_from_segment(region, page_image, page_coords)
+            ws.image_from_page(page, 'PHYS_0001')
+            self.assertEqual((ws.image_memo.hits, ws.image_memo.misses), (2, 4))
+            self.assertEqual(ws.image_memo.size, 100 * 50 * 4)
+            # removing a file only invalidates its page
+            ws.image_from_page(page, 'PHYS_0002')
+            ws.save_image_file(region_image, 'r1_bin2', 'OCR-D-BIN', page_id='PHYS_0002')
+            ws.image_from_page(page, 'PHYS_0001')
+            ws.remove_file('r1_bin2')
+            ws.image_from_page(page, 'PHYS_0001')
+            self.assertEqual((ws.image_memo.hits, ws.image_memo.misses), (4, 5))
+            ws.image_from_page(page, 'PHYS_0002')
+            self.assertEqual((ws.image_memo.hits, ws.image_memo.misses), (4, 6))
+
+    def test_image_from_page_lazy(self):
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            # no decoded image to take from the cache
+            ws = Workspace(self.resolver, tempdir, image_cache_size=0)
+            image = Image.new('L', (100, 50), 200)
+            image.paste(0, (20, 20, 40, 30))
+            image.save(join(tempdir, 'foo.tif'))
+            page = PageType(imageFilename='foo.tif', imageWidth=100, imageHeight=50)
+            for points in ['10,10 60,10 60,40 10,40', '30,5 90,25 40,45', '-10,-10 20,-10 20,20 -10,20']:
+                page.add_TextRegion(TextRegionType(id='r', Coords=CoordsType(points=points)))
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001', lazy=True)
+            self.assertIsInstance(page_image, ImageSource)
+            eager_image, eager_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+            self.assertEqual(page_image.size, eager_image.size)
+            for region in page.get_TextRegion():
+                for fill in ['background', 'white']:
+                    region_image, region_coords = ws.image_from_segment(region, page_image, page_coords, fill=fill)
+                    eager_region_image, eager_region_coords = ws.image_from_segment(region, eager_image, eager_coords, fill=fill)
+                    self.assertEqual(region_image.tobytes(), eager_region_image.tobytes())
+                    self.assertTrue((region_coords['transform'] == eager_region_coords['transform']).all())
+            # only decoded in parts
+            self.assertIsNone(page_image._image)
+            # cropping requires the whole image
+            page.set_Border(BorderType(Coords=CoordsType(points='0,0 80,0 80,40 0,40')))
+            page_image, _, _ = ws.image_from_page(page, 'PHYS_0001', lazy=True)
+            self.assertNotIsInstance(page_image, ImageSource)
+            self.assertEqual(page_image.size, (80, 40))
+
+    def test_image_from_segments(self):
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            ws = Workspace(self.resolver, tempdir)
+            image = Image.new('RGB', (100, 50), (200, 190, 180))
+            image.paste((0, 0, 0), (20, 20, 40, 30))
+            image.save(join(tempdir, 'foo.png'))
+            page = PageType(imageFilename='foo.png', imageWidth=100, imageHeight=50)
+            for i, points in enumerate(['10,10 60,10 60,40 10,40', '30,5 90,25 40,45', '0,0 99,0 99,49 0,49']):
+                page.add_TextRegion(TextRegionType(id='r%d' % i, orientation=10 * i, Coords=CoordsType(points=points)))
+            regions = page.get_TextRegion()
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+            for fill in ['background', 'white']:
+                for max_workers in [1, 4]:
+                    results = list(ws.image_from_segments(regions, page_image, page_coords,
+                                                          fill=fill, max_workers=max_workers))
+                    self.assertEqual(len(results), 3)
+                    for region, (region_image, region_coords) in zip(regions, results):
+                        expected_image, expected_coords = ws.image_from_segment(region, page_image, page_coords, fill=fill)
+                        self.assertEqual(region_image.tobytes(), expected_image.tobytes())
+                        self.assertTrue((region_coords['transform'] == expected_coords['transform']).all())
+                        self.assertEqual(region_coords['features'], expected_coords['features'])
+            ws = Workspace(self.resolver, tempdir, image_memo_size=1024 * 1024)
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+            ws.image_from_segment(regions[0], page_image, page_coords)
+            list(ws.image_from_segments(regions, page_image, page_coords))
+            list(ws.image_from_segments(regions, page_image, page_coords, max_workers=4))
+            self.assertEqual((ws.image_memo.hits, ws.image_memo.misses), (1 + 3, 1 + 1 + 2))
+
+    def test_image_from_segments_alternative_image(self):
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            ws = Workspace(self.resolver, tempdir)
+            Image.new('RGB', (100, 50), (200, 190, 180)).save(join(tempdir, 'foo.png'))
+            page = PageType(imageFilename='foo.png', imageWidth=100, imageHeight=50)
+            for i in range(4):
+                region = TextRegionType(id='r%d' % i, Coords=CoordsType(points='%d,0 %d,0 %d,50 %d,50' % (
+                    i * 20, i * 20 + 10, i * 20 + 10, i * 20)))
+                for comments in ['binarized', 'binarized,despeckled']:
+                    url = 'SEG/r%d_%s.png' % (i, comments.replace(',', '_'))
+                    Path(tempdir, 'SEG').mkdir(exist_ok=True)
+                    Image.new('1', (10, 50), i % 2).save(join(tempdir, url))
+                    ws.mets.add_file('SEG', ID=url[4:-4], mimetype='image/png', url=url, pageId='PHYS_0001')
+                    region.add_AlternativeImage(AlternativeImageType(filename=url, comments=comments))
+                page.add_TextRegion(region)
+            regions = page.get_TextRegion()
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+            # the METS is only accessed from this thread
+            threads = set()
+            def resolve_image_path(image_url, resolve_image_path=ws._resolve_image_path):
+                threads.add(current_thread())
+                return resolve_image_path(image_url)
+            ws._resolve_image_path = resolve_image_path
+            for feature_filter in ['', 'despeckled']:
+                results = list(ws.image_from_segments(regions, page_image, page_coords,
+                                                      feature_filter=feature_filter, max_workers=4))
+                for region, (region_image, region_coords) in zip(regions, results):
+                    expected_image, expected_coords = ws.image_from_segment(region, page_image, page_coords,
+                                                                            feature_filter=feature_filter)
+                    self.assertEqual(region_image.tobytes(), expected_image.tobytes())
+                    self.assertEqual(region_coords['features'], expected_coords['features'])
+                self.assertEqual(results[0][1]['features'], 'binarized' if feature_filter else 'binarized,despeckled')
+            self.assertEqual(threads, {current_thread()})
+
+    def test_image_background(self):
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            ws = Workspace(self.resolver, tempdir)
+            image = Image.new('RGB', (100, 50), (200, 190, 180))
+            image.paste((0, 0, 0), (0, 0, 30, 50))
+            image.save(join(tempdir, 'foo.png'))
+            page = PageType(imageFilename='foo.png', imageWidth=100, imageHeight=50, orientation=5,
+                            Border=BorderType(Coords=CoordsType(points='0,0 60,0 60,50 0,50')))
+            region = TextRegionType(id='r1', orientation=15, Coords=CoordsType(points='0,10 50,10 50,40 0,40'))
+            page.add_TextRegion(region)
+            # estimated once from the whole image, then passed down
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+            self.assertEqual(page_coords['background'], (200, 190, 180))
+            # (deskewed corners are filled with it, although mostly black after cropping)
+            self.assertEqual(page_image.getpixel((0, 0)), (200, 190, 180))
+            region_image, region_coords = ws.image_from_segment(region, page_image, page_coords)
+            self.assertEqual(region_coords['background'], (200, 190, 180))
+            self.assertEqual(region_image.getpixel((0, 0)), (200, 190, 180))
+            page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001', fill='white')
+            self.assertNotIn('background', page_coords)
+            self.assertEqual(page_image.getpixel((0, 0)), (255, 255, 255))
+
+    def test_image_engine(self):
+        with self.assertRaisesRegex(Exception, "Unknown image engine 'foo'"):
+            Workspace(self.resolver, '.', image_engine='foo')
+        with TemporaryDirectory() as tempdir:
+            self.resolver.workspace_from_nothing(directory=tempdir)
+            image = Image.new('RGB', (200, 120), (200, 190, 180))
+            for x in range(20, 180, 20):
+                image.paste((x, 255 - x, 0), (x, 20, x + 10, 100))
+            image.save(join(tempdir, 'foo.png'))
+            page = PageType(imageFilename='foo.png', imageWidth=200, imageHeight=120, orientation=95,
+                            Border=BorderType(Coords=CoordsType(points='10,10 190,10 190,110 10,110')))
+            region = TextRegionType(id='r1', orientation=-75, Coords=CoordsType(points='30,20 150,30 140,100 20,90'))
+            page.add_TextRegion(region)
+            results = []
+            for engine in ['pil', 'cv2']:
+                ws = Workspace(self.resolver, tempdir, image_engine=engine)
+                page_image, page_coords, _ = ws.image_from_page(page, 'PHYS_0001')
+                region_image, region_coords = ws.image_from_segment(region, page_image, page_coords)
+                results.append((page_image, page_coords, region_image, region_coords))
+            (page_pil, coords_pil, region_pil, rcoords_pil), (page_cv2, coords_cv2, region_cv2, rcoords_cv2) = results
+            self.assertEqual(coords_pil['angle'], coords_cv2['angle'])
+            self.assertEqual(coords_pil['features'], coords_cv2['features'])
+            self.assertEqual(rcoords_pil['features'], rcoords_cv2['features'])
+            self.assertTrue((coords_pil['transform'] == coords_cv2['transform']).all())
+            self.assertTrue((rcoords_pil['transform'] == rcoords_cv2['transform']).all())
+            for image_pil, image_cv2 in [(page_pil, page_cv2), (region_pil, region_cv2)]:
+                self.assertEqual((image_pil.mode, image_pil.size), (image_cv2.mode, image_cv2.size))
+                diff = ImageChops.difference(image_pil, image_cv2).convert('L')
+                # only pixels at edges (sampled from the other side) may differ
+                self.assertLessEqual(sum(diff.histogram()[1:]), 0.02 * image_pil.width * image_pil.height)
+
     def test_image_from_page_basic(self):
         with pushd_popd(assets.path_to('gutachten/data')):
             ws = self.resolver.workspace_from_url('mets.xml')
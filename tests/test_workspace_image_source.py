@@ -0,0 +1,95 @@
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from PIL import Image
+
+from tests.base import TestCase, main
+
+from ocrd_utils import image_from_polygon
+from ocrd.workspace_image_cache import WorkspaceImageCache
+from ocrd.workspace_image_source import ImageSource
+
+class TestImageSource(TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        noise = np.random.RandomState(0).randint(0, 256, (300, 200, 3), dtype=np.uint8)
+        self.image = Image.fromarray(noise)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _save(self, filename, image, **kwargs):
+        path = join(self.tempdir.name, filename)
+        image.save(path, **kwargs)
+        return path
+
+    def assertSameImage(self, image1, image2):
+        self.assertEqual((image1.mode, image1.size), (image2.mode, image2.size))
+        self.assertEqual(image1.tobytes(), image2.tobytes())
+
+    def test_crop(self):
+        for filename, image, kwargs, partial in [
+                ('rgb.tif', self.image, {}, True),
+                # 16 rows per strip
+                ('strips.tif', self.image.convert('L'), {'tiffinfo': {278: 16}}, True),
+                ('bw.tif', self.image.convert('1'), {}, True),
+                ('rgb.bmp', self.image, {}, True),
+                ('rgb.ppm', self.image, {}, True),
+                ('lzw.tif', self.image, {'compression': 'tiff_lzw'}, False),
+                ('rgb.png', self.image, {}, False)]:
+            path = self._save(filename, image, **kwargs)
+            source = ImageSource(path)
+            self.assertEqual(source.partial, partial, filename)
+            self.assertEqual(source.size, (200, 300))
+            with Image.open(path) as full:
+                full.load()
+                for box in [(0, 0, 200, 300), (10, 20, 110, 70), (150, 250, 250, 350), (-10, -10, 5, 5)]:
+                    self.assertSameImage(source.crop(box), full.crop(box))
+                if partial:
+                    # nothing decoded as a whole yet
+                    self.assertIsNone(source._image)
+                self.assertEqual(source.histogram(), full.histogram())
+                self.assertTrue(np.array_equal(np.array(source), np.array(full)))
+
+    def test_crop_reduce(self):
+        path = self._save('rgb.jpg', self.image)
+        source = ImageSource(path)
+        self.assertFalse(source.partial)
+        reduced = source.crop((0, 0, 50, 75), reduce=4)
+        self.assertEqual(reduced.size, (50, 75))
+        self.assertIsNone(source._image)
+        path = self._save('rgb.tif', self.image)
+        self.assertEqual(ImageSource(path).crop((10, 10, 20, 20), reduce=2).size, (10, 10))
+
+    def test_image_from_polygon(self):
+        image = self.image.convert('L')
+        image.paste(255, (0, 0, 200, 200))
+        path = self._save('strips.tif', image, tiffinfo={278: 16})
+        source = ImageSource(path)
+        for polygon in [[[10, 120], [150, 130], [120, 280]], [[-10, 150], [50, 120], [40, 320]]]:
+            cropped = image_from_polygon(source, polygon, crop=True)
+            self.assertSameImage(cropped, image_from_polygon(image, polygon, crop=True))
+        # the background was only estimated within the boxes (not mostly white), without decoding the whole image
+        self.assertIsNone(source._image)
+        self.assertNotEqual(cropped.getpixel((0, 0)), 255)
+
+    def test_image_cache(self):
+        path = self._save('rgb.png', self.image)
+        cache = WorkspaceImageCache(10 ** 7)
+        source = ImageSource(path, image_cache=cache)
+        # changing the image of the ImageSource in place
+        source.paste((0, 0, 0), (0, 0, 200, 300))
+        source.putalpha(0)
+        self.assertSameImage(cache.open(path), self.image)
+        self.assertSameImage(ImageSource(path, image_cache=cache).crop((0, 0, 200, 300)), self.image)
+        self.assertEqual(source.crop((0, 0, 1, 1)).getpixel((0, 0)), (0, 0, 0, 0))
+        # nor when decoded in the cache first
+        source = ImageSource(path, image_cache=cache)
+        source.crop((0, 0, 10, 10))
+        source.paste((0, 0, 0), (0, 0, 200, 300))
+        self.assertSameImage(cache.open(path), self.image)
+
+if __name__ == '__main__':
+    main(__file__)
@@ -0,0 +1,58 @@
+import numpy as np
+from PIL import Image
+
+from tests.base import TestCase, main
+
+from ocrd_utils import rotate_image, transpose_image
+from ocrd.workspace_image_warp import warp_image
+
+def gradient(height, width):
+    """
+    A smooth RGB image, so pixels sampled from a neighbour differ only little.
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    return Image.fromarray(np.dstack([
+        x * 255 // (width - 1),
+        y * 255 // (height - 1),
+        (x + y) * 255 // (width + height - 2)]).astype(np.uint8))
+
+def assert_within_tolerance(testcase, image, expected, max_fraction=0.01, max_level=8):
+    """
+    Assert that ``image`` has the mode and size of ``expected``, and differs
+    from it in at most ``max_fraction`` of pixels by more than ``max_level``.
+    """
+    testcase.assertEqual((image.mode, image.size), (expected.mode, expected.size))
+    array, expected = np.array(image).astype(int), np.array(expected).astype(int)
+    if image.mode == '1':
+        array, expected = array * 255, expected * 255
+    if array.ndim == 2:
+        array, expected = array[:, :, np.newaxis], expected[:, :, np.newaxis]
+    diff = np.abs(array - expected).max(axis=-1)
+    testcase.assertLessEqual((diff > 0).mean(), max_fraction)
+    if image.mode != '1':
+        testcase.assertLessEqual((diff > max_level).mean(), max_fraction / 10)
+
+class TestWarpImage(TestCase):
+
+    def setUp(self):
+        self.image = gradient(137, 211)
+
+    def test_warp_image(self):
+        for mode in ['RGB', 'RGBA', 'L', 'LA', '1', 'P']:
+            image = self.image.convert(mode)
+            for method in [None, Image.ROTATE_90, Image.ROTATE_180, Image.ROTATE_270]:
+                for angle in [0, 1.3, -7.5, 44.9]:
+                    for kwargs in [{}, {'transparency': True}, {'fill': 'white'}]:
+                        expected = transpose_image(image, method) if method is not None else image
+                        if angle:
+                            expected = rotate_image(expected, angle, **kwargs)
+                        with self.subTest(mode=mode, method=method, angle=angle, **kwargs):
+                            assert_within_tolerance(self, warp_image(image, method, angle, **kwargs), expected)
+
+    def test_warp_image_large(self):
+        image = gradient(2000, 1500).convert('L')
+        expected = rotate_image(transpose_image(image, Image.ROTATE_270), -2.1)
+        assert_within_tolerance(self, warp_image(image, Image.ROTATE_270, -2.1), expected)
+
+if __name__ == '__main__':
+    main(__file__)
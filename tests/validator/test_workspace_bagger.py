@@ -1,9 +1,10 @@
-from os import makedirs
+from os import makedirs, walk
 from os.path import join, abspath, exists
 from shutil import copytree, rmtree
-from tempfile import mkdtemp
+from tempfile import mkdtemp, TemporaryDirectory
+from pathlib import Path
 
-from tests.base import TestCase, main, assets # pylint: disable=import-error,no-name-in-module
+from tests.base import TestCase, main, assets, serve_directory # pylint: disable=import-error,no-name-in-module
 
 from ocrd.workspace import Workspace
 from ocrd.workspace_bagger import WorkspaceBagger, BACKUPDIR
@@ -108,5 +109,21 @@ class TestWorkspaceBagger(TestCase):
         self.bagger.spill(bag_dest, self.bagdir)
         self.assertTrue(exists(spill_dest))
 
+class TestWorkspaceBaggerDownload(TestCase):
+
+    def test_bag_without_validators(self):
+        resolver = Resolver()
+        with TemporaryDirectory() as src, TemporaryDirectory() as tempdir:
+            with serve_directory(src) as server:
+                Path(src, 'foo.tif').write_bytes(b'foo')
+                workspace = resolver.workspace_from_nothing(directory=join(tempdir, 'ws'))
+                workspace.add_file('OCR-D-IMG', ID='FILE_0', mimetype='image/tiff', url='%s/foo.tif' % server.url)
+                workspace.save_mets()
+                dest = WorkspaceBagger(resolver).bag(workspace, 'foo', dest=join(tempdir, 'bag'), skip_zip=True)
+            self.assertEqual(Path(dest, 'data', 'OCR-D-IMG', 'FILE_0.tif').read_bytes(), b'foo')
+            for dirpath, dirnames, _ in walk(dest):
+                self.assertNotIn('.validators', dirnames, dirpath)
+            self.assertNotIn('.validators', Path(dest, 'manifest-sha512.txt').read_text())
+
 if __name__ == '__main__':
     main()